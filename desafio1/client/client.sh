@@ -18,10 +18,12 @@ while true; do
     echo ""
     echo "Pedido #$count - $(date '+%H:%M:%S')"
     
-    response=$(curl -s $SERVER_URL)
-    http_code=$(curl -s -o /dev/null -w "%{http_code}" $SERVER_URL)
+    output=$(curl -s -w "\n%{http_code}" $SERVER_URL)
+    curl_status=$?
+    http_code=$(echo "$output" | tail -n 1)
+    response=$(echo "$output" | sed '$d')
     
-    if [ $? -eq 0 ] && [ "$http_code" = "200" ]; then
+    if [ $curl_status -eq 0 ] && [ "$http_code" = "200" ]; then
         echo "$response" | python3 -m json.tool 2>/dev/null || echo "$response"
         echo ""
         echo "Status: Pedido processado com sucesso (HTTP $http_code)"
@@ -0,0 +1,326 @@
+import argparse
+import http.client
+import json
+import queue
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Histograma log-linear no estilo HDR: valores em microssegundos com
+# 2048 sub-buckets por potencia de 2 (erro relativo < 0,1%)
+SUB_BUCKET_BITS = 11
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+
+
+def _bucket_index(value):
+    if value < SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return (
+        SUB_BUCKET_COUNT
+        + (shift - 1) * SUB_BUCKET_HALF
+        + (value >> shift)
+        - SUB_BUCKET_HALF
+    )
+
+
+def _bucket_value(index):
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift = (index - SUB_BUCKET_COUNT) // SUB_BUCKET_HALF + 1
+    mantissa = (index - SUB_BUCKET_COUNT) % SUB_BUCKET_HALF + SUB_BUCKET_HALF
+    # Limite superior do bucket, para nunca subestimar a latencia
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1_000_000))
+        index = _bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, point):
+        if self.total == 0:
+            return 0
+        rank = max(1, int(self.total * point / 100 + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(_bucket_value(index), self.max)
+        return self.max
+
+    def summary(self):
+        summary = {
+            f"p{point:g}": round(self.percentile(point) / 1000, 3)
+            for point in PERCENTILES
+        }
+        summary["min"] = round((self.min or 0) / 1000, 3)
+        summary["max"] = round(self.max / 1000, 3)
+        summary["mean"] = round(self.sum / self.total / 1000, 3) if self.total else 0
+        return summary
+
+
+class WorkerStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.statuses = {}
+        self.errors = {}
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        for error, count in other.errors.items():
+            self.errors[error] = self.errors.get(error, 0) + count
+
+
+class Target:
+    def __init__(self, url, method, body):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or "/"
+        if parts.query:
+            self.path += "?" + parts.query
+        self.method = method
+        self.body = body.encode() if body else None
+        self.headers = {"Connection": "keep-alive"}
+        if body:
+            self.headers["Content-Type"] = "application/json"
+
+
+class Worker(threading.Thread):
+    def __init__(self, target, timeout):
+        super().__init__(daemon=True)
+        self.target = target
+        self.timeout = timeout
+        self.stats = WorkerStats()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(
+                self.target.host, self.target.port, timeout=self.timeout
+            )
+        return self._conn
+
+    def request(self, started):
+        try:
+            conn = self._connection()
+            conn.request(
+                self.target.method,
+                self.target.path,
+                body=self.target.body,
+                headers=self.target.headers,
+            )
+            response = conn.getresponse()
+            response.read()
+            status = str(response.status)
+            if response.getheader("Connection", "").lower() == "close":
+                self._close()
+        except (OSError, http.client.HTTPException) as e:
+            self._close()
+            name = type(e).__name__
+            self.stats.errors[name] = self.stats.errors.get(name, 0) + 1
+            return
+
+        self.stats.latency.record(time.perf_counter() - started)
+        self.stats.statuses[status] = self.stats.statuses.get(status, 0) + 1
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ClosedLoopWorker(Worker):
+    # Cada worker envia a proxima requisicao assim que a anterior termina,
+    # respeitando opcionalmente uma taxa maxima por worker
+    def __init__(self, target, timeout, deadline, interval):
+        super().__init__(target, timeout)
+        self.deadline = deadline
+        self.interval = interval
+
+    def run(self):
+        next_send = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            if now >= self.deadline:
+                break
+            if self.interval:
+                if next_send > now:
+                    time.sleep(next_send - now)
+                next_send += self.interval
+            self.request(time.perf_counter())
+        self._close()
+
+
+class OpenLoopWorker(Worker):
+    # A latencia e medida a partir do instante agendado, nao do envio real,
+    # para nao esconder filas quando o servidor atrasa (coordinated omission)
+    def __init__(self, target, timeout, schedule):
+        super().__init__(target, timeout)
+        self.schedule = schedule
+
+    def run(self):
+        while True:
+            intended = self.schedule.get()
+            if intended is None:
+                break
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.request(intended)
+        self._close()
+
+
+def run_closed(target, args):
+    deadline = time.perf_counter() + args.duration
+    interval = args.concurrency / args.rps if args.rps else 0
+    workers = [
+        ClosedLoopWorker(target, args.timeout, deadline, interval)
+        for _ in range(args.concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return workers
+
+
+def run_open(target, args):
+    if not args.rps:
+        raise SystemExit("Modo open-loop exige --rps")
+
+    schedule = queue.Queue()
+    workers = [
+        OpenLoopWorker(target, args.timeout, schedule) for _ in range(args.concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+
+    interval = 1 / args.rps
+    start = time.perf_counter()
+    total = int(args.duration * args.rps)
+    for sequence in range(total):
+        intended = start + sequence * interval
+        delay = intended - time.perf_counter()
+        if delay > 0.001:
+            time.sleep(delay)
+        schedule.put(intended)
+
+    for _ in workers:
+        schedule.put(None)
+    for worker in workers:
+        worker.join()
+    return workers
+
+
+def build_report(args, workers, elapsed):
+    stats = WorkerStats()
+    for worker in workers:
+        stats.merge(worker.stats)
+
+    completed = stats.latency.total
+    return {
+        "config": {
+            "url": args.url,
+            "method": args.method,
+            "mode": args.mode,
+            "concurrency": args.concurrency,
+            "target_rps": args.rps,
+            "duration": args.duration,
+        },
+        "results": {
+            "requests": completed + sum(stats.errors.values()),
+            "completed": completed,
+            "elapsed": round(elapsed, 3),
+            "throughput_rps": round(completed / elapsed, 2) if elapsed else 0,
+            "statuses": dict(sorted(stats.statuses.items())),
+            "errors": dict(sorted(stats.errors.items())),
+        },
+        "latency_ms": stats.latency.summary(),
+    }
+
+
+def compare(report, baseline):
+    print("\nComparacao com baseline:", file=sys.stderr)
+    rows = [("throughput_rps", report["results"], baseline["results"])]
+    rows += [
+        (key, report["latency_ms"], baseline["latency_ms"])
+        for key in report["latency_ms"]
+    ]
+    for key, current, previous in rows:
+        before = previous.get(key, 0)
+        after = current.get(key, 0)
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"  {key:<15} {before:>12} -> {after:>12}  ({change})", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga da Central Perk")
+    parser.add_argument("--url", default="http://web-server:8080/")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--body", help="Corpo JSON (ex.: para /orders/batch)")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rps", type=float, default=0, help="0 = sem limite")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--output", help="Arquivo do relatorio JSON (padrao: stdout)")
+    parser.add_argument("--baseline", help="Relatorio anterior para comparar")
+    args = parser.parse_args()
+
+    target = Target(args.url, args.method, args.body)
+    print(
+        f"Carga {args.mode}-loop: {args.concurrency} conexoes, "
+        f"{args.rps or 'max'} req/s por {args.duration}s -> {args.url}",
+        file=sys.stderr,
+    )
+
+    start = time.perf_counter()
+    if args.mode == "open":
+        workers = run_open(target, args)
+    else:
+        workers = run_closed(target, args)
+    report = build_report(args, workers, time.perf_counter() - start)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
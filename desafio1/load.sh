@@ -0,0 +1,21 @@
+#!/bin/bash
+
+mkdir -p reports
+REPORT="reports/loadgen-$(date '+%Y%m%d-%H%M%S').json"
+
+echo "Teste de carga - Central Perk"
+echo "============================================================"
+echo "Argumentos: $*"
+echo "Relatorio: $REPORT"
+echo "============================================================"
+echo ""
+
+docker compose --profile load run --rm load-generator "$@" > "$REPORT"
+
+echo ""
+echo "Resumo:"
+python3 -m json.tool "$REPORT"
+echo ""
+echo "Para comparar com outra execucao:"
+echo "  python3 client/loadgen.py ... --baseline $REPORT"
+echo "============================================================"
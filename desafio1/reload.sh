@@ -0,0 +1,10 @@
+#!/bin/bash
+
+echo "Recarregando workers da Central Perk..."
+echo "============================================================"
+
+docker compose kill -s HUP web-server
+
+echo ""
+echo "Workers reiniciados (conexoes em andamento sao finalizadas antes)."
+echo "============================================================"
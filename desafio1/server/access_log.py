@@ -0,0 +1,126 @@
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+POLICIES = ("drop", "block")
+
+_STOP = object()
+
+
+class AccessLog:
+    def __init__(
+        self,
+        stream=None,
+        capacity=10000,
+        policy="drop",
+        batch_size=512,
+        flush_interval=0.05,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Politica de log invalida: {policy}")
+
+        self.stream = stream or sys.stdout
+        self.capacity = capacity
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+        self._dropped = 0
+        self._reported = 0
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._start_lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+
+    def _start(self):
+        self._queue = queue.Queue(maxsize=self.capacity)
+        self._writer = threading.Thread(
+            target=self._write_loop, name="access-log", daemon=True
+        )
+        self._writer.start()
+        self._pid = os.getpid()
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    def log(self, event, **fields):
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._start()
+
+        entry = (time.time(), event, fields)
+        if self.policy == "block":
+            self._queue.put(entry)
+            return
+
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped += 1
+
+    def _write_loop(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._report_drops()
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = _STOP in batch
+            lines = [self._format(*entry) for entry in batch if entry is not _STOP]
+            if lines:
+                self.stream.write("\n".join(lines) + "\n")
+            self._report_drops()
+            self.stream.flush()
+
+            if stop:
+                return
+
+    def _format(self, timestamp, event, fields):
+        record = {
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(
+                sep=" ", timespec="milliseconds"
+            ),
+            "event": event,
+        }
+        record.update(fields)
+        return json.dumps(record, ensure_ascii=False)
+
+    def _report_drops(self):
+        dropped = self._dropped
+        if dropped == self._reported:
+            return
+        self.stream.write(
+            self._format(
+                time.time(),
+                "log_dropped",
+                {"dropped": dropped - self._reported, "total_dropped": dropped},
+            )
+            + "\n"
+        )
+        self.stream.flush()
+        self._reported = dropped
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._writer.join()
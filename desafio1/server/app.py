@@ -1,14 +1,21 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from datetime import datetime
+from access_log import AccessLog
+from fast_json import json_response
+from journal import JournalUnavailable, OrderJournal
+from ledger import Ledger
+from metrics import RequestMetrics, format_family
+from order_engine import OrderEngine, parse_weights
+from order_stats import OrderStats, value_percentiles
+from response_cache import ResponseCache
+import atexit
+import os
 import socket
-import random
+import time
 
 app = Flask(__name__)
 
-total_orders = 0
-daily_sales = 0.0
-
-customer_cashback = {}
+response_cache = ResponseCache(app)
 
 MENU = {
     "Espresso": {"price": 2.50},
@@ -30,95 +37,279 @@ CUSTOMER_CPFS = {
     "Phoebe": "666.666.666-66",
 }
 
+LEDGER_SHM_NAME = os.getenv("LEDGER_SHM_NAME")
+
+ledger = Ledger(CUSTOMER_CPFS.values(), items=MENU.keys(), shm_name=LEDGER_SHM_NAME)
+order_stats = OrderStats(
+    shm_name=f"{LEDGER_SHM_NAME}-stats" if LEDGER_SHM_NAME else None
+)
+
+access_log = AccessLog(
+    capacity=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    policy=os.getenv("LOG_QUEUE_POLICY", "drop"),
+)
+atexit.register(access_log.close)
+
+journal = None
+if os.getenv("JOURNAL_DIR"):
+    journal = OrderJournal(
+        os.getenv("JOURNAL_DIR"),
+        MENU.keys(),
+        CUSTOMER_CPFS.values(),
+        sync=os.getenv("JOURNAL_SYNC", "group") == "group",
+        snapshot_every=int(os.getenv("JOURNAL_SNAPSHOT_EVERY", "100000")),
+    )
+    if ledger.created:
+        ledger.restore(*journal.restore())
+    atexit.register(journal.close)
 
-def get_random_item():
-    return random.choice(list(MENU.keys()))
 
+def calculate_cashback(price):
+    return round(price * 0.01, 2)
 
-def get_random_customer():
-    return random.choice(list(CUSTOMER_CPFS.keys()))
 
+MENU_WEIGHTS = parse_weights(os.getenv("MENU_WEIGHTS"))
 
-def calculate_cashback(price):
-    return round(price * 0.01, 2)
+order_engine = OrderEngine(MENU, CUSTOMER_CPFS, calculate_cashback, MENU_WEIGHTS)
 
+HOSTNAME = socket.gethostname()
 
-def get_customer_cashback(cpf):
-    return customer_cashback.get(cpf, 0.0)
+_timestamp_cache = (None, None)
 
 
-def add_cashback(cpf, amount):
-    if cpf not in customer_cashback:
-        customer_cashback[cpf] = 0.0
-    customer_cashback[cpf] += amount
-    customer_cashback[cpf] = round(customer_cashback[cpf], 2)
+def current_timestamp():
+    # strftime so e refeito quando muda o segundo
+    global _timestamp_cache
+    second = int(time.time())
+    cached_second, text = _timestamp_cache
+    if cached_second != second:
+        text = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        _timestamp_cache = (second, text)
+    return text
 
 
-@app.route("/")
-def home():
-    global total_orders, daily_sales
+def get_random_item():
+    return order_engine.pick_item().name
+
+
+def get_random_customer():
+    return order_engine.pick_customer()[0]
 
-    total_orders += 1
 
-    item_name = get_random_item()
-    item_data = MENU[item_name]
-    customer_name = get_random_customer()
-    customer_cpf = CUSTOMER_CPFS[customer_name]
+def to_cents(amount):
+    return int(round(amount * 100))
 
-    cashback_earned = calculate_cashback(item_data["price"])
-    add_cashback(customer_cpf, cashback_earned)
 
-    daily_sales += item_data["price"]
+def from_cents(cents):
+    return cents / 100
+
+
+def get_customer_cashback(cpf):
+    return from_cents(ledger.balance(cpf))
+
+
+@app.route("/")
+def home():
+    item = order_engine.pick_item()
+    customer_name, customer_cpf = order_engine.pick_customer()
+
+    order_number = ledger.record_order(item.price_cents, item.name)
+    order_stats.record(item.price_cents)
+    ledger.add_cashback(customer_cpf, item.cashback_cents)
+
+    if journal:
+        journal.append(
+            order_number,
+            item.name,
+            customer_cpf,
+            item.price_cents,
+            item.cashback_cents,
+        )
 
     client_ip = request.remote_addr
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    hostname = socket.gethostname()
+    timestamp = current_timestamp()
 
     response_data = {
         "order": {
-            "number": total_orders,
-            "item": f"{item_name}",
-            "price": f"${item_data['price']:.2f}",
+            "number": order_number,
+            "item": item.name,
+            "price": item.price_label,
             "status": "confirmed",
         },
         "customer": {
             "name": customer_name,
             "cpf": customer_cpf,
-            "cashback_earned": f"${cashback_earned:.2f}",
+            "cashback_earned": item.cashback_label,
             "cashback_balance": f"${get_customer_cashback(customer_cpf):.2f}",
         },
         "server_info": {
             "barista": "Gunther",
-            "container": hostname,
+            "container": HOSTNAME,
             "client_ip": client_ip,
             "timestamp": timestamp,
         },
     }
 
-    log_msg = f"[{timestamp}] Pedido #{total_orders} | {customer_name} | {item_name} (${item_data['price']:.2f}) | Cashback: +${cashback_earned:.2f}"
-    print(log_msg)
-
-    return jsonify(response_data), 200
+    access_log.log(
+        "order",
+        number=order_number,
+        customer=customer_name,
+        item=item.name,
+        price=item.price,
+        cashback_earned=item.cashback,
+        client_ip=client_ip,
+    )
 
+    return json_response(response_data)
+
+
+BATCH_MAX_ORDERS = int(os.getenv("BATCH_MAX_ORDERS", "50000"))
+BATCH_FIELDS = ["number", "item", "customer", "price", "cashback_earned"]
+
+
+def parse_batch(payload):
+    if "random" in payload:
+        count = payload["random"]
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            raise ValueError("'random' deve ser um inteiro positivo")
+        if count > BATCH_MAX_ORDERS:
+            raise ValueError(f"Lote maximo de {BATCH_MAX_ORDERS} pedidos")
+        return [(get_random_item(), get_random_customer()) for _ in range(count)]
+
+    orders = payload.get("orders")
+    if not isinstance(orders, list) or not orders:
+        raise ValueError("Envie 'orders' (lista de pedidos) ou 'random' (quantidade)")
+    if len(orders) > BATCH_MAX_ORDERS:
+        raise ValueError(f"Lote maximo de {BATCH_MAX_ORDERS} pedidos")
+
+    parsed = []
+    for index, order in enumerate(orders):
+        if not isinstance(order, dict):
+            raise ValueError(f"Pedido {index} invalido")
+        # So sorteia quando o campo falta ou e null; "", 0, false e [] sao
+        # rejeitados abaixo
+        item_name = order.get("item")
+        if item_name is None:
+            item_name = get_random_item()
+        customer_name = order.get("customer")
+        if customer_name is None:
+            customer_name = get_random_customer()
+        if not isinstance(item_name, str):
+            raise ValueError(f"Pedido {index}: 'item' deve ser texto")
+        if not isinstance(customer_name, str):
+            raise ValueError(f"Pedido {index}: 'customer' deve ser texto")
+        if item_name not in MENU:
+            raise ValueError(f"Pedido {index}: item '{item_name}' nao existe no menu")
+        if customer_name not in CUSTOMER_CPFS:
+            raise ValueError(f"Pedido {index}: cliente '{customer_name}' desconhecido")
+        parsed.append((item_name, customer_name))
+    return parsed
+
+
+@app.route("/orders/batch", methods=["POST"])
+def orders_batch():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Corpo JSON invalido"}), 400
+
+    try:
+        orders = parse_batch(payload)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    entries_by_item = order_engine.entries
+    prices = {name: entry.price_cents for name, entry in entries_by_item.items()}
+    cashbacks = {name: entry.cashback_cents for name, entry in entries_by_item.items()}
+
+    entries = [
+        (
+            item_name,
+            CUSTOMER_CPFS[customer_name],
+            prices[item_name],
+            cashbacks[item_name],
+        )
+        for item_name, customer_name in orders
+    ]
+    first_number = ledger.record_batch(entries)
+    batch_sales = sum(entry[2] for entry in entries)
+    batch_cashback = sum(entry[3] for entry in entries)
+    order_stats.record(batch_sales, len(entries))
+
+    if journal:
+        journal.append_batch(first_number, entries)
+
+    access_log.log(
+        "order_batch",
+        first_number=first_number,
+        orders=len(entries),
+        sales=from_cents(batch_sales),
+        cashback_earned=from_cents(batch_cashback),
+        client_ip=request.remote_addr,
+    )
 
-@app.route("/health")
-def health():
     return (
         jsonify(
             {
-                "status": "open",
-                "cafeteria": "Central Perk",
-                "barista": "Gunther",
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "batch": {
+                    "orders": len(entries),
+                    "first_number": first_number,
+                    "sales": f"${from_cents(batch_sales):.2f}",
+                    "cashback_earned": f"${from_cents(batch_cashback):.2f}",
+                    "status": "confirmed",
+                },
+                "fields": BATCH_FIELDS,
+                "results": [
+                    [
+                        first_number + offset,
+                        item_name,
+                        customer_name,
+                        from_cents(prices[item_name]),
+                        from_cents(cashbacks[item_name]),
+                    ]
+                    for offset, (item_name, customer_name) in enumerate(orders)
+                ],
             }
         ),
         200,
     )
 
 
+def build_health(timestamp):
+    return {
+        "status": "open",
+        "cafeteria": "Central Perk",
+        "barista": "Gunther",
+        "timestamp": timestamp,
+    }
+
+
+@app.route("/health")
+def health():
+    timestamp = current_timestamp()
+    return response_cache.respond(
+        "health", lambda: build_health(timestamp), version=timestamp
+    )
+
+
+STATS_WINDOWS = {"last_5_minutes": 5 * 60, "last_hour": 60 * 60}
+
+
+def format_window(totals):
+    return {"orders": totals.orders, "sales": f"${from_cents(totals.sales):.2f}"}
+
+
 @app.route("/stats")
 def stats():
-    total_cashback = sum(customer_cashback.values())
+    snapshot = ledger.snapshot()
+    total_orders = snapshot.orders
+    daily_sales = from_cents(snapshot.sales)
+    total_cashback = from_cents(snapshot.cashback)
+
+    order_values = {}
+    for item, count in snapshot.items.items():
+        price = to_cents(MENU[item]["price"])
+        order_values[price] = order_values.get(price, 0) + count
+    percentiles = value_percentiles(order_values)
 
     return (
         jsonify(
@@ -134,16 +325,32 @@ def stats():
                     "total_cashback_distributed": f"${total_cashback:.2f}",
                     "status": "open",
                 },
+                "items_sold": snapshot.items,
+                "order_value_percentiles": {
+                    f"p{point}": f"${from_cents(cents):.2f}"
+                    for point, cents in percentiles.items()
+                },
+                "windows": {
+                    name: format_window(order_stats.window(seconds))
+                    for name, seconds in STATS_WINDOWS.items()
+                },
+                "revenue_per_hour": {
+                    datetime.fromtimestamp(start).strftime("%Y-%m-%d %H:00"): (
+                        f"${from_cents(totals.sales):.2f}"
+                    )
+                    for start, totals in order_stats.hourly()
+                },
                 "customers": {
                     name: {
                         "cpf": cpf,
-                        "cashback_balance": f"${get_customer_cashback(cpf):.2f}",
+                        "cashback_balance": f"${from_cents(snapshot.balances[cpf]):.2f}",
                     }
                     for name, cpf in CUSTOMER_CPFS.items()
                 },
                 "server": {
                     "barista": "Gunther",
-                    "container": socket.gethostname(),
+                    "container": HOSTNAME,
+                    "log_lines_dropped": access_log.dropped,
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 },
             }
@@ -152,8 +359,7 @@ def stats():
     )
 
 
-@app.route("/menu")
-def menu():
+def build_menu():
     menu_formatted = {}
     for item, data in MENU.items():
         menu_formatted[item] = {
@@ -162,19 +368,81 @@ def menu():
             "cashback": f"${calculate_cashback(data['price']):.2f} (1%)",
         }
 
-    return (
-        jsonify(
-            {
-                "menu": menu_formatted,
-                "cashback_info": "Ganhe 1% de cashback em cada compra, vinculado ao seu CPF!",
-                "location": "New York, NY",
-            }
+    return {
+        "menu": menu_formatted,
+        "cashback_info": "Ganhe 1% de cashback em cada compra, vinculado ao seu CPF!",
+        "location": "New York, NY",
+    }
+
+
+def menu_version():
+    # O cache do /menu e refeito sempre que algum item ou preco do MENU mudar
+    return tuple((item, data["price"]) for item, data in MENU.items())
+
+
+@app.route("/menu")
+def menu():
+    return response_cache.respond("menu", build_menu, version=menu_version())
+
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@app.route("/metrics")
+def metrics():
+    snapshot = ledger.snapshot()
+    families = [
+        format_family(
+            "central_perk_orders_total",
+            "counter",
+            "Pedidos confirmados.",
+            [(None, snapshot.orders)],
         ),
-        200,
-    )
+        format_family(
+            "central_perk_sales_dollars_total",
+            "counter",
+            "Vendas acumuladas em dolares.",
+            [(None, from_cents(snapshot.sales))],
+        ),
+        format_family(
+            "central_perk_cashback_dollars_total",
+            "counter",
+            "Cashback distribuido em dolares.",
+            [(None, from_cents(snapshot.cashback))],
+        ),
+        format_family(
+            "central_perk_items_sold_total",
+            "counter",
+            "Itens vendidos por produto.",
+            [({"item": item}, count) for item, count in snapshot.items.items()],
+        ),
+        format_family(
+            "central_perk_log_lines_dropped_total",
+            "counter",
+            "Linhas de log descartadas por fila cheia.",
+            [(None, access_log.dropped)],
+        ),
+    ]
+    body = request_metrics.render() + "\n".join(families) + "\n"
+    return Response(body, content_type=METRICS_CONTENT_TYPE)
 
 
-if __name__ == "__main__":
+@app.errorhandler(JournalUnavailable)
+def journal_unavailable(error):
+    # O pedido nao foi gravado em disco: nao confirma ao cliente
+    return jsonify({"error": "Journal indisponivel", "detail": str(error)}), 503
+
+
+# Registrado depois de todas as rotas para que cada endpoint tenha sua
+# propria faixa de contadores
+request_metrics = RequestMetrics(
+    app.view_functions,
+    shm_name=f"{LEDGER_SHM_NAME}-metrics" if LEDGER_SHM_NAME else None,
+)
+request_metrics.init_app(app)
+
+
+def print_banner(port=8080):
     print("=" * 60)
     print("CENTRAL PERK CAFETERIA")
     print("=" * 60)
@@ -183,7 +451,15 @@ if __name__ == "__main__":
     print("Programa de Cashback: 1% em todas as compras")
     print("Cashback vinculado ao CPF do cliente")
     print("=" * 60)
-    print("Cafeteria aberta na porta 8080...")
+    print(f"Cafeteria aberta na porta {port}...")
     print("=" * 60)
     print()
+
+
+def warm_up():
+    response_cache.get("menu", build_menu)
+
+
+if __name__ == "__main__":
+    print_banner()
     app.run(host="0.0.0.0", port=8080, debug=False)
@@ -0,0 +1,42 @@
+import argparse
+import time
+
+from flask import Response
+
+import app
+
+# Mede apenas os hooks de instrumentacao (before/after/teardown), sem o
+# handler, para isolar o custo que o /metrics adiciona a cada requisicao
+
+
+def measure(iterations):
+    metrics = app.request_metrics
+    response = Response()
+    with app.app.test_request_context("/"):
+        for _ in range(min(1000, iterations)):
+            metrics._before_request()
+            metrics._after_request(response)
+            metrics._teardown_request(None)
+
+        start = time.thread_time()
+        for _ in range(iterations):
+            metrics._before_request()
+            metrics._after_request(response)
+            metrics._teardown_request(None)
+        return (time.thread_time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Custo da instrumentacao por requisicao"
+    )
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    cost = measure(args.iterations)
+    print(f"Iteracoes: {args.iterations}")
+    print(f"Instrumentacao: {cost * 1e6:6.2f} us de CPU por requisicao")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import io
+import os
+import random
+import socket
+import sys
+import time
+from datetime import datetime
+
+from flask import jsonify, request
+
+import app
+
+# Reproducao do handler original de "/" (antes do OrderEngine), usada
+# apenas como referencia de custo
+legacy_state = {"total_orders": 0, "daily_sales": 0.0, "customer_cashback": {}}
+
+
+def legacy_home():
+    legacy_state["total_orders"] += 1
+    total_orders = legacy_state["total_orders"]
+    customer_cashback = legacy_state["customer_cashback"]
+
+    item_name = random.choice(list(app.MENU.keys()))
+    item_data = app.MENU[item_name]
+    customer_name = random.choice(list(app.CUSTOMER_CPFS.keys()))
+    customer_cpf = app.CUSTOMER_CPFS[customer_name]
+
+    cashback_earned = app.calculate_cashback(item_data["price"])
+    if customer_cpf not in customer_cashback:
+        customer_cashback[customer_cpf] = 0.0
+    customer_cashback[customer_cpf] += cashback_earned
+    customer_cashback[customer_cpf] = round(customer_cashback[customer_cpf], 2)
+
+    legacy_state["daily_sales"] += item_data["price"]
+
+    client_ip = request.remote_addr
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    hostname = socket.gethostname()
+
+    response_data = {
+        "order": {
+            "number": total_orders,
+            "item": f"{item_name}",
+            "price": f"${item_data['price']:.2f}",
+            "status": "confirmed",
+        },
+        "customer": {
+            "name": customer_name,
+            "cpf": customer_cpf,
+            "cashback_earned": f"${cashback_earned:.2f}",
+            "cashback_balance": f"${customer_cashback.get(customer_cpf, 0.0):.2f}",
+        },
+        "server_info": {
+            "barista": "Gunther",
+            "container": hostname,
+            "client_ip": client_ip,
+            "timestamp": timestamp,
+        },
+    }
+
+    log_msg = f"[{timestamp}] Pedido #{total_orders} | {customer_name} | {item_name} (${item_data['price']:.2f}) | Cashback: +${cashback_earned:.2f}"
+    print(log_msg)
+
+    return jsonify(response_data), 200
+
+
+def measure(handler, iterations):
+    with app.app.test_request_context("/"):
+        for _ in range(min(1000, iterations)):
+            handler()
+
+        # thread_time mede apenas a thread do request, sem a thread de log
+        start = time.thread_time()
+        for _ in range(iterations):
+            handler()
+        return (time.thread_time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark do handler de pedidos")
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args()
+
+    app.access_log.stream = io.StringIO()
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        before = measure(legacy_home, args.iterations)
+        after = measure(app.home, args.iterations)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print(f"Iteracoes: {args.iterations}")
+    print(f"Antes  (handler original): {before * 1e6:8.2f} us de CPU por pedido")
+    print(f"Depois (OrderEngine):      {after * 1e6:8.2f} us de CPU por pedido")
+    print(f"Ganho: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import json
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+
+    def dumps(payload):
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+
+else:
+
+    def dumps(payload):
+        return json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype="application/json")
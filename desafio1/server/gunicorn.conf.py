@@ -0,0 +1,55 @@
+import os
+
+from ledger import discard_shared
+
+SHARED_SUFFIXES = ("", "-stats", "-metrics")
+
+# Todos os workers compartilham o mesmo ledger e as mesmas janelas de
+# estatistica; sem isso cada processo teria seus proprios contadores
+os.environ.setdefault("LEDGER_SHM_NAME", "central-perk-ledger")
+
+# Segmentos de uma execucao anterior seriam somados aos dados restaurados do
+# journal. O descarte roda aqui, ao carregar a configuracao: com preload_app o
+# app (e o ledger) e importado no master antes do on_starting, que removeria
+# o segmento recem-criado. O HUP (reload.sh) rele este arquivo no mesmo
+# processo; a variavel evita descartar os segmentos em uso pelos workers
+if "LEDGER_SHM_READY" not in os.environ:
+    for suffix in SHARED_SUFFIXES:
+        discard_shared(os.environ["LEDGER_SHM_NAME"] + suffix)
+    os.environ["LEDGER_SHM_READY"] = "1"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_WORKERS", "4"))
+threads = int(os.getenv("WEB_THREADS", "8"))
+worker_class = "gthread"
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+timeout = int(os.getenv("WEB_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+
+# MENU, CUSTOMER_CPFS, ledger e journal sao carregados uma unica vez no
+# master e herdados pelos workers via fork
+preload_app = True
+
+accesslog = None
+errorlog = "-"
+
+
+def when_ready(server):
+    import app
+
+    app.warm_up()
+    app.print_banner(bind.rsplit(":", 1)[1])
+
+
+def worker_exit(server, worker):
+    import app
+
+    app.access_log.close()
+    if app.journal:
+        app.journal.close()
+
+
+def on_exit(server):
+    name = os.environ["LEDGER_SHM_NAME"]
+    for suffix in SHARED_SUFFIXES:
+        discard_shared(name + suffix)
@@ -0,0 +1,346 @@
+import fcntl
+import json
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import namedtuple
+
+# sequencia, timestamp, item, cliente, preco (centavos), cashback (centavos)
+RECORD = struct.Struct("<qdhhqq")
+CHECKSUM = struct.Struct("<I")
+RECORD_SIZE = RECORD.size + CHECKSUM.size
+
+BASE_SNAPSHOT = "base.snapshot"
+STREAM_SNAPSHOT = "snapshot"
+STREAM_LOCK = "lock"
+SEGMENT_SUFFIX = ".log"
+
+JournalState = namedtuple(
+    "JournalState", ["orders", "sales", "balances", "items", "sequence"]
+)
+
+
+class JournalUnavailable(Exception):
+    pass
+
+
+def _empty_state(items, accounts):
+    return {
+        "orders": 0,
+        "sales": 0,
+        "cashback": {account: 0 for account in accounts},
+        "items": {item: 0 for item in items},
+        "sequence": 0,
+    }
+
+
+def _merge_state(target, source):
+    target["orders"] += source["orders"]
+    target["sales"] += source["sales"]
+    for account, cents in source["cashback"].items():
+        target["cashback"][account] = target["cashback"].get(account, 0) + cents
+    for item, count in source.get("items", {}).items():
+        target["items"][item] = target["items"].get(item, 0) + count
+    target["sequence"] = max(target["sequence"], source["sequence"])
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path))
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _segment_name(number):
+    return f"{number:08d}{SEGMENT_SUFFIX}"
+
+
+def _list_segments(stream_dir):
+    return sorted(
+        int(name[: -len(SEGMENT_SUFFIX)])
+        for name in os.listdir(stream_dir)
+        if name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+class OrderJournal:
+    def __init__(
+        self,
+        directory,
+        items,
+        accounts,
+        sync=True,
+        flush_interval=0.002,
+        snapshot_every=100_000,
+    ):
+        self.directory = directory
+        self.items = tuple(items)
+        self.accounts = tuple(accounts)
+        self.sync = sync
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+
+        self._item_index = {item: index for index, item in enumerate(self.items)}
+        self._account_index = {
+            account: index for index, account in enumerate(self.accounts)
+        }
+        self._pid = None
+        self._open_lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _after_fork(self):
+        self._open_lock = threading.Lock()
+
+    def restore(self):
+        # Consolida os streams de processos encerrados em um unico snapshot
+        # base. O base registra os streams que ja contem ("merged"): se o
+        # processo cair depois de grava-lo e antes de remover os diretorios,
+        # o proximo restore apenas remove esses streams, sem soma-los de novo
+        state = _empty_state(self.items, self.accounts)
+        base = _read_json(os.path.join(self.directory, BASE_SNAPSHOT), {})
+        if base:
+            _merge_state(state, base)
+        merged = set(base.get("merged", ()))
+
+        dead_streams = []
+        for name in sorted(os.listdir(self.directory)):
+            stream_dir = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(stream_dir):
+                continue
+            lock_file = self._try_lock_stream(stream_dir)
+            if lock_file is None:
+                continue
+            if name not in merged:
+                _merge_state(state, self._replay_stream(stream_dir))
+            dead_streams.append((name, stream_dir, lock_file))
+
+        if dead_streams:
+            state["merged"] = [name for name, _, _ in dead_streams]
+            _write_atomic(os.path.join(self.directory, BASE_SNAPSHOT), state)
+            for _, stream_dir, lock_file in dead_streams:
+                for name in os.listdir(stream_dir):
+                    os.remove(os.path.join(stream_dir, name))
+                os.rmdir(stream_dir)
+                lock_file.close()
+
+        return JournalState(
+            orders=state["orders"],
+            sales=state["sales"],
+            balances=dict(state["cashback"]),
+            items=dict(state["items"]),
+            sequence=state["sequence"],
+        )
+
+    def _try_lock_stream(self, stream_dir):
+        lock_file = open(os.path.join(stream_dir, STREAM_LOCK), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _replay_stream(self, stream_dir):
+        snapshot = _read_json(
+            os.path.join(stream_dir, STREAM_SNAPSHOT),
+            {"segment": 0, "state": _empty_state(self.items, self.accounts)},
+        )
+        state = snapshot["state"]
+
+        for segment in _list_segments(stream_dir):
+            if segment < snapshot["segment"]:
+                continue
+            with open(os.path.join(stream_dir, _segment_name(segment)), "rb") as f:
+                self._apply(state, f.read())
+        return state
+
+    def _apply(self, state, data):
+        cashback = state["cashback"]
+        items = state.setdefault("items", {})
+        view = memoryview(data)
+        end = len(data) - len(data) % RECORD_SIZE
+
+        for offset in range(0, end, RECORD_SIZE):
+            body = view[offset : offset + RECORD.size]
+            (checksum,) = CHECKSUM.unpack_from(view, offset + RECORD.size)
+            if zlib.crc32(body) != checksum:
+                # Registro truncado por queda do processo: descarta o restante
+                break
+            sequence, _, item, account, price, earned = RECORD.unpack(body)
+            state["orders"] += 1
+            state["sales"] += price
+            item_key = self.items[item]
+            items[item_key] = items.get(item_key, 0) + 1
+            account_key = self.accounts[account]
+            cashback[account_key] = cashback.get(account_key, 0) + earned
+            if sequence > state["sequence"]:
+                state["sequence"] = sequence
+
+    def _open_stream(self):
+        name = uuid.uuid4().hex[:12]
+        # O stream so aparece com o nome final depois de travado, para que
+        # restore() em outro processo nunca o confunda com um stream morto
+        pending_dir = os.path.join(self.directory, f".{name}")
+        os.makedirs(pending_dir)
+        self._lock_file = self._try_lock_stream(pending_dir)
+        self._stream_dir = os.path.join(self.directory, name)
+        os.rename(pending_dir, self._stream_dir)
+
+        self._state = _empty_state(self.items, self.accounts)
+        self._segment = 0
+        self._segment_file = open(
+            os.path.join(self._stream_dir, _segment_name(self._segment)), "ab"
+        )
+        self._since_snapshot = 0
+
+        self._condition = threading.Condition()
+        self._pending = []
+        self._submitted = 0
+        self._durable = 0
+        self._closed = False
+        self._error = None
+
+        self._writer = threading.Thread(
+            target=self._flush_loop, name="order-journal", daemon=True
+        )
+        self._writer.start()
+        self._pid = os.getpid()
+
+    def _encode(self, sequence, now, item, account, price_cents, cashback_cents):
+        body = RECORD.pack(
+            sequence,
+            now,
+            self._item_index[item],
+            self._account_index[account],
+            price_cents,
+            cashback_cents,
+        )
+        return body + CHECKSUM.pack(zlib.crc32(body))
+
+    def append(self, sequence, item, account, price_cents, cashback_cents):
+        self._submit(
+            [
+                self._encode(
+                    sequence, time.time(), item, account, price_cents, cashback_cents
+                )
+            ]
+        )
+
+    def append_batch(self, first_sequence, orders):
+        now = time.time()
+        self._submit(
+            [
+                self._encode(first_sequence + offset, now, *order)
+                for offset, order in enumerate(orders)
+            ]
+        )
+
+    def _submit(self, records):
+        if self._pid != os.getpid():
+            with self._open_lock:
+                if self._pid != os.getpid():
+                    self._open_stream()
+
+        with self._condition:
+            self._raise_if_failed()
+            self._pending.extend(records)
+            self._submitted += len(records)
+            ticket = self._submitted
+            self._condition.notify_all()
+
+            if self.sync:
+                while self._durable < ticket:
+                    self._raise_if_failed()
+                    self._condition.wait()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise JournalUnavailable(
+                f"Falha ao gravar o journal: {self._error}"
+            ) from self._error
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending and self._closed:
+                    return
+
+            # Aguarda um pouco para agrupar mais pedidos no mesmo fsync
+            time.sleep(self.flush_interval)
+
+            with self._condition:
+                batch = self._pending
+                self._pending = []
+                ticket = self._submitted
+
+            try:
+                data = b"".join(batch)
+                self._segment_file.write(data)
+                self._segment_file.flush()
+                os.fdatasync(self._segment_file.fileno())
+                self._apply(self._state, data)
+                self._since_snapshot += len(batch)
+
+                with self._condition:
+                    self._durable = ticket
+                    self._condition.notify_all()
+
+                if self._since_snapshot >= self.snapshot_every:
+                    self._rotate()
+            except Exception as e:
+                # Disco cheio, erro de I/O...: o writer para e quem espera
+                # (ou chegar depois) recebe o erro em vez de travar para sempre
+                with self._condition:
+                    self._error = e
+                    self._condition.notify_all()
+                return
+
+    def _rotate(self):
+        self._segment_file.close()
+        self._segment += 1
+        self._segment_file = open(
+            os.path.join(self._stream_dir, _segment_name(self._segment)), "ab"
+        )
+        _write_atomic(
+            os.path.join(self._stream_dir, STREAM_SNAPSHOT),
+            {"segment": self._segment, "state": self._state},
+        )
+        for segment in _list_segments(self._stream_dir):
+            if segment < self._segment:
+                os.remove(os.path.join(self._stream_dir, _segment_name(segment)))
+        self._since_snapshot = 0
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._writer.join()
+        self._segment_file.close()
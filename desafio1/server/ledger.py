@@ -0,0 +1,370 @@
+import fcntl
+import itertools
+import mmap
+import os
+import tempfile
+import threading
+import time
+import weakref
+from collections import namedtuple
+
+ORDERS = 0
+SALES = 1
+CASHBACK = 2
+FIRST_COUNTER = 3
+
+SHARED_SLOTS = 256
+SHARED_DIR = "/dev/shm"
+
+LedgerSnapshot = namedtuple(
+    "LedgerSnapshot", ["orders", "sales", "cashback", "items", "balances"]
+)
+
+
+class LocalShards:
+    def __init__(self, width):
+        self.width = width
+        self._lock = threading.Lock()
+        self._keys = itertools.count()
+        self._sequence_lock = threading.Lock()
+        self._sequence = 0
+        self._rows = {}
+        self._retired = [0] * width
+        self.created = True
+
+    def claim(self):
+        key = next(self._keys)
+        row = [0] * self.width
+        with self._lock:
+            self._rows[key] = row
+        return key, row
+
+    def release(self, key):
+        with self._lock:
+            row = self._rows.pop(key)
+            for column, value in enumerate(row):
+                self._retired[column] += value
+
+    def column_total(self, column):
+        with self._lock:
+            return self._retired[column] + sum(
+                row[column] for row in self._rows.values()
+            )
+
+    def snapshot(self):
+        with self._lock:
+            totals = list(self._retired)
+            for row in self._rows.values():
+                for column, value in enumerate(row):
+                    totals[column] += value
+        return totals
+
+    def next_sequence(self, count=1):
+        with self._sequence_lock:
+            self._sequence += count
+            return self._sequence
+
+    def seed(self, totals, sequence):
+        with self._lock:
+            for column, value in enumerate(totals):
+                self._retired[column] += value
+        with self._sequence_lock:
+            self._sequence += sequence
+
+    def unlink(self):
+        pass
+
+
+class SharedArray:
+    # Vetor de inteiros de 64 bits em memoria compartilhada (arquivo mapeado
+    # em /dev/shm), protegido por flock para ser usado por varios processos.
+    # O flock fica em um arquivo proprio, que nunca e removido: o segmento
+    # pode ser descartado (discard_shared) enquanto ainda esta mapeado, e
+    # processos que abrissem caminhos diferentes nao se excluiriam
+    def __init__(self, name, length):
+        self.name = name
+        self.path = _shared_path(name)
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        size = length * 8
+
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            os.ftruncate(fd, size)
+            self.created = True
+        except FileExistsError:
+            fd = os.open(self.path, os.O_RDWR)
+            self.created = False
+            if not _wait_for_size(fd, size):
+                os.close(fd)
+                raise ValueError(
+                    f"Memoria compartilhada '{name}' tem layout incompativel"
+                )
+
+        try:
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self.cells = memoryview(self._mmap).cast("q")
+        self._thread_lock = threading.Lock()
+        self._open_lock_file()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _open_lock_file(self):
+        self._lock_file = open(self._lock_path, "a")
+
+    def _after_fork(self):
+        # flock e compartilhado entre pai e filho pelo mesmo descritor: o
+        # filho abre o seu, para os dois se excluirem
+        self._thread_lock = threading.Lock()
+        self._open_lock_file()
+
+    def locked(self):
+        return _FileLock(self._thread_lock, self._lock_file)
+
+    def unlink(self):
+        discard_shared(self.name)
+
+
+def _shared_path(name):
+    base = SHARED_DIR if os.path.isdir(SHARED_DIR) else tempfile.gettempdir()
+    return os.path.join(base, name)
+
+
+def _wait_for_size(fd, size, timeout=1.0):
+    # Quem criou o segmento pode ainda nao ter chamado ftruncate
+    deadline = time.monotonic() + timeout
+    while os.fstat(fd).st_size < size:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def discard_shared(name):
+    try:
+        os.unlink(_shared_path(name))
+    except FileNotFoundError:
+        pass
+
+
+class SharedShards:
+    # Linha 0: sequencia de pedidos | linha 1: shards aposentados | demais: slots
+    # A coluna 0 de cada slot guarda o PID dono (0 = livre).
+    HEADER_ROWS = 2
+
+    def __init__(self, name, width, slots=SHARED_SLOTS):
+        self.width = width
+        self.stride = width + 1
+        self.slots = slots
+
+        self._array = SharedArray(name, (self.HEADER_ROWS + slots) * self.stride)
+        self.created = self._array.created
+        self._cells = self._array.cells
+        self._locked = self._array.locked
+
+    def _offset(self, row):
+        return row * self.stride
+
+    def _slot_row(self, slot):
+        return self.HEADER_ROWS + slot
+
+    def _fold(self, slot):
+        retired = self._offset(1)
+        start = self._offset(self._slot_row(slot))
+        for column in range(1, self.stride):
+            self._cells[retired + column] += self._cells[start + column]
+            self._cells[start + column] = 0
+        self._cells[start] = 0
+
+    def _reap_dead_owners(self):
+        for slot in range(self.slots):
+            owner = self._cells[self._offset(self._slot_row(slot))]
+            if owner and not _pid_alive(owner):
+                self._fold(slot)
+
+    def _find_free_slot(self):
+        for slot in range(self.slots):
+            if self._cells[self._offset(self._slot_row(slot))] == 0:
+                return slot
+        return None
+
+    def claim(self):
+        with self._locked():
+            slot = self._find_free_slot()
+            if slot is None:
+                self._reap_dead_owners()
+                slot = self._find_free_slot()
+            if slot is None:
+                raise RuntimeError("Sem shards livres na memoria compartilhada")
+            start = self._offset(self._slot_row(slot))
+            self._cells[start] = os.getpid()
+
+        row = self._cells[start + 1 : start + self.stride]
+        return slot, row
+
+    def release(self, slot):
+        with self._locked():
+            self._fold(slot)
+
+    def column_total(self, column):
+        total = 0
+        with self._locked():
+            for row in range(1, self.HEADER_ROWS + self.slots):
+                start = self._offset(row)
+                if row >= self.HEADER_ROWS and self._cells[start] == 0:
+                    continue
+                total += self._cells[start + 1 + column]
+        return total
+
+    def snapshot(self):
+        totals = [0] * self.width
+        with self._locked():
+            for row in range(1, self.HEADER_ROWS + self.slots):
+                start = self._offset(row)
+                if row >= self.HEADER_ROWS and self._cells[start] == 0:
+                    continue
+                for column in range(self.width):
+                    totals[column] += self._cells[start + 1 + column]
+        return totals
+
+    def next_sequence(self, count=1):
+        with self._locked():
+            self._cells[0] += count
+            return self._cells[0]
+
+    def seed(self, totals, sequence):
+        retired = self._offset(1)
+        with self._locked():
+            for column, value in enumerate(totals):
+                self._cells[retired + 1 + column] += value
+            self._cells[0] += sequence
+
+    def unlink(self):
+        self._array.unlink()
+
+
+class _FileLock:
+    def __init__(self, thread_lock, lock_file):
+        self._thread_lock = thread_lock
+        self._lock_file = lock_file
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+class _ShardHandle:
+    def __init__(self, store):
+        self.key, self.row = store.claim()
+        # Quando a thread termina, seu shard e incorporado ao total aposentado
+        weakref.finalize(self, store.release, self.key)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Ledger:
+    def __init__(self, accounts, items=(), shm_name=None):
+        self.accounts = tuple(accounts)
+        self.items = tuple(items)
+        self._item_columns = {
+            item: FIRST_COUNTER + index for index, item in enumerate(self.items)
+        }
+        first_account = FIRST_COUNTER + len(self.items)
+        self._columns = {
+            account: first_account + index
+            for index, account in enumerate(self.accounts)
+        }
+        self.width = first_account + len(self.accounts)
+
+        if shm_name:
+            self._store = SharedShards(shm_name, self.width)
+        else:
+            self._store = LocalShards(self.width)
+
+        self._local = threading.local()
+
+    def _row(self):
+        handle = getattr(self._local, "handle", None)
+        if handle is None:
+            handle = _ShardHandle(self._store)
+            self._local.handle = handle
+        return handle.row
+
+    def record_order(self, price_cents, item=None):
+        row = self._row()
+        row[ORDERS] += 1
+        row[SALES] += price_cents
+        if item is not None:
+            row[self._item_columns[item]] += 1
+        return self._store.next_sequence()
+
+    def record_batch(self, orders):
+        # Agrega o lote localmente e aplica no shard uma unica vez
+        deltas = [0] * self.width
+        for item, account, price_cents, cashback_cents in orders:
+            deltas[SALES] += price_cents
+            deltas[CASHBACK] += cashback_cents
+            deltas[self._item_columns[item]] += 1
+            deltas[self._columns[account]] += cashback_cents
+        deltas[ORDERS] = len(orders)
+
+        row = self._row()
+        for column, value in enumerate(deltas):
+            if value:
+                row[column] += value
+
+        last = self._store.next_sequence(len(orders))
+        return last - len(orders) + 1
+
+    def add_cashback(self, account, cents):
+        row = self._row()
+        row[CASHBACK] += cents
+        row[self._columns[account]] += cents
+
+    @property
+    def created(self):
+        return self._store.created
+
+    def restore(self, orders, sales, balances, items, sequence):
+        totals = [0] * self.width
+        totals[ORDERS] = orders
+        totals[SALES] = sales
+        for account, cents in balances.items():
+            totals[CASHBACK] += cents
+            if account in self._columns:
+                totals[self._columns[account]] = cents
+        for item, count in items.items():
+            if item in self._item_columns:
+                totals[self._item_columns[item]] = count
+        self._store.seed(totals, sequence)
+
+    def unlink(self):
+        self._store.unlink()
+
+    def balance(self, account):
+        return self._store.column_total(self._columns[account])
+
+    def snapshot(self):
+        totals = self._store.snapshot()
+        return LedgerSnapshot(
+            orders=totals[ORDERS],
+            sales=totals[SALES],
+            cashback=totals[CASHBACK],
+            items={item: totals[column] for item, column in self._item_columns.items()},
+            balances={
+                account: totals[column] for account, column in self._columns.items()
+            },
+        )
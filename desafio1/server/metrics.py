@@ -0,0 +1,177 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request
+
+from ledger import LocalShards, SharedShards, _ShardHandle
+
+# Limites dos buckets de latencia em microssegundos (o ultimo bucket e +Inf)
+LATENCY_BUCKETS_US = (
+    100,
+    250,
+    500,
+    1_000,
+    2_500,
+    5_000,
+    10_000,
+    25_000,
+    50_000,
+    100_000,
+    250_000,
+    500_000,
+    1_000_000,
+    2_500_000,
+)
+STATUS_CLASSES = ("2xx", "3xx", "4xx", "5xx")
+STATUS_INDEX = {2: 0, 3: 1, 4: 2}
+OTHER_STATUS = 3
+
+# Colunas de cada endpoint dentro do shard
+IN_FLIGHT = len(STATUS_CLASSES)
+LATENCY_SUM = IN_FLIGHT + 1
+FIRST_BUCKET = LATENCY_SUM + 1
+ENDPOINT_WIDTH = FIRST_BUCKET + len(LATENCY_BUCKETS_US) + 1
+
+OTHER_ENDPOINT = "other"
+
+
+def _samples(name, samples):
+    lines = []
+    for labels, value in samples:
+        if labels:
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}")
+        else:
+            lines.append(f"{name} {value}")
+    return lines
+
+
+def format_family(name, kind, help_text, samples, suffixes=None):
+    # suffixes: {"_bucket": amostras, ...} para histogramas
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    if suffixes is None:
+        lines += _samples(name, samples)
+    else:
+        for suffix, suffix_samples in suffixes.items():
+            lines += _samples(name + suffix, suffix_samples)
+    return "\n".join(lines)
+
+
+def _format_le(bound_us):
+    return f"{bound_us / 1_000_000:g}"
+
+
+class RequestMetrics:
+    def __init__(self, endpoints, shm_name=None):
+        self.endpoints = tuple(endpoints) + (OTHER_ENDPOINT,)
+        self._bases = {
+            endpoint: index * ENDPOINT_WIDTH
+            for index, endpoint in enumerate(self.endpoints)
+        }
+        self._other = self._bases[OTHER_ENDPOINT]
+        width = len(self.endpoints) * ENDPOINT_WIDTH
+
+        if shm_name:
+            self._store = SharedShards(shm_name, width)
+        else:
+            self._store = LocalShards(width)
+
+        # Estado do request corrente fica na propria thread
+        self._local = threading.local()
+
+    def _state(self):
+        # [linha do shard, base do endpoint, status, inicio]: uma lista por
+        # thread, reaproveitada em todas as requisicoes
+        try:
+            return self._local.state
+        except AttributeError:
+            handle = _ShardHandle(self._store)
+            self._local.handle = handle
+            self._local.state = [handle.row, None, 0, 0]
+            return self._local.state
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        state = self._state()
+        base = self._bases.get(request.endpoint, self._other)
+        state[0][base + IN_FLIGHT] += 1
+        state[1] = base
+        state[2] = 500
+        state[3] = time.perf_counter_ns()
+
+    def _after_request(self, response):
+        self._local.state[2] = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        state = self._state()
+        row, base, status, started = state
+        if base is None:
+            return
+        elapsed_us = (time.perf_counter_ns() - started) // 1000
+        row[base + STATUS_INDEX.get(status // 100, OTHER_STATUS)] += 1
+        row[base + LATENCY_SUM] += elapsed_us
+        row[base + FIRST_BUCKET + bisect_left(LATENCY_BUCKETS_US, elapsed_us)] += 1
+        row[base + IN_FLIGHT] -= 1
+        state[1] = None
+
+    def render(self):
+        totals = self._store.snapshot()
+        requests = []
+        in_flight = []
+        buckets = []
+        sums = []
+        counts = []
+
+        for endpoint in self.endpoints:
+            base = self._bases[endpoint]
+            labels = {"endpoint": endpoint}
+            total = 0
+            for offset, status_class in enumerate(STATUS_CLASSES):
+                value = totals[base + offset]
+                total += value
+                if value:
+                    requests.append(
+                        ({"endpoint": endpoint, "status": status_class}, value)
+                    )
+            in_flight.append((labels, totals[base + IN_FLIGHT]))
+            if not total:
+                continue
+
+            cumulative = 0
+            for offset, bound in enumerate(LATENCY_BUCKETS_US):
+                cumulative += totals[base + FIRST_BUCKET + offset]
+                buckets.append(
+                    ({"endpoint": endpoint, "le": _format_le(bound)}, cumulative)
+                )
+            buckets.append(({"endpoint": endpoint, "le": "+Inf"}, total))
+            sums.append((labels, totals[base + LATENCY_SUM] / 1_000_000))
+            counts.append((labels, total))
+
+        families = [
+            format_family(
+                "http_requests_total",
+                "counter",
+                "Requisicoes HTTP por endpoint e classe de status.",
+                requests,
+            ),
+            format_family(
+                "http_requests_in_flight",
+                "gauge",
+                "Requisicoes HTTP em andamento por endpoint.",
+                in_flight,
+            ),
+            format_family(
+                "http_request_duration_seconds",
+                "histogram",
+                "Latencia das requisicoes HTTP.",
+                None,
+                suffixes={"_bucket": buckets, "_sum": sums, "_count": counts},
+            ),
+        ]
+        return "\n".join(families) + "\n"
@@ -0,0 +1,70 @@
+import os
+import random
+from collections import namedtuple
+from itertools import accumulate
+
+MenuEntry = namedtuple(
+    "MenuEntry",
+    [
+        "name",
+        "price",
+        "price_cents",
+        "price_label",
+        "cashback",
+        "cashback_cents",
+        "cashback_label",
+    ],
+)
+
+
+def parse_weights(spec):
+    # "Latte=5,Espresso=3" -> {"Latte": 5.0, "Espresso": 3.0}
+    weights = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+class OrderEngine:
+    # Tudo o que nao muda entre pedidos e calculado uma unica vez: tuplas
+    # imutaveis para o sorteio, precos em centavos e textos ja formatados
+    def __init__(self, menu, customers, calculate_cashback, weights=None, rng=None):
+        self._rng = rng or random.Random()
+        if rng is None:
+            # Com preload_app os workers herdam o estado do gerador do master:
+            # sem nova semente, todos sorteariam a mesma sequencia de pedidos
+            os.register_at_fork(after_in_child=self._rng.seed)
+        self.entries = {}
+        for name, data in menu.items():
+            price = data["price"]
+            cashback = calculate_cashback(price)
+            self.entries[name] = MenuEntry(
+                name=name,
+                price=price,
+                price_cents=int(round(price * 100)),
+                price_label=f"${price:.2f}",
+                cashback=cashback,
+                cashback_cents=int(round(cashback * 100)),
+                cashback_label=f"${cashback:.2f}",
+            )
+
+        self.items = tuple(self.entries.values())
+        self.customers = tuple(customers.items())
+
+        self._cum_weights = None
+        if weights:
+            unknown = set(weights) - set(self.entries)
+            if unknown:
+                raise ValueError(f"Itens desconhecidos nos pesos: {sorted(unknown)}")
+            self._cum_weights = tuple(
+                accumulate(weights.get(entry.name, 1.0) for entry in self.items)
+            )
+
+    def pick_item(self):
+        if self._cum_weights:
+            return self._rng.choices(self.items, cum_weights=self._cum_weights)[0]
+        return self._rng.choice(self.items)
+
+    def pick_customer(self):
+        return self._rng.choice(self.customers)
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import namedtuple
+
+from ledger import SharedArray
+
+MINUTE_SLOTS = 60
+HOUR_SLOTS = 24
+
+WindowTotals = namedtuple("WindowTotals", ["orders", "sales"])
+
+
+class _BucketRing:
+    # Cada slot guarda [periodo, pedidos, vendas] em cells; o slot e
+    # reaproveitado quando um novo periodo cai na mesma posicao do anel
+    def __init__(self, cells, offset, slots, period):
+        self.cells = cells
+        self.offset = offset
+        self.slots = slots
+        self.period = period
+
+    def add(self, now, price_cents, orders=1):
+        stamp = int(now // self.period)
+        base = self.offset + (stamp % self.slots) * 3
+        cells = self.cells
+        if cells[base] != stamp:
+            cells[base] = stamp
+            cells[base + 1] = 0
+            cells[base + 2] = 0
+        cells[base + 1] += orders
+        cells[base + 2] += price_cents
+
+    def _buckets(self):
+        cells = self.cells
+        for base in range(self.offset, self.offset + self.slots * 3, 3):
+            yield cells[base], cells[base + 1], cells[base + 2]
+
+    def total(self, now, periods):
+        current = int(now // self.period)
+        orders = sales = 0
+        for stamp, count, cents in self._buckets():
+            if current - periods < stamp <= current:
+                orders += count
+                sales += cents
+        return WindowTotals(orders, sales)
+
+    def series(self, now):
+        current = int(now // self.period)
+        return sorted(
+            (stamp * self.period, WindowTotals(count, cents))
+            for stamp, count, cents in self._buckets()
+            if current - self.slots < stamp <= current
+        )
+
+
+class OrderStats:
+    def __init__(self, shm_name=None, clock=time.time):
+        self._clock = clock
+        length = (MINUTE_SLOTS + HOUR_SLOTS) * 3
+
+        if shm_name:
+            # Com varios workers, as janelas ficam em memoria compartilhada
+            self._array = SharedArray(shm_name, length)
+            cells = self._array.cells
+            self._locked = self._array.locked
+        else:
+            self._array = None
+            cells = [0] * length
+            lock = threading.Lock()
+            self._locked = lambda: lock
+
+        self._minutes = _BucketRing(cells, 0, MINUTE_SLOTS, 60)
+        self._hours = _BucketRing(cells, MINUTE_SLOTS * 3, HOUR_SLOTS, 3600)
+
+    def record(self, price_cents, orders=1):
+        now = self._clock()
+        with self._locked():
+            self._minutes.add(now, price_cents, orders)
+            self._hours.add(now, price_cents, orders)
+
+    def window(self, seconds):
+        now = self._clock()
+        with self._locked():
+            return self._minutes.total(now, seconds // 60)
+
+    def hourly(self):
+        now = self._clock()
+        with self._locked():
+            return self._hours.series(now)
+
+    def unlink(self):
+        if self._array:
+            self._array.unlink()
+
+
+def value_percentiles(histogram, points=(50, 90, 99)):
+    # histogram: {valor: quantidade}; o custo depende apenas de valores distintos
+    total = sum(histogram.values())
+    values = sorted(histogram.items())
+    result = {}
+
+    for point in points:
+        if total == 0:
+            result[point] = 0
+            continue
+        rank = max(1, -(-point * total // 100))
+        seen = 0
+        for value, count in values:
+            seen += count
+            if seen >= rank:
+                result[point] = value
+                break
+
+    return result
@@ -0,0 +1,50 @@
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from flask import Response, request
+
+CachedResponse = namedtuple(
+    "CachedResponse", ["body", "etag", "last_modified", "version"]
+)
+
+
+class ResponseCache:
+    def __init__(self, app):
+        self._app = app
+        self._entries = {}
+
+    def get(self, key, build, version=None):
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            entry = self._render(key, build(), version)
+        return entry
+
+    def _render(self, key, payload, version):
+        body = self._app.json.response(payload).get_data()
+        entry = CachedResponse(
+            body=body,
+            etag=hashlib.sha1(body).hexdigest()[:20],
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0),
+            version=version,
+        )
+        self._entries[key] = entry
+        return entry
+
+    def respond(self, key, build, version=None):
+        entry = self.get(key, build, version)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(entry.etag)
+        else:
+            since = request.if_modified_since
+            not_modified = since is not None and entry.last_modified <= since
+
+        response = Response(
+            None if not_modified else entry.body,
+            status=304 if not_modified else 200,
+            mimetype="application/json",
+        )
+        response.set_etag(entry.etag)
+        response.last_modified = entry.last_modified
+        return response
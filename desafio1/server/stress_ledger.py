@@ -0,0 +1,204 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from ledger import Ledger
+
+ACCOUNTS = ("111.111.111-11", "222.222.222-22", "333.333.333-33")
+
+
+def run_http(requests, threads):
+    from app import app
+
+    client = app.test_client()
+    expected_sales = 0.0
+    expected_cashback = {}
+    numbers = set()
+    lock = threading.Lock()
+
+    def place_order(_):
+        data = client.get("/").get_json()
+        return data["order"], data["customer"]
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for order, customer in pool.map(place_order, range(requests)):
+            with lock:
+                numbers.add(order["number"])
+                expected_sales += float(order["price"].lstrip("$"))
+                cpf = customer["cpf"]
+                earned = float(customer["cashback_earned"].lstrip("$"))
+                expected_cashback[cpf] = expected_cashback.get(cpf, 0.0) + earned
+
+    stats = client.get("/stats").get_json()
+    cafeteria = stats["cafeteria"]
+    balances = {c["cpf"]: c["cashback_balance"] for c in stats["customers"].values()}
+
+    failures = []
+    if cafeteria["total_orders"] != requests:
+        failures.append(f"pedidos: {cafeteria['total_orders']} != {requests}")
+    if len(numbers) != requests:
+        failures.append(f"numeros de pedido repetidos: {requests - len(numbers)}")
+    if cafeteria["daily_sales"] != f"${expected_sales:.2f}":
+        failures.append(f"vendas: {cafeteria['daily_sales']} != ${expected_sales:.2f}")
+    for cpf, amount in expected_cashback.items():
+        if balances[cpf] != f"${amount:.2f}":
+            failures.append(f"cashback {cpf}: {balances[cpf]} != ${amount:.2f}")
+    return failures
+
+
+def _hammer(shm_name, orders, threads):
+    ledger = Ledger(ACCOUNTS, shm_name=shm_name)
+
+    def worker(index):
+        for _ in range(orders):
+            ledger.record_order(100)
+            ledger.add_cashback(ACCOUNTS[index % len(ACCOUNTS)], 1)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+
+def run_shared(workers, orders, threads):
+    shm_name = f"ledger-stress-{os.getpid()}"
+    ledger = Ledger(ACCOUNTS, shm_name=shm_name)
+
+    processes = [
+        multiprocessing.Process(target=_hammer, args=(shm_name, orders, threads))
+        for _ in range(workers)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    snapshot = ledger.snapshot()
+    expected = workers * threads * orders
+    ledger.unlink()
+
+    failures = []
+    if snapshot.orders != expected:
+        failures.append(f"pedidos (shm): {snapshot.orders} != {expected}")
+    if snapshot.sales != expected * 100:
+        failures.append(f"vendas (shm): {snapshot.sales} != {expected * 100}")
+    if sum(snapshot.balances.values()) != expected:
+        failures.append(
+            f"cashback (shm): {sum(snapshot.balances.values())} != {expected}"
+        )
+    return failures
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.load(response)
+
+
+def run_gunicorn(workers, requests, threads):
+    # gunicorn de verdade, com o gunicorn.conf.py do container (preload_app):
+    # os workers herdam o ledger do master e disputam a mesma sequencia
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env.pop("JOURNAL_DIR", None)
+    env.pop("LEDGER_SHM_READY", None)
+    env.update(
+        PORT=str(port),
+        WEB_WORKERS=str(workers),
+        LEDGER_SHM_NAME=f"ledger-stress-gunicorn-{os.getpid()}",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                _get_json(f"{base_url}/health")
+                break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    return ["gunicorn nao subiu"]
+                time.sleep(0.1)
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            numbers = list(
+                pool.map(
+                    lambda _: _get_json(f"{base_url}/")["order"]["number"],
+                    range(requests),
+                )
+            )
+        total = _get_json(f"{base_url}/stats")["cafeteria"]["total_orders"]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    failures = []
+    if len(set(numbers)) != requests:
+        failures.append(
+            f"numeros de pedido repetidos (gunicorn): {requests - len(set(numbers))}"
+        )
+    if total != requests:
+        failures.append(f"pedidos (gunicorn): {total} != {requests}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de estresse do ledger")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument(
+        "--gunicorn-workers",
+        type=int,
+        default=4,
+        help="Workers do teste com gunicorn (0 desativa)",
+    )
+    args = parser.parse_args()
+
+    print(f"HTTP: {args.requests} pedidos em {args.threads} threads...")
+    failures = run_http(args.requests, args.threads)
+
+    print(
+        f"Memoria compartilhada: {args.workers} workers x 8 threads x {args.orders} pedidos..."
+    )
+    failures += run_shared(args.workers, args.orders, 8)
+
+    if args.gunicorn_workers:
+        print(
+            f"gunicorn: {args.requests} pedidos em {args.gunicorn_workers} workers..."
+        )
+        failures += run_gunicorn(args.gunicorn_workers, args.requests, 64)
+
+    if failures:
+        print("FALHOU:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+    print("OK: nenhum pedido ou cashback perdido")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,8 @@ echo "  • http://localhost:8080        - Fazer pedido"
 echo "  • http://localhost:8080/menu   - Ver cardápio"
 echo "  • http://localhost:8080/stats  - Ver estatísticas"
 echo "  • http://localhost:8080/health - Status da cafeteria"
+echo "  • http://localhost:8080/metrics - Métricas (Prometheus)"
+echo "  • POST http://localhost:8080/orders/batch - Lote de pedidos"
 echo ""
 echo "Para ver os pedidos em tempo real:"
 echo "  ./logs.sh"
@@ -28,6 +28,27 @@ curl -s http://localhost:8080/menu | python3 -m json.tool
 echo ""
 echo ""
 
+echo "4.1. Revalidando cardápio com ETag (espera HTTP 304):"
+echo "------------------------------------------------------------"
+etag=$(curl -s -D - -o /dev/null http://localhost:8080/menu | grep -i '^etag:' | cut -d' ' -f2 | tr -d '\r')
+curl -s -o /dev/null -w "HTTP %{http_code}\n" -H "If-None-Match: $etag" http://localhost:8080/menu
+echo ""
+echo ""
+
+echo "4.2. Enviando lote de pedidos (/orders/batch):"
+echo "------------------------------------------------------------"
+curl -s -X POST -H "Content-Type: application/json" \
+    -d '{"orders": [{"item": "Latte", "customer": "Ross"}, {"item": "Muffin", "customer": "Rachel"}]}' \
+    http://localhost:8080/orders/batch | python3 -m json.tool
+echo ""
+echo ""
+
+echo "4.3. Consultando métricas (/metrics):"
+echo "------------------------------------------------------------"
+curl -s http://localhost:8080/metrics | grep -v '^#' | head -20
+echo ""
+echo ""
+
 echo "5. Logs dos clientes (últimas 25 linhas):"
 echo "------------------------------------------------------------"
 docker compose  logs --tail=25 web-client
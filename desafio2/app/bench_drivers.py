@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import time
+
+# Schema proprio, como em bench_scale; PGOPTIONS vale para os dois drivers
+# (db_async converte as opcoes em server_settings)
+DRIVERS_SCHEMA = "catalog_drivers"
+os.environ["PGOPTIONS"] = f"-c search_path={DRIVERS_SCHEMA}"
+
+import catalog_async  # noqa: E402
+from bulk_import import import_rows  # noqa: E402
+from catalog_generator import DEFAULT_SEED, generate_rows  # noqa: E402
+from db_pool import pool  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+DRIVERS = ("psycopg2", "asyncpg")
+SCRIPTS = {
+    "headphones_catalog.main()": "headphones_catalog.py",
+    "reader.main()": "reader.py",
+}
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def reset_schema():
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {DRIVERS_SCHEMA} CASCADE")
+            cursor.execute(f"CREATE SCHEMA {DRIVERS_SCHEMA}")
+        conn.commit()
+        migrate(conn)
+
+
+def truncate():
+    with pool.cursor() as cursor:
+        cursor.execute("TRUNCATE headphones RESTART IDENTITY")
+
+
+def run_script(script, driver):
+    # Processo novo por execucao: mede o fluxo completo, do import ao fim da
+    # saida, escolhendo o driver so pela variavel de ambiente
+    env = dict(os.environ, DB_DRIVER=driver, READER_CACHE="")
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(HERE, script)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def best_of(function, repeat, before=None):
+    timings = []
+    for _ in range(repeat):
+        if before:
+            before()
+        timings.append(function())
+    return min(timings)
+
+
+def time_import(driver, method, rows, seed):
+    truncate()
+    data = generate_rows(rows, seed)
+    start = time.perf_counter()
+    if driver == "asyncpg":
+        asyncio.run(_async_import(data, method))
+    else:
+        import_rows(data, method)
+    return time.perf_counter() - start
+
+
+async def _async_import(rows, method):
+    try:
+        await catalog_async.import_rows(rows, method)
+    finally:
+        await catalog_async.pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="psycopg2 x asyncpg no fluxo do catalogo"
+    )
+    parser.add_argument(
+        "--sizes",
+        default="0,10000,100000",
+        help="Fones no catalogo antes de cada main() (0 = popula os exemplos)",
+    )
+    parser.add_argument(
+        "--rows", type=int, default=100000, help="Linhas na carga do writer"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    results = {}
+
+    try:
+        for size in sizes:
+            reset_schema()
+            if size:
+                import_rows(generate_rows(size, args.seed))
+            for (label, script), driver in itertools.product(SCRIPTS.items(), DRIVERS):
+                # Com 0 fones o catalogo popula os exemplos: cada execucao
+                # comeca de uma tabela vazia
+                before = (
+                    truncate
+                    if size == 0 and script == "headphones_catalog.py"
+                    else None
+                )
+                elapsed = best_of(
+                    lambda: run_script(script, driver), args.repeat, before
+                )
+                results[(label, driver, size)] = elapsed
+                print(
+                    f"{size:>8} fones | {label:<26} {driver:<9} {elapsed * 1000:>10.1f} ms",
+                    flush=True,
+                )
+
+        for method, driver in itertools.product(("copy", "values"), DRIVERS):
+            elapsed = best_of(
+                lambda: time_import(driver, method, args.rows, args.seed), args.repeat
+            )
+            results[(f"carga {method}", driver, args.rows)] = elapsed
+            print(
+                f"{args.rows:>8} fones | {'carga ' + method:<26} {driver:<9} "
+                f"{elapsed * 1000:>10.1f} ms ({args.rows / elapsed:.0f} linhas/s)",
+                flush=True,
+            )
+
+        with pool.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA {DRIVERS_SCHEMA} CASCADE")
+    finally:
+        pool.close()
+
+    print("\nResumo (ms, melhor execucao):")
+    print(
+        f"{'fluxo':<26} {'fones':>8}" + "".join(f"{driver:>12}" for driver in DRIVERS)
+    )
+    for label, driver, size in results:
+        if driver != DRIVERS[0]:
+            continue
+        print(
+            f"{label:<26} {size:>8}"
+            + "".join(
+                f"{results[(label, other, size)] * 1000:>12.1f}" for other in DRIVERS
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import time
+
+from db_pool import ConnectionPool, connect
+
+# Insere em uma tabela de rascunho com o mesmo schema de headphones, para
+# nao misturar as linhas do benchmark com o catalogo
+BENCH_TABLE = "headphones_bench"
+
+INSERT_SQL = f"""
+    INSERT INTO {BENCH_TABLE} (brand, model, type, driver_size, impedance, sensitivity,
+                               frequency_response, cable_type, weight, price,
+                               sound_signature, notes)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    RETURNING id
+"""
+
+
+def sample_row(index):
+    return (
+        "Bench",
+        f"Model {index}",
+        "Open-back Over-ear",
+        40,
+        32,
+        100,
+        "20Hz - 20kHz",
+        "Detachable 3.5mm",
+        300,
+        199.00,
+        "Neutral",
+        "",
+    )
+
+
+def insert_without_pool(row):
+    # Comportamento anterior: uma conexao (TCP + autenticacao) por linha
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(INSERT_SQL, row)
+            cursor.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def make_pooled_insert(pool):
+    def insert_with_pool(row):
+        with pool.cursor() as cursor:
+            cursor.execute(INSERT_SQL, row)
+            cursor.fetchone()
+
+    return insert_with_pool
+
+
+def reset_table(pool):
+    with pool.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        cursor.execute(
+            f"""
+            CREATE TABLE {BENCH_TABLE} (
+                id SERIAL PRIMARY KEY,
+                brand VARCHAR(100) NOT NULL,
+                model VARCHAR(100) NOT NULL,
+                type VARCHAR(50) NOT NULL,
+                driver_size INTEGER,
+                impedance INTEGER,
+                sensitivity INTEGER,
+                frequency_response VARCHAR(50),
+                cable_type VARCHAR(100),
+                weight INTEGER,
+                price DECIMAL(10, 2),
+                sound_signature VARCHAR(50),
+                notes TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+        )
+
+
+def run(insert, rows):
+    start = time.perf_counter()
+    for index in range(rows):
+        insert(sample_row(index))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Insercoes com e sem pool de conexoes")
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    pool = ConnectionPool(min_size=1, max_size=1)
+    try:
+        reset_table(pool)
+        without_pool = run(insert_without_pool, args.rows)
+        reset_table(pool)
+        with_pool = run(make_pooled_insert(pool), args.rows)
+
+        with pool.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {BENCH_TABLE}")
+    finally:
+        pool.close()
+
+    print(f"Insercoes: {args.rows}")
+    print(f"Sem pool: {without_pool:8.2f}s ({args.rows / without_pool:10.0f} linhas/s)")
+    print(f"Com pool: {with_pool:8.2f}s ({args.rows / with_pool:10.0f} linhas/s)")
+    print(f"Ganho: {without_pool / with_pool:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import tempfile
+import time
+
+# O benchmark roda em um schema proprio; PGOPTIONS vale para todas as
+# conexoes do pool, inclusive as abertas por headphones_catalog e reader
+SCALE_SCHEMA = "catalog_scale"
+os.environ["PGOPTIONS"] = f"-c search_path={SCALE_SCHEMA}"
+SCALE_CACHE = os.path.join(tempfile.gettempdir(), f"{SCALE_SCHEMA}_reader.sqlite3")
+
+import headphones_catalog  # noqa: E402
+import reader  # noqa: E402
+from bulk_import import import_rows  # noqa: E402
+from catalog_generator import DEFAULT_SEED, generate_rows  # noqa: E402
+from catalog_search import SearchFilters, search_headphones  # noqa: E402
+from db_pool import pool  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+OPERATIONS = {
+    "count_headphones": headphones_catalog.count_headphones,
+    "get_statistics": headphones_catalog.get_statistics,
+    "get_statistics (percentis)": lambda: headphones_catalog.get_statistics(
+        percentiles=True
+    ),
+    "list_headphones": headphones_catalog.list_headphones,
+    # show_catalog e o read_catalog sem o pool.close() final, que faria as
+    # operacoes medidas em seguida pagarem a reconexao
+    "reader.read_catalog": lambda: reader.show_catalog(cache_path=""),
+    "reader.read_catalog (cache)": lambda: reader.show_catalog(cache_path=SCALE_CACHE),
+    "busca: primeira pagina": lambda: search_headphones(SearchFilters()),
+    "busca: tipo + preco": lambda: search_headphones(
+        SearchFilters(type="Open-back Over-ear", min_price=300, max_price=800)
+    ),
+    "busca: marca rara": lambda: search_headphones(SearchFilters(brand="ZMF")),
+    "busca: texto": lambda: search_headphones(SearchFilters(text="planar")),
+    "busca: texto raro": lambda: search_headphones(
+        SearchFilters(text='"limited edition"')
+    ),
+}
+
+
+class _Discard(io.TextIOBase):
+    # Saida descartada, mas ainda formatada e escrita como no terminal
+    def write(self, text):
+        return len(text)
+
+
+def reset_schema():
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCALE_SCHEMA} CASCADE")
+            cursor.execute(f"CREATE SCHEMA {SCALE_SCHEMA}")
+        conn.commit()
+        migrate(conn)
+
+
+def drop_schema():
+    with pool.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCALE_SCHEMA} CASCADE")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(SCALE_CACHE + suffix):
+            os.remove(SCALE_CACHE + suffix)
+
+
+def vacuum():
+    with pool.connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("VACUUM ANALYZE headphones")
+        finally:
+            conn.autocommit = False
+
+
+def measure(operation, repeat, budget):
+    # Melhor de ate `repeat` execucoes; operacoes longas (listagens com
+    # milhoes de linhas) param quando o tempo acumulado passa de `budget`
+    timings = []
+    spent = 0.0
+    while len(timings) < repeat and (not timings or spent < budget):
+        with contextlib.redirect_stdout(_Discard()):
+            start = time.perf_counter()
+            operation()
+            elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        spent += elapsed
+    return min(timings)
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.2f}" if seconds < 10 else f"{seconds:.1f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Operacoes do catalogo em escala")
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000,100000,1000000,10000000",
+        help="Tamanhos do catalogo (cumulativos)",
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=3, help="Execucoes por operacao")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=10.0,
+        help="Segundos por operacao antes de parar",
+    )
+    parser.add_argument(
+        "--only", action="append", choices=sorted(OPERATIONS), help="Operacoes a medir"
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="Nao remove o schema no final"
+    )
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    operations = {name: OPERATIONS[name] for name in args.only or OPERATIONS}
+    loads = {}
+    results = {name: {} for name in operations}
+    rows = generate_rows(seed=args.seed)
+
+    try:
+        reset_schema()
+        loaded = 0
+        for size in sizes:
+            start = time.perf_counter()
+            count = import_rows(itertools.islice(rows, size - loaded))
+            loads[size] = count / (time.perf_counter() - start)
+            loaded = size
+            vacuum()
+            print(f"{size:>10} linhas | carga {loads[size]:>9.0f} linhas/s", flush=True)
+
+            for name, operation in operations.items():
+                results[name][size] = measure(operation, args.repeat, args.budget)
+                print(
+                    f"{'':>10}        | {name:<28} {format_ms(results[name][size]):>10}",
+                    flush=True,
+                )
+
+        if not args.keep:
+            drop_schema()
+    finally:
+        pool.close()
+
+    print("\nResumo (ms, melhor execucao):")
+    print(f"{'operacao':<28}" + "".join(f"{size:>12}" for size in sizes))
+    print(
+        f"{'carga (linhas/s)':<28}" + "".join(f"{loads[size]:>12.0f}" for size in sizes)
+    )
+    for name, timings in results.items():
+        print(
+            f"{name:<28}" + "".join(f"{format_ms(timings[size]):>12}" for size in sizes)
+        )
+
+
+if __name__ == "__main__":
+    main()
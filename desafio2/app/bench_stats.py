@@ -0,0 +1,68 @@
+import argparse
+import time
+
+from catalog_stats import collect_statistics
+from db_pool import pool
+
+# Consultas feitas antes do motor de estatisticas: cinco em get_statistics()
+# e tres no leitor, cada uma varrendo a tabela inteira
+LEGACY_QUERIES = (
+    "SELECT COUNT(*) FROM headphones",
+    "SELECT AVG(price) FROM headphones",
+    "SELECT type, COUNT(*) as count FROM headphones GROUP BY type ORDER BY count DESC",
+    "SELECT brand, COUNT(*) as count FROM headphones GROUP BY brand ORDER BY count DESC",
+    "SELECT AVG(impedance) FROM headphones",
+    "SELECT AVG(price) FROM headphones",
+    "SELECT MIN(price) FROM headphones",
+    "SELECT MAX(price) FROM headphones",
+)
+
+
+def legacy(cursor):
+    for sql in LEGACY_QUERIES:
+        cursor.execute(sql)
+        cursor.fetchall()
+
+
+def best_of(function, repeat):
+    timings = []
+    with pool.cursor() as cursor:
+        function(cursor)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(cursor)
+            timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Estatisticas: consultas separadas x uma varredura"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--percentiles", action="store_true", help="Inclui percentis exatos de preco"
+    )
+    args = parser.parse_args()
+
+    try:
+        with pool.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM headphones")
+            rows = cursor.fetchone()[0]
+        before = best_of(legacy, args.repeat)
+        percentiles = ("price",) if args.percentiles else ()
+        after = best_of(
+            lambda cursor: collect_statistics(cursor, percentiles=percentiles),
+            args.repeat,
+        )
+    finally:
+        pool.close()
+
+    print(f"Linhas: {rows}")
+    print(f"Antes  ({len(LEGACY_QUERIES)} consultas): {before * 1000:10.1f} ms")
+    print(f"Depois (1 consulta):  {after * 1000:10.1f} ms")
+    print(f"Ganho: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db_pool import pool
+
+COLUMNS = (
+    "brand",
+    "model",
+    "type",
+    "driver_size",
+    "impedance",
+    "sensitivity",
+    "frequency_response",
+    "cable_type",
+    "weight",
+    "price",
+    "sound_signature",
+    "notes",
+)
+NUMERIC_COLUMNS = {"driver_size", "impedance", "sensitivity", "weight", "price"}
+
+COPY_NULL = "\\N"
+COPY_SQL = (
+    f"COPY headphones ({', '.join(COLUMNS)}) FROM STDIN "
+    f"WITH (FORMAT csv, NULL '{COPY_NULL}')"
+)
+INSERT_SQL = f"INSERT INTO headphones ({', '.join(COLUMNS)}) VALUES %s"
+
+# Chave natural do catalogo (indice unico headphones_brand_model_key)
+KEY_COLUMNS = ("brand", "model")
+UPDATE_COLUMNS = tuple(column for column in COLUMNS if column not in KEY_COLUMNS)
+
+# Uma linha identica a existente nao e reescrita: reimportar o mesmo arquivo
+# nao gera tuplas mortas, nem nova versao do catalogo, nem trabalho no resumo
+UPSERT_CLAUSE = (
+    f"ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE "
+    f"SET ({', '.join(UPDATE_COLUMNS)}) = "
+    f"({', '.join(f'EXCLUDED.{column}' for column in UPDATE_COLUMNS)}) "
+    f"WHERE ({', '.join(f'headphones.{column}' for column in UPDATE_COLUMNS)}) "
+    f"IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in UPDATE_COLUMNS)})"
+)
+UPSERT_SQL = f"{INSERT_SQL} {UPSERT_CLAUSE}"
+
+
+def _normalize(record):
+    row = []
+    for column in COLUMNS:
+        value = record.get(column)
+        if value == "" and column in NUMERIC_COLUMNS:
+            value = None
+        row.append(value)
+    return tuple(row)
+
+
+def read_csv(stream):
+    # Cabecalho com os nomes das colunas de headphones
+    for record in csv.DictReader(stream):
+        yield _normalize(record)
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield _normalize(json.loads(line))
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+class _CopyStream:
+    # Objeto "arquivo" consumido pelo COPY: serializa as linhas sob demanda,
+    # entao apenas um bloco fica em memoria por vez
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.count = 0
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+        self._pending = ""
+
+    def read(self, size=-1):
+        size = size if size and size > 0 else 8192
+        while len(self._pending) < size:
+            chunk = self._next_chunk(size)
+            if not chunk:
+                break
+            self._pending += chunk
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def _next_chunk(self, size):
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        for row in self.rows:
+            self._writer.writerow(
+                COPY_NULL if value is None else value for value in row
+            )
+            self.count += 1
+            if self._buffer.tell() >= size:
+                break
+        return self._buffer.getvalue()
+
+
+def copy_rows(cursor, rows):
+    stream = _CopyStream(rows)
+    cursor.copy_expert(COPY_SQL, stream)
+    return stream.count
+
+
+def insert_rows(cursor, rows, batch_size=1000):
+    # Fallback para quando COPY nao esta disponivel (ex.: poolers que nao
+    # repassam o protocolo de copia)
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return count
+        execute_values(cursor, INSERT_SQL, batch, page_size=batch_size)
+        count += len(batch)
+
+
+def unique_batch(batch):
+    # Um INSERT ... ON CONFLICT nao pode alterar a mesma linha duas vezes:
+    # dentro do lote vale a ultima ocorrencia de cada (brand, model)
+    key = [COLUMNS.index(column) for column in KEY_COLUMNS]
+    return list({tuple(row[index] for index in key): row for row in batch}.values())
+
+
+def upsert_rows(cursor, rows, batch_size=1000):
+    # Retorna as linhas inseridas ou alteradas; as identicas nao contam
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return count
+        batch = unique_batch(batch)
+        execute_values(cursor, UPSERT_SQL, batch, page_size=len(batch))
+        count += cursor.rowcount
+
+
+def import_rows(rows, method="copy", batch_size=1000):
+    # Tudo em uma unica transacao: ou o lote inteiro entra, ou nada entra
+    with pool.cursor() as cursor:
+        if method == "copy":
+            return copy_rows(cursor, rows)
+        if method == "upsert":
+            return upsert_rows(cursor, rows, batch_size)
+        return insert_rows(cursor, rows, batch_size)
+
+
+def detect_format(path):
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importacao em massa de fones")
+    parser.add_argument("path", help="Arquivo CSV ou JSON lines ('-' para stdin)")
+    parser.add_argument("--format", choices=sorted(READERS))
+    parser.add_argument(
+        "--method",
+        choices=("copy", "values", "upsert"),
+        default="copy",
+        help="upsert atualiza fones ja existentes em vez de falhar",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if args.path == "-":
+        stream = sys.stdin
+    else:
+        stream = open(args.path, newline="", encoding="utf-8")
+
+    start = time.perf_counter()
+    try:
+        count = import_rows(READERS[fmt](stream), args.method, args.batch_size)
+    except psycopg2.errors.UniqueViolation as e:
+        print(
+            f"Fone ja existente no catalogo; nada foi importado. Use --method upsert.\n{e}"
+        )
+        sys.exit(1)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        pool.close()
+    elapsed = time.perf_counter() - start
+
+    # No upsert, count sao os fones novos ou alterados
+    print(
+        f"Importados {count} fones via {args.method} em {elapsed:.2f}s "
+        f"({count / elapsed if elapsed else 0:.0f} linhas/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
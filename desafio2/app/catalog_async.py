@@ -0,0 +1,198 @@
+import asyncio
+import itertools
+import sys
+from decimal import Decimal
+
+import asyncpg
+
+import headphones_catalog
+import reader
+from bulk_import import COLUMNS, NUMERIC_COLUMNS, UPSERT_CLAUSE, unique_batch
+from catalog_stats import build_statistics, rollup_statistics, statistics_query
+from catalog_summary import SUMMARY_COUNT_SQL, summary_query
+from db_async import pool
+from db_pool import pool as sync_pool
+from output import write_blocks
+
+
+def _array_type(column):
+    if column == "price":
+        return "numeric[]"
+    return "integer[]" if column in NUMERIC_COLUMNS else "text[]"
+
+
+# Um INSERT por lote, com uma array por coluna: os triggers por comando
+# (resumo e versao do catalogo) disparam uma vez por lote, como no
+# execute_values do psycopg2, e nao uma vez por linha
+INSERT_SQL = (
+    f"INSERT INTO headphones ({', '.join(COLUMNS)}) "
+    f"SELECT * FROM unnest("
+    f"{', '.join(f'${index}::{_array_type(column)}' for index, column in enumerate(COLUMNS, 1))})"
+)
+UPSERT_SQL = f"{INSERT_SQL} {UPSERT_CLAUSE}"
+
+
+def _typed(row):
+    # asyncpg usa o protocolo binario: inteiros e decimais precisam chegar
+    # como int/Decimal, nao como o texto lido de um CSV
+    values = []
+    for column, value in zip(COLUMNS, row):
+        if value is None or column not in NUMERIC_COLUMNS:
+            values.append(value)
+        elif column == "price":
+            values.append(Decimal(str(value)))
+        else:
+            values.append(int(value))
+    return tuple(values)
+
+
+async def import_rows(rows, method="copy", batch_size=1000):
+    # copy: protocolo COPY binario; values: um INSERT ... unnest por lote;
+    # upsert: idem com ON CONFLICT, contando so as linhas novas ou alteradas
+    rows = map(_typed, rows)
+    async with pool.connection() as conn:
+        if method == "copy":
+            result = await conn.copy_records_to_table(
+                "headphones", records=rows, columns=COLUMNS
+            )
+            return int(result.split()[-1])
+
+        sql = UPSERT_SQL if method == "upsert" else INSERT_SQL
+        count = 0
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                return count
+            if method == "upsert":
+                batch = unique_batch(batch)
+            status = await conn.execute(sql, *zip(*batch))
+            count += int(status.split()[-1])
+
+
+async def collect_statistics(conn, percentiles=False):
+    # Como o caminho sincrono: o resumo so se a migracao ja o criou e ele
+    # cobre as metricas; senao (ou com percentis) varre a tabela
+    sql = None if percentiles else summary_query()
+    if sql is not None and await conn.fetchval(
+        "SELECT to_regclass('headphones_summary') IS NOT NULL"
+    ):
+        return build_statistics(await conn.fetch(sql))
+    distributions = ("price",) if percentiles else ()
+    return rollup_statistics(
+        await conn.fetch(statistics_query(distributions)), distributions
+    )
+
+
+async def get_statistics(percentiles=False, snapshot=None):
+    async with pool.snapshot(shared=snapshot) as conn:
+        return await collect_statistics(conn, percentiles)
+
+
+async def write_listing(chunks, format_row, first=None):
+    # Formata um bloco enquanto o proximo ja esta sendo buscado no servidor:
+    # a escrita roda em outra thread, deixando o loop livre para o fetch
+    pending = first
+    while pending:
+        next_chunk = asyncio.ensure_future(anext(chunks, None))
+        try:
+            await asyncio.to_thread(write_blocks, map(format_row, pending))
+        except BaseException:
+            next_chunk.cancel()
+            raise
+        pending = await next_chunk
+
+
+async def list_headphones(conn=None):
+    chunks = pool.stream(headphones_catalog.LIST_SQL, conn=conn)
+    first = await anext(chunks, None)
+    if first is None:
+        print("\nNenhum fone encontrado no catalogo.")
+        return
+
+    headphones_catalog.print_catalog_header()
+    await write_listing(chunks, headphones_catalog.format_headphone, first)
+
+
+async def run_catalog():
+    headphones_catalog.print_banner()
+
+    # Migracoes continuam no driver sincrono: DDL, advisory lock e CREATE
+    # INDEX CONCURRENTLY em autocommit, uma vez por execucao
+    try:
+        headphones_catalog.init_database()
+    finally:
+        sync_pool.close()
+
+    try:
+        count = await pool.fetchval(SUMMARY_COUNT_SQL)
+        print(f"\nFones no catalogo: {count}")
+
+        if count == 0:
+            print("\nCatalogo vazio. Adicionando dados de exemplo...")
+            print("\nAdicionando fones de exemplo ao catalogo...")
+            added = await import_rows(headphones_catalog.SAMPLE_HEADPHONES, "upsert")
+            print(f"\n{added} fones de exemplo adicionados com sucesso!")
+        else:
+            print("\nDados persistidos encontrados!")
+
+        # Estatisticas calculadas em outra conexao enquanto a listagem e
+        # escrita, as duas no mesmo snapshot exportado pela listagem
+        async with pool.snapshot() as conn:
+            snapshot = await conn.fetchval("SELECT pg_export_snapshot()")
+            statistics = asyncio.create_task(
+                get_statistics(headphones_catalog.STATS_PERCENTILES, snapshot)
+            )
+            try:
+                await list_headphones(conn)
+            except BaseException:
+                statistics.cancel()
+                raise
+            headphones_catalog.print_statistics(await statistics)
+
+        headphones_catalog.print_footer()
+    finally:
+        await pool.close()
+
+
+async def read_catalog_async():
+    reader.print_header()
+
+    try:
+        # Estatisticas em outra conexao enquanto o primeiro bloco da listagem
+        # e buscado, as duas no snapshot exportado pela listagem: o total e o
+        # resumo correspondem as linhas listadas
+        async with pool.snapshot() as conn:
+            if not await conn.fetchval("SELECT to_regclass('headphones') IS NOT NULL"):
+                print("\nTabela 'headphones' nao encontrada!")
+                print("Execute o container principal primeiro para criar os dados.")
+                return
+
+            snapshot = await conn.fetchval("SELECT pg_export_snapshot()")
+            statistics = asyncio.create_task(get_statistics(snapshot=snapshot))
+            try:
+                chunks = pool.stream(reader.LIST_SQL, conn=conn)
+                first = await anext(chunks, None)
+                stats = await statistics
+            except BaseException:
+                statistics.cancel()
+                raise
+            print(f"\nTotal de fones encontrados: {stats.total}")
+
+            if stats.total == 0:
+                print("\nCatalogo vazio.")
+                return
+
+            reader.print_listing_header()
+            await write_listing(chunks, reader.format_entry, first)
+            reader.print_summary(
+                *(
+                    stats.metric(name)
+                    for name in ("avg_price", "min_price", "max_price")
+                )
+            )
+
+    except (asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+        print(f"\nErro ao acessar o banco de dados: {e}")
+        sys.exit(1)
+    finally:
+        await pool.close()
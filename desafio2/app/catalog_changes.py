@@ -0,0 +1,191 @@
+import argparse
+import sys
+from collections import namedtuple
+
+import psycopg2
+
+from db_pool import pool
+
+# Versao do catalogo: um contador incrementado a cada comando que altera
+# headphones. Linhas inseridas ou alteradas guardam a versao do comando em
+# change_version; linhas removidas viram tombstones com a versao da remocao.
+# Um cliente que conhece a versao N busca apenas o que mudou depois de N
+CHANGE_SETTING = "headphones.change_version"
+
+CatalogVersion = namedtuple(
+    "CatalogVersion", ["catalog_id", "version", "reset_version"]
+)
+PruneResult = namedtuple("PruneResult", ["removed", "reset_version"])
+
+VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS catalog_version (
+        singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+        catalog_id UUID NOT NULL DEFAULT gen_random_uuid(),
+        version BIGINT NOT NULL DEFAULT 1,
+        reset_version BIGINT NOT NULL DEFAULT 0
+    )
+"""
+
+TOMBSTONES_DDL = """
+    CREATE TABLE IF NOT EXISTS headphones_tombstones (
+        id INTEGER NOT NULL,
+        version BIGINT NOT NULL
+    )
+"""
+
+# Linhas anteriores ao controle de versao ficam com change_version NULL e so
+# chegam ao cliente na carga completa
+COLUMN_DDL = (
+    "ALTER TABLE headphones ADD COLUMN IF NOT EXISTS change_version BIGINT",
+    "ALTER TABLE headphones ALTER COLUMN change_version "
+    f"SET DEFAULT NULLIF(current_setting('{CHANGE_SETTING}', true), '')::bigint",
+)
+
+# O UPDATE em catalog_version prende a linha ate o fim da transacao, entao
+# as versoes sao atribuidas na ordem de commit: quando um cliente le a versao
+# N, nenhuma transacao pendente ainda vai publicar algo com versao <= N.
+# O custo e serializar as transacoes que escrevem em headphones: um COPY
+# longo segura as demais escritas ate o commit (leituras nao esperam). Uma
+# sequence evitaria a espera, mas daria versoes fora da ordem de commit e o
+# cliente perderia a linha de uma transacao que confirmasse depois dele
+BUMP_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION headphones_version_bump() RETURNS trigger AS $$
+    DECLARE
+        current BIGINT;
+    BEGIN
+        UPDATE catalog_version SET
+            version = version + 1,
+            reset_version = CASE WHEN TG_OP = 'TRUNCATE' THEN version + 1 ELSE reset_version END
+        RETURNING version INTO current;
+        PERFORM set_config('{CHANGE_SETTING}', current::text, true);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+STAMP_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION headphones_version_stamp() RETURNS trigger AS $$
+    BEGIN
+        NEW.change_version := current_setting('{CHANGE_SETTING}')::bigint;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+TOMBSTONE_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION headphones_version_tombstone() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO headphones_tombstones (id, version)
+        SELECT id, current_setting('{CHANGE_SETTING}')::bigint FROM old_rows;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+TRIGGERS = (
+    """
+    CREATE OR REPLACE TRIGGER headphones_version_bump
+    BEFORE INSERT OR UPDATE OR DELETE OR TRUNCATE ON headphones
+    FOR EACH STATEMENT EXECUTE FUNCTION headphones_version_bump()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER headphones_version_stamp
+    BEFORE UPDATE ON headphones
+    FOR EACH ROW EXECUTE FUNCTION headphones_version_stamp()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER headphones_version_tombstone
+    AFTER DELETE ON headphones REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION headphones_version_tombstone()
+    """,
+)
+
+INDEXES = (
+    ("headphones_change_version_idx", "headphones (change_version)"),
+    ("headphones_tombstones_version_idx", "headphones_tombstones (version)"),
+)
+
+
+def ensure_change_tracking(cursor):
+    cursor.execute(VERSION_DDL)
+    cursor.execute("INSERT INTO catalog_version DEFAULT VALUES ON CONFLICT DO NOTHING")
+    cursor.execute(TOMBSTONES_DDL)
+    for statement in COLUMN_DDL:
+        cursor.execute(statement)
+    for function in (BUMP_FUNCTION, STAMP_FUNCTION, TOMBSTONE_FUNCTION):
+        cursor.execute(function)
+    for trigger in TRIGGERS:
+        cursor.execute(trigger)
+
+
+def tracking_exists(cursor):
+    cursor.execute("SELECT to_regclass('catalog_version') IS NOT NULL")
+    return cursor.fetchone()[0]
+
+
+def catalog_version(cursor):
+    cursor.execute(
+        "SELECT catalog_id::text, version, reset_version FROM catalog_version"
+    )
+    return CatalogVersion(*cursor.fetchone())
+
+
+def prune_tombstones(cursor, keep_versions):
+    # Remove os tombstones ate version - keep_versions e sobe reset_version
+    # ate la: um cliente com versao mais antiga faz a carga completa em vez
+    # de perder remocoes. Roda na transacao de quem chama
+    cursor.execute(
+        """
+        UPDATE catalog_version
+        SET reset_version = GREATEST(reset_version, version - %s)
+        RETURNING reset_version
+        """,
+        (keep_versions,),
+    )
+    reset_version = cursor.fetchone()[0]
+    cursor.execute(
+        "DELETE FROM headphones_tombstones WHERE version <= %s", (reset_version,)
+    )
+    return PruneResult(cursor.rowcount, reset_version)
+
+
+def deleted_since(cursor, version):
+    cursor.execute(
+        "SELECT DISTINCT id FROM headphones_tombstones WHERE version > %s", (version,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Remove tombstones antigos do catalogo"
+    )
+    parser.add_argument(
+        "--keep-versions",
+        type=int,
+        default=100000,
+        help="Versoes recentes cujas remocoes continuam disponiveis",
+    )
+    args = parser.parse_args()
+
+    try:
+        with pool.cursor() as cursor:
+            if not tracking_exists(cursor):
+                print(
+                    "Controle de versao nao encontrado: execute as migracoes primeiro"
+                )
+                return
+            result = prune_tombstones(cursor, args.keep_versions)
+        print(
+            f"{result.removed} tombstones removidos; clientes com versao anterior a "
+            f"{result.reset_version} farao a carga completa"
+        )
+    except psycopg2.Error as e:
+        print(f"\nErro ao acessar o banco de dados: {e}")
+        sys.exit(1)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import sys
+from collections import namedtuple
+
+import psycopg2
+
+from bulk_import import KEY_COLUMNS, UPDATE_COLUMNS
+from db_pool import pool
+
+DedupResult = namedtuple("DedupResult", ["groups", "removed"])
+
+_KEY = ", ".join(KEY_COLUMNS)
+_MATCH = " AND ".join(f"h.{column} = d.{column}" for column in KEY_COLUMNS)
+
+# Grupos de (brand, model) repetidos: fica o menor id (o primeiro gravado),
+# com os dados do maior id (a ultima escrita), como teria feito o upsert
+DUPLICATES_SQL = f"""
+    SELECT {_KEY}, min(id) AS keep_id, max(id) AS latest_id, count(*) AS copies
+    FROM headphones
+    GROUP BY {_KEY}
+    HAVING count(*) > 1
+"""
+
+COUNT_SQL = (
+    f"SELECT count(*), COALESCE(sum(copies - 1), 0)::bigint FROM ({DUPLICATES_SQL}) d"
+)
+
+COMPACT_SQL = (
+    f"""
+    CREATE TEMP TABLE headphones_duplicates ON COMMIT DROP AS {DUPLICATES_SQL}
+    """,
+    f"""
+    UPDATE headphones AS h
+    SET ({', '.join(UPDATE_COLUMNS)}) =
+        ({', '.join(f'latest.{column}' for column in UPDATE_COLUMNS)})
+    FROM headphones_duplicates d
+    JOIN headphones latest ON latest.id = d.latest_id
+    WHERE h.id = d.keep_id
+    """,
+    f"""
+    DELETE FROM headphones AS h
+    USING headphones_duplicates d
+    WHERE {_MATCH} AND h.id <> d.keep_id
+    """,
+)
+
+SIZE_SQL = "SELECT pg_size_pretty(pg_total_relation_size('headphones'))"
+
+
+def count_duplicates(cursor):
+    cursor.execute(COUNT_SQL)
+    return DedupResult(*cursor.fetchone())
+
+
+def compact_duplicates(cursor):
+    # Roda dentro da transacao de quem chama (a migracao ou a ferramenta).
+    # O lock bloqueia escritas ate o commit, para nenhuma copia nova entrar
+    # entre a contagem e a remocao; leituras continuam
+    cursor.execute("LOCK TABLE headphones IN SHARE ROW EXCLUSIVE MODE")
+    found = count_duplicates(cursor)
+    if found.groups:
+        for sql in COMPACT_SQL:
+            cursor.execute(sql)
+    return found
+
+
+def vacuum(full=False):
+    # VACUUM devolve o espaco das linhas removidas para reuso; FULL reescreve
+    # a tabela e encolhe o arquivo, mas bloqueia leituras enquanto roda
+    with pool.connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"VACUUM {'(FULL, ANALYZE)' if full else 'ANALYZE'} headphones"
+                )
+        finally:
+            conn.autocommit = False
+
+
+def table_size():
+    with pool.cursor() as cursor:
+        cursor.execute(SIZE_SQL)
+        return cursor.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Remove fones repetidos (brand, model)"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Apenas conta as repeticoes"
+    )
+    parser.add_argument("--full", action="store_true", help="VACUUM FULL no final")
+    args = parser.parse_args()
+
+    try:
+        before = table_size()
+        with pool.cursor() as cursor:
+            result = (
+                count_duplicates(cursor) if args.dry_run else compact_duplicates(cursor)
+            )
+
+        if args.dry_run:
+            print(
+                f"{result.groups} fones repetidos, {result.removed} linhas a remover "
+                f"(tabela com {before})"
+            )
+            return
+
+        vacuum(args.full)
+        print(
+            f"{result.groups} fones repetidos, {result.removed} linhas removidas; "
+            f"tabela: {before} -> {table_size()}"
+        )
+    except psycopg2.Error as e:
+        print(f"\nErro ao acessar o banco de dados: {e}")
+        sys.exit(1)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+import psycopg2
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from catalog_changes import catalog_version, deleted_since, tracking_exists
+from db_pool import DB_HOST, DB_NAME, DB_PORT, pool
+
+# Colunas exportadas com tipos fixos: DECIMAL(10, 2) continua decimal e as
+# especificacoes continuam inteiras, sem passar por texto
+EXPORT_SCHEMA = pa.schema(
+    [
+        ("id", pa.int32()),
+        ("brand", pa.string()),
+        ("model", pa.string()),
+        ("type", pa.string()),
+        ("driver_size", pa.int32()),
+        ("impedance", pa.int32()),
+        ("sensitivity", pa.int32()),
+        ("frequency_response", pa.string()),
+        ("cable_type", pa.string()),
+        ("weight", pa.int32()),
+        ("price", pa.decimal128(10, 2)),
+        ("sound_signature", pa.string()),
+        ("notes", pa.string()),
+        ("created_at", pa.timestamp("us")),
+        ("change_version", pa.int64()),
+    ]
+)
+DELETED_SCHEMA = pa.schema([("id", pa.int32())])
+
+EXPORT_SQL = f"SELECT {', '.join(EXPORT_SCHEMA.names)} FROM headphones"
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+MANIFEST = "manifest.json"
+ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", "100000"))
+
+# mode: "full", "delta" ou "none" (nada mudou desde a ultima exportacao)
+ExportResult = namedtuple(
+    "ExportResult", ["mode", "path", "rows", "row_groups", "deleted", "version"]
+)
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(directory, manifest):
+    # Escrito por ultimo e trocado atomicamente: um leitor nunca ve um
+    # manifesto apontando para um arquivo incompleto
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as out:
+        json.dump(manifest, out, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+class _Writer:
+    # Mesma interface para Parquet (um row group por bloco) e Arrow IPC (um
+    # record batch por bloco)
+    def __init__(self, path, file_format, schema):
+        if file_format == "parquet":
+            self._writer = pq.ParquetWriter(path, schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_file(path, schema)
+        self.schema = schema
+
+    def write(self, rows):
+        columns = zip(*rows)
+        arrays = [
+            pa.array(values, type=field.type)
+            for values, field in zip(columns, self.schema)
+        ]
+        self._writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def write_file(path, file_format, schema, batches):
+    writer = _Writer(path + ".tmp", file_format, schema)
+    rows = row_groups = 0
+    try:
+        for batch in batches:
+            writer.write(batch)
+            rows += len(batch)
+            row_groups += 1
+    finally:
+        writer.close()
+    os.replace(path + ".tmp", path)
+    return rows, row_groups
+
+
+def fetch_batches(conn, sql, params, row_group_size):
+    # Cursor nomeado: o servidor entrega um row group por vez e a memoria
+    # fica limitada a um bloco, qualquer que seja o tamanho do catalogo
+    with conn.cursor(name="catalog_export") as cursor:
+        cursor.itersize = row_group_size
+        cursor.execute(sql, params)
+        while True:
+            batch = cursor.fetchmany(row_group_size)
+            if not batch:
+                return
+            yield batch
+
+
+def export_catalog(
+    directory, file_format="parquet", incremental=True, row_group_size=ROW_GROUP_SIZE
+):
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    source = f"{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    extension = EXTENSIONS[file_format]
+
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            # Versao, tombstones e linhas do mesmo snapshot
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            if not tracking_exists(cursor):
+                raise RuntimeError(
+                    "Controle de versao nao encontrado; execute o container principal primeiro"
+                )
+            current = catalog_version(cursor)
+
+            # A exportacao anterior so serve de base se veio do mesmo banco,
+            # no mesmo formato, e nenhum TRUNCATE aconteceu depois dela
+            since = manifest.get("version")
+            if not (
+                incremental
+                and since is not None
+                and manifest.get("source") == source
+                and manifest.get("catalog_id") == current.catalog_id
+                and manifest.get("format") == file_format
+                and current.reset_version <= since <= current.version
+            ):
+                since = None
+
+            if since == current.version:
+                return ExportResult("none", None, 0, 0, 0, current.version)
+
+            if since is None:
+                name = f"headphones-full-v{current.version}{extension}"
+                rows, row_groups = write_file(
+                    os.path.join(directory, name),
+                    file_format,
+                    EXPORT_SCHEMA,
+                    fetch_batches(conn, EXPORT_SQL, None, row_group_size),
+                )
+                manifest = {
+                    "source": source,
+                    "catalog_id": current.catalog_id,
+                    "format": file_format,
+                    "files": [],
+                }
+                entry = {
+                    "mode": "full",
+                    "file": name,
+                    "rows": rows,
+                    "row_groups": row_groups,
+                }
+                deleted = 0
+            else:
+                name = f"headphones-delta-v{since}-v{current.version}{extension}"
+                rows, row_groups = write_file(
+                    os.path.join(directory, name),
+                    file_format,
+                    EXPORT_SCHEMA,
+                    fetch_batches(
+                        conn,
+                        f"{EXPORT_SQL} WHERE change_version > %s",
+                        (since,),
+                        row_group_size,
+                    ),
+                )
+                entry = {
+                    "mode": "delta",
+                    "file": name,
+                    "from_version": since,
+                    "rows": rows,
+                    "row_groups": row_groups,
+                }
+
+                # Removidos desde a ultima exportacao: ids em um arquivo a parte
+                removed = deleted_since(cursor, since)
+                deleted = len(removed)
+                if removed:
+                    deleted_name = (
+                        f"headphones-deleted-v{since}-v{current.version}{extension}"
+                    )
+                    write_file(
+                        os.path.join(directory, deleted_name),
+                        file_format,
+                        DELETED_SCHEMA,
+                        [[(id_,) for id_ in removed]],
+                    )
+                    entry["deleted_file"] = deleted_name
+                    entry["deleted"] = deleted
+
+    entry["version"] = current.version
+    manifest["version"] = current.version
+    manifest["files"].append(entry)
+    write_manifest(directory, manifest)
+    return ExportResult(
+        entry["mode"],
+        os.path.join(directory, name),
+        rows,
+        row_groups,
+        deleted,
+        current.version,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exporta o catalogo em Parquet ou Arrow IPC"
+    )
+    parser.add_argument(
+        "--output-dir", default="exports", help="Diretorio dos arquivos e do manifesto"
+    )
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default="parquet")
+    parser.add_argument(
+        "--full", action="store_true", help="Ignora a exportacao anterior"
+    )
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        result = export_catalog(
+            args.output_dir, args.format, not args.full, args.row_group_size
+        )
+    except (psycopg2.Error, RuntimeError) as e:
+        print(f"Erro ao exportar o catalogo: {e}")
+        sys.exit(1)
+    finally:
+        pool.close()
+    elapsed = time.perf_counter() - start
+
+    if result.mode == "none":
+        print(f"Nenhuma mudanca desde a ultima exportacao (versao {result.version})")
+        return
+    print(
+        f"Exportacao {result.mode}: {result.rows} fones em {result.row_groups} blocos, "
+        f"{result.deleted} removidos, versao {result.version} -> {result.path} "
+        f"({elapsed:.2f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import bisect
+import csv
+import itertools
+import math
+import random
+import sys
+import time
+
+from bulk_import import COLUMNS, import_rows
+from db_pool import pool
+
+DEFAULT_SEED = 2024
+
+# Marcas em ordem de popularidade, com prefixos de modelo; o peso segue uma
+# lei de Zipf, entao as primeiras marcas concentram boa parte do catalogo
+BRANDS = (
+    ("Sony", ("MDR-", "WH-", "IER-")),
+    ("Sennheiser", ("HD ", "IE ", "Momentum ")),
+    ("Audio-Technica", ("ATH-M", "ATH-R", "ATH-E")),
+    ("Beyerdynamic", ("DT ", "T", "Xelento ")),
+    ("AKG", ("K", "K-Pro ")),
+    ("Shure", ("SRH", "SE")),
+    ("HiFiMAN", ("Sundara ", "Arya ", "HE")),
+    ("Moondrop", ("Blessing ", "Aria ", "Variations ")),
+    ("Focal", ("Clear ", "Elex ", "Celestee ")),
+    ("Audeze", ("LCD-", "MM-", "Euclid ")),
+    ("Grado", ("SR", "RS", "GS")),
+    ("Philips", ("Fidelio X", "SHP")),
+    ("Koss", ("Porta Pro ", "KPH")),
+    ("Fiio", ("FH", "FT", "JH")),
+    ("Meze", ("99 ", "Liric ", "Advar ")),
+    ("Final", ("E", "A", "D")),
+    ("Etymotic", ("ER", "EVO ")),
+    ("Campfire Audio", ("Andromeda ", "Solaris ")),
+    ("Dan Clark Audio", ("Aeon ", "Stealth ", "Ether ")),
+    ("Fostex", ("T", "TH")),
+    ("Truthear", ("Hexa ", "Zero ")),
+    ("Westone", ("W", "UM Pro ")),
+    ("64 Audio", ("U", "Nio ")),
+    ("Stax", ("SR-L", "SR-X")),
+    ("ZMF", ("Verite ", "Atticus ", "Auteur ")),
+)
+BRAND_WEIGHTS = tuple(
+    itertools.accumulate(1 / rank**1.1 for rank in range(1, len(BRANDS) + 1))
+)
+
+# Tipo -> (peso, faixa do driver em mm, impedancias comuns, preco mediano,
+# dispersao do preco, faixa de peso em g, cabos)
+TYPES = {
+    "In-ear Monitor": (
+        0.40,
+        (6, 14),
+        (8, 16, 18, 22, 32, 45, 64),
+        120,
+        1.0,
+        (4, 12),
+        ("Detachable 2-pin 3.5mm", "Detachable MMCX 3.5mm", "Detachable 2-pin 4.4mm"),
+    ),
+    "Closed-back Over-ear": (
+        0.25,
+        (40, 53),
+        (16, 32, 38, 50, 80, 250),
+        250,
+        0.8,
+        (220, 400),
+        ("Detachable 3.5mm", "Fixed 3.5mm", "Detachable 4.4mm balanced"),
+    ),
+    "Open-back Over-ear": (
+        0.25,
+        (38, 106),
+        (20, 32, 50, 60, 150, 250, 300, 600),
+        450,
+        0.9,
+        (250, 650),
+        ("Detachable 6.3mm", "Detachable 3.5mm/6.3mm", "Detachable Mini-XLR"),
+    ),
+    "On-ear": (
+        0.10,
+        (30, 45),
+        (16, 32, 62),
+        90,
+        0.7,
+        (120, 220),
+        ("Fixed 3.5mm", "Detachable 3.5mm"),
+    ),
+}
+TYPE_NAMES = tuple(TYPES)
+TYPE_WEIGHTS = tuple(itertools.accumulate(spec[0] for spec in TYPES.values()))
+
+SIGNATURES = (
+    "Neutral",
+    "Neutral/Analytical",
+    "Balanced/Slightly Warm",
+    "Warm",
+    "Bright",
+    "V-Shaped",
+    "Bass-heavy",
+    "Harman Target",
+)
+SIGNATURE_WEIGHTS = tuple(itertools.accumulate((12, 6, 8, 14, 7, 15, 9, 10)))
+
+NOTE_PHRASES = (
+    "Planar magnetic drivers",
+    "Dynamic driver",
+    "Balanced armature hybrid",
+    "Studio monitoring",
+    "Popular for gaming",
+    "Comfortable for long sessions",
+    "Replaceable earpads",
+    "Wooden cups",
+    "Needs a powerful amplifier",
+    "Easy to drive from a phone",
+    "Great soundstage",
+    "Strong isolation",
+)
+RARE_NOTE = "Limited edition"
+
+
+def _pick(rng, values, cum_weights):
+    # Equivalente a rng.choices(...)[0], sem montar listas a cada linha
+    return values[bisect.bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+def _price(rng, median, sigma):
+    price = math.exp(rng.gauss(math.log(median), sigma))
+    price = min(max(price, 9.0), 9999.0)
+    # Precos de vitrine: .99 abaixo de 1000, inteiros acima
+    return round(math.floor(price) + 0.99, 2) if price < 1000 else float(round(price))
+
+
+def _notes(rng):
+    if rng.random() < 0.3:
+        return ""
+    phrases = rng.sample(NOTE_PHRASES, rng.randint(1, 2))
+    if rng.random() < 0.001:
+        phrases.append(RARE_NOTE)
+    return ", ".join(phrases)
+
+
+def generate_rows(count=None, seed=DEFAULT_SEED):
+    # Linhas na ordem de bulk_import.COLUMNS; a mesma semente produz sempre
+    # a mesma sequencia, e consumir em partes (islice) continua de onde parou.
+    # (brand, model) nunca se repete: cada marca numera seus modelos
+    rng = random.Random(seed)
+    serials = [0] * len(BRANDS)
+    indexes = itertools.count() if count is None else range(count)
+    for _ in indexes:
+        brand_index = bisect.bisect(BRAND_WEIGHTS, rng.random() * BRAND_WEIGHTS[-1])
+        brand, prefixes = BRANDS[brand_index]
+        serials[brand_index] += 1
+        model = f"{rng.choice(prefixes)}{serials[brand_index] + 99}"
+
+        type_ = _pick(rng, TYPE_NAMES, TYPE_WEIGHTS)
+        _, drivers, impedances, median, sigma, weights, cables = TYPES[type_]
+        low = rng.choice((4, 5, 8, 10, 15, 20))
+        high = rng.choice((20, 28, 40, 50, 65, 100))
+
+        yield (
+            brand,
+            model,
+            type_,
+            rng.randint(*drivers),
+            rng.choice(impedances),
+            min(max(round(rng.gauss(102, 6)), 85), 125),
+            f"{low}Hz - {high}kHz",
+            rng.choice(cables),
+            rng.randint(*weights),
+            _price(rng, median, sigma),
+            _pick(rng, SIGNATURES, SIGNATURE_WEIGHTS),
+            _notes(rng),
+        )
+
+
+def write_csv(rows, out):
+    # Mesmo formato aceito por bulk_import.py
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um catalogo sintetico de fones")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", help="Escreve CSV no arquivo ('-' para stdout)")
+    parser.add_argument("--method", choices=("copy", "values"), default="copy")
+    args = parser.parse_args()
+
+    rows = generate_rows(args.rows, args.seed)
+    start = time.perf_counter()
+    if args.output:
+        if args.output == "-":
+            write_csv(rows, sys.stdout)
+            return
+        with open(args.output, "w", newline="", encoding="utf-8") as out:
+            count = write_csv(rows, out)
+        destination = args.output
+    else:
+        try:
+            count = import_rows(rows, args.method)
+        finally:
+            pool.close()
+        destination = f"headphones via {args.method}"
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Gerados {count} fones em {destination} em {elapsed:.2f}s "
+        f"({count / elapsed if elapsed else 0:.0f} linhas/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import base64
+import json
+from collections import namedtuple
+
+from db_pool import pool
+from headphones_catalog import HEADPHONE_COLUMNS, format_headphone
+from migrations import NOTES_DOCUMENT, SEARCH_CONFIG
+from output import write_blocks
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 500
+# Abaixo deste numero de resultados a busca textual e considerada seletiva
+SELECTIVE_TEXT_MATCHES = 1000
+
+SearchFilters = namedtuple(
+    "SearchFilters",
+    [
+        "brand",
+        "type",
+        "min_price",
+        "max_price",
+        "min_impedance",
+        "max_impedance",
+        "sound_signature",
+        "text",
+    ],
+    defaults=(None,) * 8,
+)
+
+Page = namedtuple("Page", ["rows", "next_cursor"])
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Cada filtro: campo de SearchFilters -> (condicao SQL, transformacao do valor)
+FILTERS = {
+    "brand": ("brand = %s", None),
+    "type": ("type = %s", None),
+    "min_price": ("price >= %s", None),
+    "max_price": ("price <= %s", None),
+    "min_impedance": ("impedance >= %s", None),
+    "max_impedance": ("impedance <= %s", None),
+    # Assinaturas sao compostas ("Neutral/Analytical"): busca por trecho
+    "sound_signature": (
+        "sound_signature ILIKE %s",
+        lambda value: f"%{_escape_like(value)}%",
+    ),
+    "text": (f"{NOTES_DOCUMENT} @@ websearch_to_tsquery('{SEARCH_CONFIG}', %s)", None),
+}
+
+
+def encode_cursor(row):
+    # Chave da ultima linha da pagina: (brand, model, id)
+    key = json.dumps([row[1], row[2], row[0]]).encode()
+    return base64.urlsafe_b64encode(key).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        brand, model, id_ = json.loads(raw)
+    except (ValueError, TypeError) as error:
+        raise ValueError(f"Cursor de pagina invalido: {token!r}") from error
+    if (
+        not isinstance(brand, str)
+        or not isinstance(model, str)
+        or not isinstance(id_, int)
+    ):
+        raise ValueError(f"Cursor de pagina invalido: {token!r}")
+    return brand, model, id_
+
+
+def _conditions(filters):
+    conditions = []
+    params = []
+    for name, (condition, transform) in FILTERS.items():
+        value = getattr(filters, name)
+        if value is None or value == "":
+            continue
+        conditions.append(condition)
+        params.append(transform(value) if transform else value)
+    return conditions, params
+
+
+def build_search(filters, after=None, limit=PAGE_SIZE, materialize=False):
+    # Paginacao por chave: a proxima pagina comeca depois de (brand, model, id)
+    # da anterior, seguindo o indice unico headphones_brand_model_key; o custo
+    # nao cresce com a posicao da pagina, como aconteceria com OFFSET
+    conditions, params = _conditions(filters)
+    if after is not None:
+        conditions.append("(brand, model, id) > (%s, %s, %s)")
+        params.extend(decode_cursor(after))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # Uma linha a mais indica se existe proxima pagina
+    params.append(limit + 1)
+    if materialize:
+        # Poucos resultados: busca todos pelo indice GIN e ordena so eles, em
+        # vez de percorrer a ordem do catalogo testando cada linha
+        sql = f"""
+            WITH matches AS MATERIALIZED (
+                SELECT {HEADPHONE_COLUMNS} FROM headphones {where}
+            )
+            SELECT * FROM matches
+            ORDER BY brand, model, id
+            LIMIT %s
+        """
+    else:
+        sql = f"""
+            SELECT {HEADPHONE_COLUMNS}
+            FROM headphones
+            {where}
+            ORDER BY brand, model, id
+            LIMIT %s
+        """
+    return sql, params
+
+
+def selective_text(cursor, text, threshold=SELECTIVE_TEXT_MATCHES):
+    # O planejador estima mal termos raros e pode preferir a varredura em
+    # ordem de (brand, model, id); uma contagem limitada pelo indice GIN
+    # decide o plano antes de buscar a pagina
+    condition, _ = FILTERS["text"]
+    cursor.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM headphones WHERE {condition} LIMIT %s) AS m",
+        (text, threshold),
+    )
+    return cursor.fetchone()[0] < threshold
+
+
+def search_headphones(filters=SearchFilters(), after=None, limit=PAGE_SIZE):
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    with pool.cursor() as cursor:
+        materialize = bool(filters.text) and selective_text(cursor, filters.text)
+        sql, params = build_search(filters, after, limit, materialize)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return Page(rows, encode_cursor(rows[-1]))
+    return Page(rows, None)
+
+
+def iter_search(filters=SearchFilters(), after=None, limit=PAGE_SIZE):
+    # Percorre todas as paginas; cada uma e uma consulta curta e independente
+    while True:
+        page = search_headphones(filters, after, limit)
+        yield from page.rows
+        if page.next_cursor is None:
+            return
+        after = page.next_cursor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca e filtros no catalogo de fones")
+    parser.add_argument("--brand", help="Marca exata")
+    parser.add_argument("--type", help="Tipo exato (ex.: 'Open-back Over-ear')")
+    parser.add_argument("--min-price", type=float)
+    parser.add_argument("--max-price", type=float)
+    parser.add_argument("--min-impedance", type=int)
+    parser.add_argument("--max-impedance", type=int)
+    parser.add_argument("--signature", help="Trecho da assinatura sonora")
+    parser.add_argument(
+        "--text", help='Busca textual nas notas (sintaxe web: "a b" -c)'
+    )
+    parser.add_argument("--limit", type=int, default=PAGE_SIZE, help="Fones por pagina")
+    parser.add_argument("--after", help="Cursor da pagina anterior")
+    parser.add_argument("--all", action="store_true", help="Percorre todas as paginas")
+    args = parser.parse_args()
+
+    filters = SearchFilters(
+        brand=args.brand,
+        type=args.type,
+        min_price=args.min_price,
+        max_price=args.max_price,
+        min_impedance=args.min_impedance,
+        max_impedance=args.max_impedance,
+        sound_signature=args.signature,
+        text=args.text,
+    )
+    if args.after:
+        try:
+            decode_cursor(args.after)
+        except ValueError as error:
+            parser.error(str(error))
+
+    try:
+        if args.all:
+            write_blocks(
+                map(format_headphone, iter_search(filters, args.after, args.limit))
+            )
+            return
+
+        page = search_headphones(filters, args.after, args.limit)
+    finally:
+        pool.close()
+
+    if not page.rows:
+        print("\nNenhum fone encontrado.")
+        return
+    write_blocks(map(format_headphone, page.rows))
+    if page.next_cursor:
+        print(f"\nProxima pagina: --after {page.next_cursor}")
+
+
+if __name__ == "__main__":
+    main()
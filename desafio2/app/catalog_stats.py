@@ -0,0 +1,194 @@
+from collections import namedtuple
+
+IMPEDANCE_BUCKET_WIDTH = 50
+IMPEDANCE_BUCKETS = 12
+PERCENTILE_POINTS = (25, 50, 75, 90)
+
+# Agregados parciais calculados por grupo na varredura:
+# nome -> (expressao SQL, funcao que combina os valores dos grupos)
+PARTIALS = {
+    "count": ("COUNT(*)", sum),
+    "price_sum": ("SUM(price)", sum),
+    "price_count": ("COUNT(price)", sum),
+    "price_min": ("MIN(price)", min),
+    "price_max": ("MAX(price)", max),
+    "impedance_sum": ("SUM(impedance)", sum),
+    "impedance_count": ("COUNT(impedance)", sum),
+    "impedance_min": ("MIN(impedance)", min),
+    "impedance_max": ("MAX(impedance)", max),
+}
+
+
+def _ratio(total, count):
+    return total / count if count else None
+
+
+# Metricas finais, derivadas dos parciais ja combinados
+METRICS = {
+    "avg_price": lambda p: _ratio(p["price_sum"], p["price_count"]),
+    "min_price": lambda p: p["price_min"],
+    "max_price": lambda p: p["price_max"],
+    "avg_impedance": lambda p: _ratio(p["impedance_sum"], p["impedance_count"]),
+    "min_impedance": lambda p: p["impedance_min"],
+    "max_impedance": lambda p: p["impedance_max"],
+}
+
+# Dimensoes contadas por grupo: nome -> expressao SQL
+DIMENSIONS = {
+    "types": "type",
+    "brands": "brand",
+    "impedance_histogram": (
+        f"LEAST(impedance / {IMPEDANCE_BUCKET_WIDTH}, {IMPEDANCE_BUCKETS}) "
+        f"* {IMPEDANCE_BUCKET_WIDTH}"
+    ),
+}
+
+# Colunas cujos percentis exatos podem ser pedidos: nome -> expressao SQL.
+# Cada uma acrescenta um grupo por valor distinto, entao so entram na
+# consulta quando solicitadas
+DISTRIBUTIONS = {
+    "price": "price",
+    "impedance": "impedance",
+}
+
+
+class CatalogStatistics(
+    namedtuple("CatalogStatistics", ["total", "metrics", "groups", "percentiles"])
+):
+    # metrics: {nome: valor}; groups: {dimensao: [(chave, quantidade), ...]};
+    # percentiles: {distribuicao: {ponto: valor}}
+    __slots__ = ()
+
+    def metric(self, name, default=0):
+        value = self.metrics.get(name)
+        return default if value is None else value
+
+    def group(self, name):
+        return self.groups.get(name, [])
+
+
+def register_partial(name, expression, combine):
+    PARTIALS[name] = (expression, combine)
+
+
+def register_metric(name, compute):
+    METRICS[name] = compute
+
+
+def register_dimension(name, expression):
+    DIMENSIONS[name] = expression
+
+
+def build_query(dimensions, distributions):
+    # Uma unica varredura agrupada pela combinacao das dimensoes; os totais e
+    # as contagens por dimensao sao somados depois, sobre poucos grupos
+    keys = list(dimensions.values())
+    extra = list(distributions.values())
+    partials = [expression for expression, _ in PARTIALS.values()]
+
+    if extra:
+        grouping = f"GROUPING({', '.join(keys + extra)})"
+        sets = [f"({', '.join(keys)})"] + [f"({expression})" for expression in extra]
+        group_by = f"GROUP BY GROUPING SETS ({', '.join(sets)})"
+    else:
+        grouping = "0"
+        group_by = f"GROUP BY {', '.join(keys)}" if keys else ""
+
+    columns = [grouping] + keys + extra + partials
+    return f"SELECT {', '.join(columns)} FROM headphones {group_by}"
+
+
+def _combine(rows):
+    combined = {}
+    for index, (name, (_, combine)) in enumerate(PARTIALS.items()):
+        values = [row[index] for row in rows if row[index] is not None]
+        combined[name] = combine(values) if values else None
+    return combined
+
+
+def _percentiles(histogram, points):
+    # Nearest-rank sobre {valor: quantidade}, como em value_percentiles
+    total = sum(histogram.values())
+    values = sorted(histogram.items())
+    result = {}
+    for point in points:
+        if total == 0:
+            result[point] = None
+            continue
+        rank = max(1, -(-point * total // 100))
+        seen = 0
+        for value, count in values:
+            seen += count
+            if seen >= rank:
+                result[point] = value
+                break
+    return result
+
+
+def build_statistics(rows, percentiles=None):
+    # rows: (chaves das dimensoes..., parciais...) agrupadas pela combinacao
+    # das dimensoes, vindas da varredura ou de uma tabela de resumo
+    dimension_names = list(DIMENSIONS)
+    width = len(dimension_names)
+
+    partial_rows = []
+    counters = {name: {} for name in dimension_names}
+    for row in rows:
+        partials = row[width:]
+        partial_rows.append(partials)
+        for name, key in zip(dimension_names, row[:width]):
+            counter = counters[name]
+            counter[key] = counter.get(key, 0) + partials[0]
+
+    combined = _combine(partial_rows)
+    metrics = {name: compute(combined) for name, compute in METRICS.items()}
+    groups = {
+        name: sorted(counter.items(), key=lambda item: (-item[1], str(item[0])))
+        for name, counter in counters.items()
+    }
+    return CatalogStatistics(combined["count"] or 0, metrics, groups, percentiles or {})
+
+
+def statistics_query(percentiles=()):
+    return build_query(DIMENSIONS, {name: DISTRIBUTIONS[name] for name in percentiles})
+
+
+def rollup_statistics(result, percentiles=(), points=PERCENTILE_POINTS):
+    # result: linhas de statistics_query(percentiles), de qualquer driver
+    distribution_names = list(percentiles)
+    width = len(DIMENSIONS)
+    extra = len(distribution_names)
+
+    rows = []
+    histograms = {name: {} for name in distribution_names}
+    for row in result:
+        mask = row[0]
+        # GROUPING() liga o bit de cada coluna que nao esta agrupada na linha;
+        # as dimensoes ocupam os bits altos e as distribuicoes os baixos
+        if mask >> extra == 0:
+            rows.append(row[1 : 1 + width] + row[1 + width + extra :])
+            continue
+        for index, name in enumerate(distribution_names):
+            if not mask & (1 << (extra - 1 - index)):
+                value = row[1 + width + index]
+                if value is not None:
+                    histograms[name][value] = row[1 + width + extra]
+                break
+
+    return build_statistics(
+        rows,
+        {name: _percentiles(histograms[name], points) for name in distribution_names},
+    )
+
+
+def collect_statistics(cursor, percentiles=(), points=PERCENTILE_POINTS):
+    cursor.execute(statistics_query(percentiles))
+    return rollup_statistics(cursor, percentiles, points)
+
+
+def format_impedance_bucket(lower):
+    if lower is None:
+        return "sem dado"
+    if lower >= IMPEDANCE_BUCKETS * IMPEDANCE_BUCKET_WIDTH:
+        return f"{lower}+ohms"
+    return f"{lower}-{lower + IMPEDANCE_BUCKET_WIDTH - 1}ohms"
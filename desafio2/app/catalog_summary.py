@@ -0,0 +1,279 @@
+import argparse
+import sys
+
+from catalog_stats import DIMENSIONS, PARTIALS, build_statistics
+from db_pool import pool
+
+# Resumo por (type, brand, faixa de impedancia), a mesma combinacao de
+# dimensoes usada por catalog_stats, com os mesmos agregados parciais
+SUMMARY_KEYS = ("type", "brand", "impedance_bucket")
+SUMMARY_PARTIALS = (
+    "count",
+    "price_sum",
+    "price_count",
+    "price_min",
+    "price_max",
+    "impedance_sum",
+    "impedance_count",
+    "impedance_min",
+    "impedance_max",
+)
+IMPEDANCE_BUCKET_SQL = DIMENSIONS["impedance_histogram"]
+
+# Agregados de um conjunto de linhas no formato do resumo; somas sao
+# guardadas como 0 (e nao NULL) para poderem ser somadas e subtraidas
+GROUP_AGGREGATES = """
+    type,
+    brand,
+    {bucket} AS impedance_bucket,
+    COUNT(*) AS count,
+    COALESCE(SUM(price), 0) AS price_sum,
+    COUNT(price) AS price_count,
+    MIN(price) AS price_min,
+    MAX(price) AS price_max,
+    COALESCE(SUM(impedance), 0) AS impedance_sum,
+    COUNT(impedance) AS impedance_count,
+    MIN(impedance) AS impedance_min,
+    MAX(impedance) AS impedance_max
+""".format(
+    bucket=IMPEDANCE_BUCKET_SQL
+)
+
+SAME_GROUP = """
+    s.type = r.type
+    AND s.brand = r.brand
+    AND COALESCE(s.impedance_bucket, -1) = COALESCE(r.impedance_bucket, -1)
+"""
+
+SUMMARY_DDL = """
+    CREATE TABLE IF NOT EXISTS headphones_summary (
+        type VARCHAR(50) NOT NULL,
+        brand VARCHAR(100) NOT NULL,
+        impedance_bucket INTEGER,
+        count BIGINT NOT NULL,
+        price_sum NUMERIC NOT NULL,
+        price_count BIGINT NOT NULL,
+        price_min DECIMAL(10, 2),
+        price_max DECIMAL(10, 2),
+        impedance_sum BIGINT NOT NULL,
+        impedance_count BIGINT NOT NULL,
+        impedance_min INTEGER,
+        impedance_max INTEGER,
+        UNIQUE NULLS NOT DISTINCT (type, brand, impedance_bucket)
+    )
+"""
+
+# Triggers por comando com tabelas de transicao: um INSERT de um milhao de
+# linhas (ou um COPY) atualiza o resumo com um unico GROUP BY sobre as
+# linhas novas, em vez de um UPDATE por linha
+MAINTAIN_FUNCTION = """
+    CREATE OR REPLACE FUNCTION headphones_summary_maintain() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            DELETE FROM headphones_summary;
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            -- min/max que podem ter saido do grupo ficam NULL e sao
+            -- recalculados logo abaixo, apenas para os grupos afetados
+            UPDATE headphones_summary AS s SET
+                count = s.count - r.count,
+                price_sum = s.price_sum - r.price_sum,
+                price_count = s.price_count - r.price_count,
+                impedance_sum = s.impedance_sum - r.impedance_sum,
+                impedance_count = s.impedance_count - r.impedance_count,
+                price_min = CASE WHEN r.price_min <= s.price_min THEN NULL ELSE s.price_min END,
+                price_max = CASE WHEN r.price_max >= s.price_max THEN NULL ELSE s.price_max END,
+                impedance_min = CASE
+                    WHEN r.impedance_min <= s.impedance_min THEN NULL ELSE s.impedance_min END,
+                impedance_max = CASE
+                    WHEN r.impedance_max >= s.impedance_max THEN NULL ELSE s.impedance_max END
+            FROM (SELECT {aggregates} FROM old_rows GROUP BY 1, 2, 3) AS r
+            WHERE {same_group};
+
+            DELETE FROM headphones_summary WHERE count <= 0;
+
+            UPDATE headphones_summary AS s SET
+                price_min = r.price_min,
+                price_max = r.price_max,
+                impedance_min = r.impedance_min,
+                impedance_max = r.impedance_max
+            FROM (
+                SELECT {aggregates}
+                FROM headphones AS h
+                WHERE EXISTS (
+                    SELECT 1
+                    FROM headphones_summary AS stale
+                    WHERE stale.type = h.type
+                      AND stale.brand = h.brand
+                      AND COALESCE(stale.impedance_bucket, -1) = COALESCE({bucket}, -1)
+                      AND (
+                          (stale.price_count > 0
+                           AND (stale.price_min IS NULL OR stale.price_max IS NULL))
+                          OR (stale.impedance_count > 0
+                              AND (stale.impedance_min IS NULL OR stale.impedance_max IS NULL))
+                      )
+                )
+                GROUP BY 1, 2, 3
+            ) AS r
+            WHERE {same_group};
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO headphones_summary AS s
+            SELECT {aggregates} FROM new_rows GROUP BY 1, 2, 3
+            ON CONFLICT (type, brand, impedance_bucket) DO UPDATE SET
+                count = s.count + EXCLUDED.count,
+                price_sum = s.price_sum + EXCLUDED.price_sum,
+                price_count = s.price_count + EXCLUDED.price_count,
+                price_min = LEAST(s.price_min, EXCLUDED.price_min),
+                price_max = GREATEST(s.price_max, EXCLUDED.price_max),
+                impedance_sum = s.impedance_sum + EXCLUDED.impedance_sum,
+                impedance_count = s.impedance_count + EXCLUDED.impedance_count,
+                impedance_min = LEAST(s.impedance_min, EXCLUDED.impedance_min),
+                impedance_max = GREATEST(s.impedance_max, EXCLUDED.impedance_max);
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+""".format(
+    aggregates=GROUP_AGGREGATES, same_group=SAME_GROUP, bucket=IMPEDANCE_BUCKET_SQL
+)
+
+TRIGGERS = (
+    """
+    CREATE OR REPLACE TRIGGER headphones_summary_insert
+    AFTER INSERT ON headphones REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION headphones_summary_maintain()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER headphones_summary_update
+    AFTER UPDATE ON headphones REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION headphones_summary_maintain()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER headphones_summary_delete
+    AFTER DELETE ON headphones REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION headphones_summary_maintain()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER headphones_summary_truncate
+    AFTER TRUNCATE ON headphones
+    FOR EACH STATEMENT EXECUTE FUNCTION headphones_summary_maintain()
+    """,
+)
+
+MISMATCH_SQL = """
+    WITH actual AS (
+        SELECT {aggregates} FROM headphones GROUP BY 1, 2, 3
+    )
+    SELECT
+        COALESCE(r.type, s.type),
+        COALESCE(r.brand, s.brand),
+        COALESCE(r.impedance_bucket, s.impedance_bucket),
+        ROW({actual_columns})::text,
+        ROW({summary_columns})::text
+    FROM actual AS r
+    FULL OUTER JOIN headphones_summary AS s ON {same_group}
+    WHERE ROW({actual_columns}) IS DISTINCT FROM ROW({summary_columns})
+""".format(
+    aggregates=GROUP_AGGREGATES,
+    same_group=SAME_GROUP,
+    actual_columns=", ".join(f"r.{column}" for column in SUMMARY_PARTIALS),
+    summary_columns=", ".join(f"s.{column}" for column in SUMMARY_PARTIALS),
+)
+
+
+def summary_exists(cursor):
+    cursor.execute("SELECT to_regclass('headphones_summary') IS NOT NULL")
+    return cursor.fetchone()[0]
+
+
+def rebuild_summary(cursor):
+    # Bloqueia escritas em headphones enquanto recalcula, para que nenhum
+    # INSERT concorrente fique fora do resumo
+    cursor.execute("LOCK TABLE headphones IN SHARE MODE")
+    cursor.execute("DELETE FROM headphones_summary")
+    cursor.execute(
+        f"INSERT INTO headphones_summary SELECT {GROUP_AGGREGATES} FROM headphones GROUP BY 1, 2, 3"
+    )
+
+
+def ensure_summary(cursor):
+    created = not summary_exists(cursor)
+    cursor.execute(SUMMARY_DDL)
+    cursor.execute(MAINTAIN_FUNCTION)
+    for trigger in TRIGGERS:
+        cursor.execute(trigger)
+    if created:
+        rebuild_summary(cursor)
+    return created
+
+
+SUMMARY_COUNT_SQL = "SELECT COALESCE(SUM(count), 0) FROM headphones_summary"
+
+
+def summary_query():
+    # O(numero de grupos); se novas metricas ou dimensoes foram registradas
+    # em catalog_stats, o resumo nao as cobre e a consulta nao se aplica
+    if set(PARTIALS) - set(SUMMARY_PARTIALS) or list(DIMENSIONS) != [
+        "types",
+        "brands",
+        "impedance_histogram",
+    ]:
+        return None
+    columns = SUMMARY_KEYS + tuple(PARTIALS)
+    return f"SELECT {', '.join(columns)} FROM headphones_summary"
+
+
+def summary_statistics(cursor):
+    sql = summary_query()
+    if sql is None:
+        return None
+    cursor.execute(sql)
+    return build_statistics(cursor.fetchall())
+
+
+def summary_count(cursor):
+    cursor.execute(SUMMARY_COUNT_SQL)
+    return cursor.fetchone()[0]
+
+
+def check_summary(cursor):
+    cursor.execute(MISMATCH_SQL)
+    return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumo materializado do catalogo")
+    parser.add_argument(
+        "command", choices=("check", "rebuild"), help="Verifica ou recalcula o resumo"
+    )
+    args = parser.parse_args()
+
+    try:
+        with pool.cursor() as cursor:
+            ensure_summary(cursor)
+            if args.command == "rebuild":
+                rebuild_summary(cursor)
+                print("Resumo recalculado a partir de headphones.")
+                return
+
+            mismatches = check_summary(cursor)
+    finally:
+        pool.close()
+
+    if not mismatches:
+        print("Resumo consistente com headphones.")
+        return
+
+    print(f"{len(mismatches)} grupos divergentes (tipo, marca, faixa, real, resumo):")
+    for type_, brand, bucket, actual, summary in mismatches:
+        print(f"   {type_} | {brand} | {bucket} | {actual} | {summary}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+from db_pool import (
+    CONNECT_TIMEOUT,
+    CURSOR_ITERSIZE,
+    POOL_MAX_SIZE,
+    POOL_MIN_SIZE,
+    connection_params,
+)
+
+# Erros de conexao enquanto o banco sobe: recusada, em recovery, reiniciando
+CONNECT_ERRORS = (
+    OSError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.PostgresConnectionError,
+)
+
+_PLACEHOLDER = re.compile(r"%s")
+
+
+def numbered(sql):
+    # asyncpg usa $1, $2...; as consultas do catalogo usam %s (psycopg2)
+    counter = iter(range(1, sql.count("%s") + 1))
+    return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", sql)
+
+
+async def retry(operation, timeout=CONNECT_TIMEOUT, base_delay=0.1, max_delay=2.0):
+    # Mesmo backoff exponencial com jitter de db_pool.retry
+    deadline = time.monotonic() + timeout
+    delay = base_delay
+    while True:
+        try:
+            return await operation()
+        except CONNECT_ERRORS:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise
+            await asyncio.sleep(min(random.uniform(delay / 2, delay), remaining))
+            delay = min(delay * 2, max_delay)
+
+
+def server_settings():
+    # O libpq aplica PGOPTIONS ("-c search_path=..."); o asyncpg nao le essa
+    # variavel, entao as opcoes viram server_settings
+    settings = {}
+    options = os.getenv("PGOPTIONS", "").split()
+    for flag, option in zip(options, options[1:]):
+        if flag == "-c" and "=" in option:
+            key, value = option.split("=", 1)
+            settings[key] = value
+    return settings
+
+
+class AsyncConnectionPool:
+    def __init__(self, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE, **params):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.params = params or {
+            **connection_params(),
+            "server_settings": server_settings(),
+        }
+        self._pool = None
+        self._lock = None
+
+    async def _open(self):
+        if self._pool is not None:
+            return self._pool
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._pool is None:
+                self._pool = await retry(
+                    lambda: asyncpg.create_pool(
+                        min_size=self.min_size, max_size=self.max_size, **self.params
+                    )
+                )
+            return self._pool
+
+    @asynccontextmanager
+    async def connection(self):
+        # Uma transacao por bloco: commit ao sair, rollback em caso de erro
+        pool = await self._open()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                yield conn
+
+    async def fetch(self, sql, *params):
+        pool = await self._open()
+        return await pool.fetch(numbered(sql), *params)
+
+    async def fetchval(self, sql, *params):
+        pool = await self._open()
+        return await pool.fetchval(numbered(sql), *params)
+
+    @asynccontextmanager
+    async def snapshot(self, shared=None):
+        # Transacao REPEATABLE READ somente leitura: as consultas do bloco veem
+        # um unico estado do banco. shared (id de pg_export_snapshot()) faz
+        # outra conexao usar o snapshot de uma transacao ainda aberta
+        pool = await self._open()
+        async with pool.acquire() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                if shared is not None:
+                    await conn.execute(f"SET TRANSACTION SNAPSHOT '{shared}'")
+                yield conn
+
+    async def stream(self, sql, *params, itersize=CURSOR_ITERSIZE, conn=None):
+        # Cursor do servidor em blocos de itersize linhas, como pool.stream;
+        # com conn, dentro da transacao de quem chamou
+        if conn is None:
+            async with self.connection() as conn:
+                async for rows in self.stream(
+                    sql, *params, itersize=itersize, conn=conn
+                ):
+                    yield rows
+            return
+        cursor = await conn.cursor(numbered(sql), *params)
+        while True:
+            rows = await cursor.fetch(itersize)
+            if not rows:
+                return
+            yield rows
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+pool = AsyncConnectionPool()
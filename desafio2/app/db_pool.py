@@ -0,0 +1,190 @@
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+DB_HOST = os.getenv("DB_HOST", "postgres")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_NAME = os.getenv("DB_NAME", "headphones_db")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "5"))
+CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "30"))
+CURSOR_ITERSIZE = int(os.getenv("DB_CURSOR_ITERSIZE", "2000"))
+# Driver do catalogo e do leitor: "psycopg2" (padrao) ou "asyncpg"
+DB_DRIVER = os.getenv("DB_DRIVER", "psycopg2")
+
+
+def connection_params():
+    return {
+        "host": DB_HOST,
+        "port": DB_PORT,
+        "database": DB_NAME,
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+    }
+
+
+def retry(operation, timeout=CONNECT_TIMEOUT, base_delay=0.1, max_delay=2.0):
+    # Backoff exponencial com jitter ate o banco aceitar conexoes; substitui
+    # as 30 tentativas de time.sleep(1)
+    deadline = time.monotonic() + timeout
+    delay = base_delay
+    while True:
+        try:
+            return operation()
+        except psycopg2.OperationalError:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise
+            time.sleep(min(random.uniform(delay / 2, delay), remaining))
+            delay = min(delay * 2, max_delay)
+
+
+def connect(timeout=CONNECT_TIMEOUT):
+    # Conexao avulsa, fora do pool
+    return retry(lambda: psycopg2.connect(**connection_params()), timeout)
+
+
+class _KeepOpenPool(pg_pool.ThreadedConnectionPool):
+    # O ThreadedConnectionPool fecha na devolucao as conexoes que passam de
+    # minconn; aqui abre minconn no construtor e mantem abertas todas as
+    # devolvidas, ate maxconn
+    def __init__(self, minconn, maxconn, **params):
+        super().__init__(minconn, maxconn, **params)
+        self.minconn = maxconn
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        checkout_timeout=30.0,
+        health_check_after=30.0,
+        **params,
+    ):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.params = params or connection_params()
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}
+        self._pid = None
+        self._cursor_ids = itertools.count(1)
+
+    def _open(self):
+        if self._pool is not None and self._pid == os.getpid():
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # Depois de um fork as conexoes herdadas pertencem ao pai
+                self._pool = retry(
+                    lambda: _KeepOpenPool(self.min_size, self.max_size, **self.params)
+                )
+                self._last_used = {}
+                self._pid = os.getpid()
+            return self._pool
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if (
+            last_used is not None
+            and time.monotonic() - last_used < self.health_check_after
+        ):
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        pool = self._open()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise pg_pool.PoolError(
+                f"Nenhuma conexao livre no pool apos {self.checkout_timeout}s"
+            )
+        try:
+            while True:
+                conn = retry(pool.getconn)
+                if self._healthy(conn):
+                    return conn
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        close = close or bool(conn.closed)
+        if close:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        try:
+            if self._pool is None:
+                # Devolvida depois de close() (ex.: um stream finalizado tarde)
+                conn.close()
+            else:
+                self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        # Commit ao sair do bloco, rollback em caso de erro
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+
+    def stream(self, sql, params=None, itersize=CURSOR_ITERSIZE):
+        # Cursor nomeado (server-side): o resultado fica no servidor e chega
+        # em blocos de itersize linhas, sem materializar a tabela em memoria
+        with self.connection() as conn:
+            with conn.cursor(name=f"stream_{next(self._cursor_ids)}") as cursor:
+                cursor.itersize = itersize
+                cursor.execute(sql, params)
+                yield from cursor
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+            self._last_used = {}
+
+
+pool = ConnectionPool()
@@ -0,0 +1,216 @@
+import argparse
+import json
+
+import headphones_catalog
+import reader
+from catalog_search import (
+    FILTERS,
+    SELECTIVE_TEXT_MATCHES,
+    SearchFilters,
+    build_search,
+    encode_cursor,
+)
+from catalog_stats import DIMENSIONS, DISTRIBUTIONS, build_query
+from catalog_summary import SUMMARY_KEYS, SUMMARY_PARTIALS
+from db_pool import pool
+from migrations import MIGRATIONS, migrate
+
+# O harness roda em um schema separado, criado pelas mesmas migracoes do
+# catalogo, para nao tocar nos dados reais
+BENCH_SCHEMA = "catalog_bench"
+
+INDEXES = (
+    "headphones_brand_model_key",
+    "headphones_type_idx",
+    "headphones_price_idx",
+    "headphones_notes_search_idx",
+)
+
+QUERIES = {
+    "listagem (catalogo)": headphones_catalog.LIST_SQL,
+    "listagem (leitor)": reader.LIST_SQL,
+    "estatisticas": build_query(DIMENSIONS, {}),
+    "estatisticas + percentis": build_query(
+        DIMENSIONS, {"price": DISTRIBUTIONS["price"]}
+    ),
+    "resumo": (
+        f"SELECT {', '.join(SUMMARY_KEYS + SUMMARY_PARTIALS)} FROM headphones_summary"
+    ),
+    "primeira pagina": headphones_catalog.LIST_SQL.replace(
+        "ORDER BY brand, model", "ORDER BY brand, model LIMIT 50"
+    ),
+    "por tipo": "SELECT id FROM headphones WHERE type = 'In-ear Monitor'",
+    "faixa de preco": (
+        "SELECT id, price FROM headphones WHERE price BETWEEN 100 AND 110 ORDER BY price"
+    ),
+    # Consultas de catalog_search: (sql, parametros)
+    "busca: primeira pagina": build_search(SearchFilters()),
+    "busca: pagina profunda": build_search(
+        SearchFilters(), encode_cursor((500000, "Brand 150", "Model 500000"))
+    ),
+    "busca: tipo + preco": build_search(
+        SearchFilters(type="In-ear Monitor", min_price=500, max_price=1500)
+    ),
+    "busca: marca + impedancia": build_search(
+        SearchFilters(brand="Brand 42", min_impedance=100, max_impedance=300)
+    ),
+    "busca: texto": build_search(SearchFilters(text="planar")),
+    "busca: texto raro": build_search(SearchFilters(text="prototype")),
+    "busca: texto raro (materializada)": build_search(
+        SearchFilters(text="prototype"), materialize=True
+    ),
+    "busca: contagem do texto raro": (
+        "SELECT COUNT(*) FROM (SELECT 1 FROM headphones WHERE "
+        f"{FILTERS['text'][0]} LIMIT %s) AS m",
+        ("prototype", SELECTIVE_TEXT_MATCHES),
+    ),
+}
+
+FILL_SQL = """
+    INSERT INTO headphones (brand, model, type, driver_size, impedance, sensitivity,
+                            frequency_response, cable_type, weight, price,
+                            sound_signature, notes)
+    SELECT
+        'Brand ' || (mod(i, 200)),
+        'Model ' || i,
+        (ARRAY['Open-back Over-ear', 'Closed-back Over-ear', 'In-ear Monitor',
+               'On-ear'])[1 + mod(i / 200, 4)],
+        30 + mod(i, 70),
+        16 + mod(i * 7, 600),
+        90 + mod(i, 25),
+        '10Hz - 40kHz',
+        'Detachable 3.5mm',
+        150 + mod(i, 500),
+        (mod(i * 37, 300000)) / 100.0,
+        (ARRAY['Neutral', 'Warm', 'Bright', 'V-Shaped'])[1 + mod(i, 4)],
+        CASE
+            WHEN mod(i, 10007) = 0 THEN 'Hand-built prototype'
+            ELSE (ARRAY['Planar magnetic', 'Studio monitor', 'Dynamic driver', '', ''])[
+                1 + mod(i, 5)]
+        END
+    FROM generate_series(%s, %s) AS i
+"""
+
+
+def reset_schema(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+        cursor.execute(f"SET search_path TO {BENCH_SCHEMA}")
+    conn.commit()
+    migrate(conn, MIGRATIONS)
+
+
+def fill(conn, start, end):
+    with conn.cursor() as cursor:
+        cursor.execute(FILL_SQL, (start, end))
+    conn.commit()
+    # VACUUM esvazia a lista pendente do indice GIN e o mapa de visibilidade,
+    # como o autovacuum faria num catalogo em regime
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE headphones")
+    finally:
+        conn.autocommit = False
+
+
+def explain(conn, query, drop_indexes=False):
+    # Sem indices: os DROP INDEX ficam na mesma transacao do EXPLAIN e sao
+    # desfeitos no rollback
+    sql, params = query if isinstance(query, tuple) else (query, None)
+    with conn.cursor() as cursor:
+        if drop_indexes:
+            for name in INDEXES:
+                cursor.execute(f"DROP INDEX {name}")
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+        result = cursor.fetchone()[0]
+    conn.rollback()
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]
+
+
+def describe(node, depth=0):
+    line = "  " * depth + node["Node Type"]
+    if "Index Name" in node:
+        line += f" using {node['Index Name']}"
+    if "Sort Key" in node:
+        line += f" ({', '.join(node['Sort Key'])})"
+    lines = [line]
+    for child in node.get("Plans", []):
+        lines += describe(child, depth + 1)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN ANALYZE das consultas do catalogo"
+    )
+    parser.add_argument(
+        "--sizes", default="1000,10000,100000,1000000", help="Tamanhos da tabela"
+    )
+    parser.add_argument(
+        "--compare-indexes",
+        action="store_true",
+        help="Repete cada consulta sem os indices",
+    )
+    parser.add_argument("--plans", action="store_true", help="Mostra o plano completo")
+    parser.add_argument(
+        "--keep", action="store_true", help="Nao remove o schema no final"
+    )
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    variants = [False, True] if args.compare_indexes else [False]
+    results = []
+
+    try:
+        with pool.connection() as conn:
+            reset_schema(conn)
+            loaded = 0
+            for size in sizes:
+                fill(conn, loaded + 1, size)
+                loaded = size
+                for name, query in QUERIES.items():
+                    for drop_indexes in variants:
+                        plan = explain(conn, query, drop_indexes)
+                        results.append((size, name, drop_indexes, plan))
+                        print(
+                            f"{size:>10} | {name:<34} | "
+                            f"{'sem indices' if drop_indexes else 'com indices':<11} | "
+                            f"{plan['Execution Time']:>10.2f} ms | "
+                            f"{describe(plan['Plan'])[0].strip()}",
+                            flush=True,
+                        )
+                        if args.plans:
+                            for line in describe(plan["Plan"]):
+                                print(f"{'':>13}{line}")
+
+            with conn.cursor() as cursor:
+                if not args.keep:
+                    cursor.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+                cursor.execute("RESET search_path")
+    finally:
+        pool.close()
+
+    print("\nResumo (ms):")
+    header = f"{'consulta':<34} {'indices':<5}" + "".join(
+        f"{size:>12}" for size in sizes
+    )
+    print(header)
+    for name in QUERIES:
+        for drop_indexes in variants:
+            timings = {
+                size: plan["Execution Time"]
+                for size, query, dropped, plan in results
+                if query == name and dropped == drop_indexes
+            }
+            print(
+                f"{name:<34} {'nao' if drop_indexes else 'sim':<5}"
+                + "".join(f"{timings[size]:>12.2f}" for size in sizes)
+            )
+
+
+if __name__ == "__main__":
+    main()
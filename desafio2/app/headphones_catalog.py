@@ -1,64 +1,25 @@
-import psycopg2
+import asyncio
+import itertools
 import os
-import time
 from datetime import datetime
 
-DB_HOST = os.getenv("DB_HOST", "postgres")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "headphones_db")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
-
-
-def get_db_connection():
-    max_retries = 30
-    retry_count = 0
-
-    while retry_count < max_retries:
-        try:
-            conn = psycopg2.connect(
-                host=DB_HOST,
-                port=DB_PORT,
-                database=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-            )
-            return conn
-        except psycopg2.OperationalError:
-            retry_count += 1
-            if retry_count >= max_retries:
-                raise
-            time.sleep(1)
+from psycopg2.extras import execute_values
+
+from bulk_import import UPSERT_SQL, import_rows
+from catalog_stats import collect_statistics, format_impedance_bucket
+from catalog_summary import summary_count, summary_statistics
+from db_pool import CURSOR_ITERSIZE, DB_DRIVER, DB_HOST, DB_NAME, DB_PORT, pool
+from migrations import migrate
+from output import write_blocks
+
+STATS_PERCENTILES = os.getenv("STATS_PERCENTILES", "0") == "1"
 
 
 def init_database():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS headphones (
-            id SERIAL PRIMARY KEY,
-            brand VARCHAR(100) NOT NULL,
-            model VARCHAR(100) NOT NULL,
-            type VARCHAR(50) NOT NULL,
-            driver_size INTEGER,
-            impedance INTEGER,
-            sensitivity INTEGER,
-            frequency_response VARCHAR(50),
-            cable_type VARCHAR(100),
-            weight INTEGER,
-            price DECIMAL(10, 2),
-            sound_signature VARCHAR(50),
-            notes TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """
-    )
+    with pool.connection() as conn:
+        for migration in migrate(conn):
+            print(f"Migracao aplicada: {migration.version:03d} {migration.name}")
 
-    conn.commit()
-    cursor.close()
-    conn.close()
     print(f"Banco de dados inicializado: {DB_HOST}:{DB_PORT}/{DB_NAME}")
 
 
@@ -76,271 +37,309 @@ def add_headphone(
     sound_signature,
     notes="",
 ):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        INSERT INTO headphones (brand, model, type, driver_size, impedance, sensitivity,
-                               frequency_response, cable_type, weight, price, 
-                               sound_signature, notes)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        RETURNING id
-    """,
-        (
-            brand,
-            model,
-            type_,
-            driver_size,
-            impedance,
-            sensitivity,
-            frequency_response,
-            cable_type,
-            weight,
-            price,
-            sound_signature,
-            notes,
-        ),
-    )
+    # Upsert pela chave (brand, model): repetir a chamada atualiza o fone
+    # existente em vez de criar uma copia
+    with pool.cursor() as cursor:
+        returned = execute_values(
+            cursor,
+            f"{UPSERT_SQL} RETURNING id",
+            [
+                (
+                    brand,
+                    model,
+                    type_,
+                    driver_size,
+                    impedance,
+                    sensitivity,
+                    frequency_response,
+                    cable_type,
+                    weight,
+                    price,
+                    sound_signature,
+                    notes,
+                )
+            ],
+            fetch=True,
+        )
 
-    headphone_id = cursor.fetchone()[0]
-    conn.commit()
-    cursor.close()
-    conn.close()
+        if returned:
+            headphone_id = returned[0][0]
+        else:
+            # Fone identico ja cadastrado: nada foi reescrito
+            cursor.execute(
+                "SELECT id FROM headphones WHERE brand = %s AND model = %s",
+                (brand, model),
+            )
+            headphone_id = cursor.fetchone()[0]
 
     print(f"Fone adicionado: {brand} {model} (ID: {headphone_id})")
     return headphone_id
 
 
-def list_headphones():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT * FROM headphones ORDER BY brand, model")
-    headphones = cursor.fetchall()
+# Colunas na ordem esperada por format_headphone
+HEADPHONE_COLUMNS = """
+    id, brand, model, type, driver_size, impedance, sensitivity,
+    frequency_response, cable_type, weight, price, sound_signature,
+    notes, created_at
+"""
+
+LIST_SQL = f"""
+    SELECT {HEADPHONE_COLUMNS}
+    FROM headphones
+    ORDER BY brand, model
+"""
+
+
+def format_headphone(row):
+    (
+        id_,
+        brand,
+        model,
+        type_,
+        driver_size,
+        impedance,
+        sensitivity,
+        frequency_response,
+        cable_type,
+        weight,
+        price,
+        sound_signature,
+        notes,
+        created_at,
+    ) = row
+    notes_line = f"Notas: {notes}\n" if notes else ""
+    return (
+        f"\nID: {id_}\n"
+        f"Marca/Modelo: {brand} {model}\n"
+        f"Tipo: {type_}\n"
+        f"Driver: {driver_size}mm | Impedancia: {impedance}ohms | Sensibilidade: {sensitivity}dB\n"
+        f"Resposta de Frequencia: {frequency_response}\n"
+        f"Cabo: {cable_type}\n"
+        f"Peso: {weight}g\n"
+        f"Preco: ${float(price):.2f}\n"
+        f"Assinatura Sonora: {sound_signature}\n"
+        f"{notes_line}"
+        f"Adicionado em: {created_at}\n"
+        f"{'-' * 100}\n"
+    )
 
-    column_names = [desc[0] for desc in cursor.description]
-    cursor.close()
-    conn.close()
 
-    if not headphones:
+def list_headphones(itersize=CURSOR_ITERSIZE):
+    rows = pool.stream(LIST_SQL, itersize=itersize)
+    first = next(rows, None)
+    if first is None:
         print("\nNenhum fone encontrado no catalogo.")
         return
 
+    print_catalog_header()
+    write_blocks(map(format_headphone, itertools.chain((first,), rows)))
+
+
+def print_catalog_header():
     print("\n" + "=" * 100)
     print("CATALOGO DE FONES DE OUVIDO AUDIOFILO")
     print("=" * 100)
 
-    for hp in headphones:
-        hp_dict = dict(zip(column_names, hp))
-        print(f"\nID: {hp_dict['id']}")
-        print(f"Marca/Modelo: {hp_dict['brand']} {hp_dict['model']}")
-        print(f"Tipo: {hp_dict['type']}")
-        print(
-            f"Driver: {hp_dict['driver_size']}mm | Impedancia: {hp_dict['impedance']}ohms | Sensibilidade: {hp_dict['sensitivity']}dB"
-        )
-        print(f"Resposta de Frequencia: {hp_dict['frequency_response']}")
-        print(f"Cabo: {hp_dict['cable_type']}")
-        print(f"Peso: {hp_dict['weight']}g")
-        print(f"Preco: ${float(hp_dict['price']):.2f}")
-        print(f"Assinatura Sonora: {hp_dict['sound_signature']}")
-        if hp_dict["notes"]:
-            print(f"Notas: {hp_dict['notes']}")
-        print(f"Adicionado em: {hp_dict['created_at']}")
-        print("-" * 100)
-
 
 def count_headphones():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM headphones")
-    total = cursor.fetchone()[0]
-    cursor.close()
-    conn.close()
-    return total
-
-
-def get_statistics():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT COUNT(*) FROM headphones")
-    total = cursor.fetchone()[0]
-
-    cursor.execute("SELECT AVG(price) FROM headphones")
-    avg_price = cursor.fetchone()[0] or 0
-
-    cursor.execute(
-        """
-        SELECT type, COUNT(*) as count 
-        FROM headphones 
-        GROUP BY type 
-        ORDER BY count DESC
-    """
-    )
-    types = cursor.fetchall()
-
-    cursor.execute(
-        """
-        SELECT brand, COUNT(*) as count 
-        FROM headphones 
-        GROUP BY brand 
-        ORDER BY count DESC
-    """
-    )
-    brands = cursor.fetchall()
+    with pool.cursor() as cursor:
+        return summary_count(cursor)
+
+
+def get_statistics(percentiles=STATS_PERCENTILES):
+    with pool.cursor() as cursor:
+        stats = None if percentiles else summary_statistics(cursor)
+        if stats is None:
+            # Percentis exigem os valores individuais: varre a tabela
+            stats = collect_statistics(
+                cursor, percentiles=("price",) if percentiles else ()
+            )
 
-    cursor.execute("SELECT AVG(impedance) FROM headphones")
-    avg_impedance = cursor.fetchone()[0] or 0
+    print_statistics(stats)
 
-    cursor.close()
-    conn.close()
 
+def print_statistics(stats):
     print("\n" + "=" * 80)
     print("ESTATISTICAS DO CATALOGO")
     print("=" * 80)
-    print(f"Total de fones: {total}")
-    print(f"Preco medio: ${float(avg_price):.2f}")
-    print(f"Impedancia media: {float(avg_impedance):.0f}ohms")
+    print(f"Total de fones: {stats.total}")
+    print(f"Preco medio: ${float(stats.metric('avg_price')):.2f}")
+    print(f"Impedancia media: {float(stats.metric('avg_impedance')):.0f}ohms")
+    if "price" in stats.percentiles:
+        print(
+            "Percentis de preco: "
+            + " | ".join(
+                f"p{point} ${float(value or 0):.2f}"
+                for point, value in stats.percentiles["price"].items()
+            )
+        )
     print(f"\nTipos:")
-    for t in types:
-        print(f"   {t[0]}: {t[1]}")
+    for type_, count in stats.group("types"):
+        print(f"   {type_}: {count}")
     print(f"\nMarcas:")
-    for b in brands:
-        print(f"   {b[0]}: {b[1]}")
+    for brand, count in stats.group("brands"):
+        print(f"   {brand}: {count}")
+    print("\nImpedancia:")
+    for lower, count in sorted(
+        stats.group("impedance_histogram"), key=lambda item: (item[0] is None, item[0])
+    ):
+        print(f"   {format_impedance_bucket(lower)}: {count}")
     print("=" * 80)
 
 
+SAMPLE_HEADPHONES = [
+    (
+        "Sennheiser",
+        "HD 800 S",
+        "Open-back Over-ear",
+        56,
+        300,
+        102,
+        "4Hz - 51kHz",
+        "Detachable 6.3mm",
+        330,
+        1699.99,
+        "Neutral/Analytical",
+        "Flagship open-back",
+    ),
+    (
+        "Focal",
+        "Clear MG",
+        "Open-back Over-ear",
+        40,
+        55,
+        104,
+        "5Hz - 28kHz",
+        "Detachable 3.5mm/6.3mm",
+        450,
+        1490.00,
+        "Balanced/Slightly Warm",
+        "Magnesium drivers",
+    ),
+    (
+        "Audeze",
+        "LCD-X",
+        "Open-back Over-ear",
+        106,
+        20,
+        103,
+        "10Hz - 50kHz",
+        "Detachable Mini-XLR",
+        612,
+        1199.00,
+        "Neutral",
+        "Planar magnetic",
+    ),
+    (
+        "Beyerdynamic",
+        "DT 1990 Pro",
+        "Open-back Over-ear",
+        45,
+        250,
+        102,
+        "5Hz - 40kHz",
+        "Detachable 3.5mm",
+        370,
+        599.00,
+        "Bright/Analytical",
+        "Professional studio monitoring",
+    ),
+    (
+        "HiFiMAN",
+        "Arya Stealth",
+        "Open-back Over-ear",
+        0,
+        32,
+        94,
+        "8Hz - 65kHz",
+        "Detachable 3.5mm",
+        404,
+        1299.00,
+        "Neutral/Natural",
+        "Stealth magnets planar",
+    ),
+    (
+        "AKG",
+        "K701",
+        "Open-back Over-ear",
+        44,
+        62,
+        105,
+        "10Hz - 39.8kHz",
+        "Detachable 3.5mm",
+        235,
+        249.00,
+        "Neutral",
+        "Classical music reference",
+    ),
+    (
+        "Audio-Technica",
+        "ATH-M50x",
+        "Closed-back Over-ear",
+        45,
+        38,
+        99,
+        "15Hz - 28kHz",
+        "Detachable 3.5mm",
+        285,
+        149.00,
+        "V-Shaped",
+        "Popular studio headphone",
+    ),
+    (
+        "Sony",
+        "MDR-Z7M2",
+        "Closed-back Over-ear",
+        70,
+        70,
+        98,
+        "4Hz - 100kHz",
+        "Detachable 4.4mm balanced",
+        340,
+        899.00,
+        "Warm",
+        "High-res audio 70mm drivers",
+    ),
+]
+
+
 def populate_sample_data():
     print("\nAdicionando fones de exemplo ao catalogo...")
 
-    sample_headphones = [
-        (
-            "Sennheiser",
-            "HD 800 S",
-            "Open-back Over-ear",
-            56,
-            300,
-            102,
-            "4Hz - 51kHz",
-            "Detachable 6.3mm",
-            330,
-            1699.99,
-            "Neutral/Analytical",
-            "Flagship open-back",
-        ),
-        (
-            "Focal",
-            "Clear MG",
-            "Open-back Over-ear",
-            40,
-            55,
-            104,
-            "5Hz - 28kHz",
-            "Detachable 3.5mm/6.3mm",
-            450,
-            1490.00,
-            "Balanced/Slightly Warm",
-            "Magnesium drivers",
-        ),
-        (
-            "Audeze",
-            "LCD-X",
-            "Open-back Over-ear",
-            106,
-            20,
-            103,
-            "10Hz - 50kHz",
-            "Detachable Mini-XLR",
-            612,
-            1199.00,
-            "Neutral",
-            "Planar magnetic",
-        ),
-        (
-            "Beyerdynamic",
-            "DT 1990 Pro",
-            "Open-back Over-ear",
-            45,
-            250,
-            102,
-            "5Hz - 40kHz",
-            "Detachable 3.5mm",
-            370,
-            599.00,
-            "Bright/Analytical",
-            "Professional studio monitoring",
-        ),
-        (
-            "HiFiMAN",
-            "Arya Stealth",
-            "Open-back Over-ear",
-            0,
-            32,
-            94,
-            "8Hz - 65kHz",
-            "Detachable 3.5mm",
-            404,
-            1299.00,
-            "Neutral/Natural",
-            "Stealth magnets planar",
-        ),
-        (
-            "AKG",
-            "K701",
-            "Open-back Over-ear",
-            44,
-            62,
-            105,
-            "10Hz - 39.8kHz",
-            "Detachable 3.5mm",
-            235,
-            249.00,
-            "Neutral",
-            "Classical music reference",
-        ),
-        (
-            "Audio-Technica",
-            "ATH-M50x",
-            "Closed-back Over-ear",
-            45,
-            38,
-            99,
-            "15Hz - 28kHz",
-            "Detachable 3.5mm",
-            285,
-            149.00,
-            "V-Shaped",
-            "Popular studio headphone",
-        ),
-        (
-            "Sony",
-            "MDR-Z7M2",
-            "Closed-back Over-ear",
-            70,
-            70,
-            98,
-            "4Hz - 100kHz",
-            "Detachable 4.4mm balanced",
-            340,
-            899.00,
-            "Warm",
-            "High-res audio 70mm drivers",
-        ),
-    ]
-
-    for hp in sample_headphones:
-        add_headphone(*hp)
-
-    print("\nDados de exemplo adicionados com sucesso!")
+    # Upsert: dois catalogos subindo juntos com o banco vazio nao duplicam
+    # os exemplos
+    count = import_rows(SAMPLE_HEADPHONES, "upsert")
 
+    print(f"\n{count} fones de exemplo adicionados com sucesso!")
 
-def main():
+
+def print_banner():
     print("\n" + "=" * 80)
     print("SISTEMA DE CATALOGO DE FONES DE OUVIDO AUDIOFILO")
     print("=" * 80)
     print(f"Banco de dados: {DB_HOST}:{DB_PORT}/{DB_NAME}")
 
+
+def print_footer():
+    print("\n" + "=" * 80)
+    print("Sistema executado com sucesso!")
+    print(f"Os dados foram salvos no PostgreSQL: {DB_HOST}/{DB_NAME}")
+    print(
+        "Mesmo removendo o container da aplicacao, os dados permanecerao no volume Docker"
+    )
+    print("=" * 80 + "\n")
+
+
+def main():
+    if DB_DRIVER == "asyncpg":
+        # Importado sob demanda: asyncpg so e necessario neste caminho
+        from catalog_async import run_catalog
+
+        asyncio.run(run_catalog())
+        return
+
+    print_banner()
+
     init_database()
 
     count = count_headphones()
@@ -356,13 +355,9 @@ def main():
 
     get_statistics()
 
-    print("\n" + "=" * 80)
-    print("Sistema executado com sucesso!")
-    print(f"Os dados foram salvos no PostgreSQL: {DB_HOST}/{DB_NAME}")
-    print(
-        "Mesmo removendo o container da aplicacao, os dados permanecerao no volume Docker"
-    )
-    print("=" * 80 + "\n")
+    print_footer()
+
+    pool.close()
 
 
 if __name__ == "__main__":
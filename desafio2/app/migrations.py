@@ -0,0 +1,220 @@
+import argparse
+from collections import namedtuple
+
+from catalog_changes import INDEXES as CHANGE_INDEXES
+from catalog_changes import ensure_change_tracking
+from catalog_dedup import compact_duplicates
+from catalog_summary import ensure_summary
+from db_pool import pool
+
+# Chave do advisory lock que serializa execucoes concorrentes (catalogo e
+# ferramentas podem subir ao mesmo tempo)
+MIGRATION_LOCK = 160016
+
+Migration = namedtuple("Migration", ["version", "name", "apply", "transactional"])
+
+HEADPHONES_DDL = """
+    CREATE TABLE IF NOT EXISTS headphones (
+        id SERIAL PRIMARY KEY,
+        brand VARCHAR(100) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        type VARCHAR(50) NOT NULL,
+        driver_size INTEGER,
+        impedance INTEGER,
+        sensitivity INTEGER,
+        frequency_response VARCHAR(50),
+        cable_type VARCHAR(100),
+        weight INTEGER,
+        price DECIMAL(10, 2),
+        sound_signature VARCHAR(50),
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Documento de busca textual sobre notes; as consultas precisam usar a mesma
+# expressao do indice GIN para que ele seja escolhido
+SEARCH_CONFIG = "english"
+NOTES_DOCUMENT = f"to_tsvector('{SEARCH_CONFIG}', COALESCE(notes, ''))"
+
+MIGRATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(200) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def statements(*sql):
+    def apply(cursor):
+        for statement in sql:
+            cursor.execute(statement)
+
+    return apply
+
+
+def create_indexes(*definitions, unique=False):
+    # CONCURRENTLY nao bloqueia escritas durante a criacao, mas nao roda em
+    # transacao; um indice invalido de uma tentativa interrompida e recriado
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+
+    def apply(cursor):
+        for name, definition in definitions:
+            cursor.execute(
+                """
+                SELECT NOT i.indisvalid
+                FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+            """,
+                (name,),
+            )
+            row = cursor.fetchone()
+            if row and row[0]:
+                cursor.execute(f"DROP INDEX CONCURRENTLY {name}")
+            cursor.execute(
+                f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {definition}"
+            )
+
+    return apply
+
+
+def unique_brand_model(cursor):
+    # Remove as repeticoes e cria o indice unico na mesma migracao: se uma
+    # copia nova entrar antes do fim do indice, a criacao falha e a proxima
+    # execucao repete as duas etapas
+    cursor.execute("BEGIN")
+    try:
+        compact_duplicates(cursor)
+    except BaseException:
+        cursor.execute("ROLLBACK")
+        raise
+    cursor.execute("COMMIT")
+    create_indexes(
+        ("headphones_brand_model_key", "headphones (brand, model)"), unique=True
+    )(cursor)
+    # Com (brand, model) unico, o indice de chave da migracao 5 fica
+    # redundante: o unico atende a listagem e a paginacao de catalog_search
+    drop_indexes("headphones_brand_model_id_idx")(cursor)
+
+
+def drop_indexes(*names):
+    def apply(cursor):
+        for name in names:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+    return apply
+
+
+# Indices de headphones ao fim das migracoes: headphones_brand_model_key
+# (unico; listagem e paginacao por chave), headphones_type_idx,
+# headphones_price_idx, headphones_notes_search_idx e os de catalog_changes.
+# headphones_brand_model_idx (3) e headphones_brand_model_id_idx (5) foram
+# substituidos ao longo do caminho e sao removidos em 6 e 9
+MIGRATIONS = (
+    Migration(1, "create headphones", statements(HEADPHONES_DDL), True),
+    Migration(2, "create headphones_summary", ensure_summary, True),
+    Migration(
+        3,
+        "index brand/model, type and price",
+        create_indexes(
+            # ORDER BY brand, model da listagem
+            ("headphones_brand_model_idx", "headphones (brand, model)"),
+            ("headphones_type_idx", "headphones (type)"),
+            ("headphones_price_idx", "headphones (price)"),
+        ),
+        False,
+    ),
+    Migration(
+        4,
+        "full-text index on notes",
+        create_indexes(
+            ("headphones_notes_search_idx", f"headphones USING GIN ({NOTES_DOCUMENT})")
+        ),
+        False,
+    ),
+    Migration(
+        5,
+        "keyset index brand/model/id",
+        # Paginacao por (brand, model, id) em catalog_search; tambem atende o
+        # ORDER BY brand, model da listagem
+        create_indexes(
+            ("headphones_brand_model_id_idx", "headphones (brand, model, id)")
+        ),
+        False,
+    ),
+    Migration(
+        6, "drop index brand/model", drop_indexes("headphones_brand_model_idx"), False
+    ),
+    Migration(7, "catalog change tracking", ensure_change_tracking, True),
+    Migration(8, "index change versions", create_indexes(*CHANGE_INDEXES), False),
+    # Chave natural (brand, model) usada pelo upsert (ON CONFLICT)
+    Migration(9, "unique brand/model", unique_brand_model, False),
+)
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    # Cada migracao transacional roda em sua propria transacao junto com o
+    # registro em schema_migrations; as demais rodam em autocommit
+    applied = []
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK,))
+            try:
+                cursor.execute(MIGRATIONS_DDL)
+                done = set(applied_versions(cursor))
+                for migration in migrations:
+                    if migration.version in done:
+                        continue
+                    if migration.transactional:
+                        cursor.execute("BEGIN")
+                    try:
+                        migration.apply(cursor)
+                        cursor.execute(
+                            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                            (migration.version, migration.name),
+                        )
+                    except BaseException:
+                        if migration.transactional:
+                            cursor.execute("ROLLBACK")
+                        raise
+                    if migration.transactional:
+                        cursor.execute("COMMIT")
+                    applied.append(migration)
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK,))
+    finally:
+        conn.autocommit = autocommit
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migracoes do schema do catalogo")
+    parser.add_argument("--status", action="store_true", help="Apenas lista o estado")
+    args = parser.parse_args()
+
+    try:
+        with pool.connection() as conn:
+            if not args.status:
+                for migration in migrate(conn):
+                    print(f"Aplicada {migration.version:03d}: {migration.name}")
+            with conn.cursor() as cursor:
+                cursor.execute(MIGRATIONS_DDL)
+                done = set(applied_versions(cursor))
+    finally:
+        pool.close()
+
+    for migration in MIGRATIONS:
+        state = "aplicada" if migration.version in done else "pendente"
+        print(f"{migration.version:03d} {migration.name}: {state}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import sys
+
+BUFFER_SIZE = 64 * 1024
+
+
+def write_blocks(blocks, out=None, buffer_size=BUFFER_SIZE):
+    # Junta os blocos de texto e escreve em pedacos de ~buffer_size, em vez
+    # de um print por campo
+    out = out or sys.stdout
+    pending = []
+    size = 0
+    for block in blocks:
+        pending.append(block)
+        size += len(block)
+        if size >= buffer_size:
+            out.write("".join(pending))
+            pending = []
+            size = 0
+    if pending:
+        out.write("".join(pending))
+    out.flush()
@@ -1,117 +1,174 @@
-import psycopg2
-import os
+import asyncio
+import sqlite3
 import sys
-import time
-
-DB_HOST = os.getenv("DB_HOST", "postgres")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "headphones_db")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
-
-
-def get_db_connection():
-    max_retries = 30
-    retry_count = 0
-
-    while retry_count < max_retries:
-        try:
-            conn = psycopg2.connect(
-                host=DB_HOST,
-                port=DB_PORT,
-                database=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-            )
-            return conn
-        except psycopg2.OperationalError:
-            retry_count += 1
-            if retry_count >= max_retries:
-                raise
-            time.sleep(1)
-
-
-def read_catalog():
+
+import psycopg2
+
+from catalog_changes import tracking_exists
+from catalog_stats import collect_statistics
+from catalog_summary import summary_exists, summary_statistics
+from db_pool import DB_DRIVER, DB_HOST, DB_NAME, DB_PORT, pool
+from output import write_blocks
+from reader_cache import CACHE_PATH, CatalogCache
+
+CACHE_MODES = {"hit": "sem mudancas", "delta": "atualizado", "full": "carga completa"}
+
+
+LIST_SQL = """
+    SELECT id, brand, model, type, driver_size, impedance, sensitivity, price,
+           sound_signature
+    FROM headphones
+    ORDER BY brand, model
+"""
+
+
+def format_entry(row):
+    (
+        id_,
+        brand,
+        model,
+        type_,
+        driver_size,
+        impedance,
+        sensitivity,
+        price,
+        signature,
+    ) = row
+    return (
+        f"\n{id_:02d} | {brand} {model}\n"
+        f"   {type_}\n"
+        f"   {driver_size}mm | {impedance}ohms | {sensitivity}dB\n"
+        f"   ${float(price):.2f} | {signature}\n"
+    )
+
+
+def print_header():
     print("\n" + "=" * 80)
     print("LENDO CATALOGO DE FONES DE OUVIDO (CONTAINER LEITOR)")
     print("=" * 80)
     print(f"Conectando a: {DB_HOST}:{DB_PORT}/{DB_NAME}")
 
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT table_name FROM information_schema.tables 
-            WHERE table_schema = 'public' AND table_name = 'headphones'
-        """
-        )
-
-        if not cursor.fetchone():
-            print("\nTabela 'headphones' nao encontrada!")
-            print("Execute o container principal primeiro para criar os dados.")
-            cursor.close()
-            conn.close()
-            return
 
-        cursor.execute("SELECT COUNT(*) FROM headphones")
-        total = cursor.fetchone()[0]
-
-        print(f"\nTotal de fones encontrados: {total}")
+def print_listing_header():
+    print("\n" + "=" * 80)
+    print("LISTA DE FONES PERSISTIDOS")
+    print("=" * 80)
 
-        if total == 0:
-            print("\nCatalogo vazio.")
-            cursor.close()
-            conn.close()
-            return
 
-        cursor.execute("SELECT * FROM headphones ORDER BY brand, model")
-        headphones = cursor.fetchall()
+def print_summary(avg_price, min_price, max_price):
+    print("\n" + "=" * 80)
+    print("RESUMO ESTATISTICO")
+    print("=" * 80)
+    print(f"Preco medio: ${float(avg_price):.2f}")
+    print(f"Mais barato: ${float(min_price):.2f}")
+    print(f"Mais caro: ${float(max_price):.2f}")
+    print("=" * 80)
 
-        column_names = [desc[0] for desc in cursor.description]
+    print("\nDados lidos com sucesso do banco persistente!")
+    print("Estes dados sobrevivem a remocao dos containers da aplicacao")
+    print("=" * 80 + "\n")
 
-        print("\n" + "=" * 80)
-        print("LISTA DE FONES PERSISTIDOS")
-        print("=" * 80)
 
-        for hp in headphones:
-            hp_dict = dict(zip(column_names, hp))
-            print(f"\n{hp_dict['id']:02d} | {hp_dict['brand']} {hp_dict['model']}")
-            print(f"   {hp_dict['type']}")
-            print(
-                f"   {hp_dict['driver_size']}mm | {hp_dict['impedance']}ohms | {hp_dict['sensitivity']}dB"
-            )
-            print(f"   ${float(hp_dict['price']):.2f} | {hp_dict['sound_signature']}")
+def open_cache(path):
+    try:
+        return CatalogCache(path, f"{DB_HOST}:{DB_PORT}/{DB_NAME}")
+    except sqlite3.Error as e:
+        print(f"\nCache local indisponivel ({e}); lendo direto do banco")
+        return None
 
-        cursor.execute("SELECT AVG(price) FROM headphones")
-        avg_price = cursor.fetchone()[0]
 
-        cursor.execute("SELECT MIN(price) FROM headphones")
-        min_price = cursor.fetchone()[0]
+def show_catalog(cache_path=CACHE_PATH):
+    # Nao fecha o pool: bench_scale mede varias leituras seguidas sem pagar
+    # a reconexao a cada uma
+    print_header()
 
-        cursor.execute("SELECT MAX(price) FROM headphones")
-        max_price = cursor.fetchone()[0]
+    cache = None
+    try:
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                # Um unico snapshot: a versao do catalogo e as linhas trazidas
+                # para o cache correspondem ao mesmo estado do banco
+                cursor.execute(
+                    "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"
+                )
+
+                # to_regclass respeita o search_path (ex.: schemas de benchmark)
+                cursor.execute("SELECT to_regclass('headphones')")
+
+                if cursor.fetchone()[0] is None:
+                    print("\nTabela 'headphones' nao encontrada!")
+                    print("Execute o container principal primeiro para criar os dados.")
+                    return
+
+                if cache_path and tracking_exists(cursor):
+                    cache = open_cache(cache_path)
+
+                if cache is None:
+                    # Com o resumo mantido pelo catalogo, contagem e estatisticas
+                    # custam O(grupos) em vez de uma varredura de headphones
+                    stats = (
+                        summary_statistics(cursor) if summary_exists(cursor) else None
+                    )
+                    if stats is None:
+                        stats = collect_statistics(cursor)
+                    total = stats.total
+                    prices = [
+                        stats.metric(name)
+                        for name in ("avg_price", "min_price", "max_price")
+                    ]
+
+            if cache is not None:
+                # Busca apenas o que mudou desde a versao guardada no cache;
+                # listagem e estatisticas saem do arquivo local
+                refresh = cache.refresh(conn)
+                print(
+                    f"Cache local ({cache_path}): {CACHE_MODES[refresh.mode]}, "
+                    f"{refresh.fetched} linhas recebidas, {refresh.deleted} removidas, "
+                    f"versao {refresh.version}"
+                )
+                cached = cache.statistics()
+                total = cached.total
+                prices = [
+                    cached.avg_price or 0,
+                    cached.min_price or 0,
+                    cached.max_price or 0,
+                ]
 
-        print("\n" + "=" * 80)
-        print("RESUMO ESTATISTICO")
-        print("=" * 80)
-        print(f"Preco medio: ${float(avg_price):.2f}")
-        print(f"Mais barato: ${float(min_price):.2f}")
-        print(f"Mais caro: ${float(max_price):.2f}")
-        print("=" * 80)
+        print(f"\nTotal de fones encontrados: {total}")
 
-        cursor.close()
-        conn.close()
+        if total == 0:
+            print("\nCatalogo vazio.")
+            return
 
-        print("\nDados lidos com sucesso do banco persistente!")
-        print("Estes dados sobrevivem a remocao dos containers da aplicacao")
-        print("=" * 80 + "\n")
+        print_listing_header()
+        entries = cache.rows() if cache is not None else pool.stream(LIST_SQL)
+        write_blocks(map(format_entry, entries))
+        print_summary(*prices)
 
     except psycopg2.Error as e:
         print(f"\nErro ao acessar o banco de dados: {e}")
         sys.exit(1)
+    finally:
+        if cache is not None:
+            cache.close()
 
 
-if __name__ == "__main__":
+def read_catalog(cache_path=CACHE_PATH):
+    try:
+        show_catalog(cache_path)
+    finally:
+        pool.close()
+
+
+def main():
+    if DB_DRIVER == "asyncpg":
+        # Importado sob demanda: asyncpg so e necessario neste caminho
+        from catalog_async import read_catalog_async
+
+        asyncio.run(read_catalog_async())
+        return
     read_catalog()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import itertools
+import os
+import sqlite3
+import tempfile
+from collections import namedtuple
+from decimal import Decimal
+
+from catalog_changes import catalog_version, deleted_since
+from db_pool import CURSOR_ITERSIZE
+
+# Caminho do cache local do leitor; vazio desativa o cache
+CACHE_PATH = os.getenv(
+    "READER_CACHE", os.path.join(tempfile.gettempdir(), "headphones_reader.sqlite3")
+)
+
+# Mesmas colunas de reader.LIST_SQL, na mesma ordem
+CACHE_COLUMNS = (
+    "id",
+    "brand",
+    "model",
+    "type",
+    "driver_size",
+    "impedance",
+    "sensitivity",
+    "price",
+    "sound_signature",
+)
+SOURCE_SQL = f"SELECT {', '.join(CACHE_COLUMNS)} FROM headphones"
+
+CACHE_DDL = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    """
+    CREATE TABLE IF NOT EXISTS headphones (
+        id INTEGER PRIMARY KEY,
+        brand TEXT NOT NULL,
+        model TEXT NOT NULL,
+        type TEXT NOT NULL,
+        driver_size INTEGER,
+        impedance INTEGER,
+        sensitivity INTEGER,
+        price REAL,
+        sound_signature TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS headphones_listing ON headphones (brand, model, id)",
+)
+
+# mode: "hit" (nada mudou), "delta" (so as mudancas) ou "full" (carga completa)
+Refresh = namedtuple("Refresh", ["mode", "fetched", "deleted", "version"])
+CachedStatistics = namedtuple(
+    "CachedStatistics", ["total", "avg_price", "min_price", "max_price"]
+)
+
+sqlite3.register_adapter(Decimal, str)
+
+
+class CatalogCache:
+    def __init__(self, path=CACHE_PATH, source=""):
+        # source identifica o banco de origem (host:porta/banco); um cache de
+        # outro banco e descartado
+        self.path = path
+        self.source = source
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        for statement in CACHE_DDL:
+            self.db.execute(statement)
+
+    def _meta(self):
+        return dict(self.db.execute("SELECT key, value FROM meta"))
+
+    def _load(self, conn, sql, params, itersize):
+        # Cursor nomeado na mesma transacao (mesmo snapshot) da versao lida
+        count = 0
+        with conn.cursor(name="reader_cache_load") as cursor:
+            cursor.itersize = itersize
+            cursor.execute(sql, params)
+            while True:
+                batch = list(itertools.islice(cursor, itersize))
+                if not batch:
+                    return count
+                self.db.executemany(
+                    f"INSERT OR REPLACE INTO headphones VALUES "
+                    f"({', '.join('?' * len(CACHE_COLUMNS))})",
+                    batch,
+                )
+                count += len(batch)
+
+    def refresh(self, conn, itersize=CURSOR_ITERSIZE):
+        # conn deve estar em uma transacao REPEATABLE READ: a versao, os
+        # tombstones e as linhas vem do mesmo snapshot
+        with conn.cursor() as cursor:
+            current = catalog_version(cursor)
+            meta = self._meta()
+            cached = int(meta["version"]) if "version" in meta else None
+
+            same_catalog = (
+                meta.get("source") == self.source
+                and meta.get("catalog_id") == current.catalog_id
+            )
+            if same_catalog and cached == current.version:
+                return Refresh("hit", 0, 0, cached)
+
+            full = (
+                not same_catalog
+                or cached is None
+                or cached < current.reset_version
+                or cached > current.version
+            )
+            with self.db:
+                if full:
+                    self.db.execute("DELETE FROM headphones")
+                    deleted = 0
+                    fetched = self._load(conn, SOURCE_SQL, None, itersize)
+                else:
+                    removed = deleted_since(cursor, cached)
+                    self.db.executemany(
+                        "DELETE FROM headphones WHERE id = ?",
+                        ((id_,) for id_ in removed),
+                    )
+                    deleted = len(removed)
+                    fetched = self._load(
+                        conn,
+                        f"{SOURCE_SQL} WHERE change_version > %s",
+                        (cached,),
+                        itersize,
+                    )
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    (
+                        ("source", self.source),
+                        ("catalog_id", current.catalog_id),
+                        ("version", str(current.version)),
+                    ),
+                )
+
+        return Refresh("full" if full else "delta", fetched, deleted, current.version)
+
+    def rows(self):
+        return self.db.execute(
+            f"SELECT {', '.join(CACHE_COLUMNS)} FROM headphones ORDER BY brand, model, id"
+        )
+
+    def statistics(self):
+        return CachedStatistics(
+            *self.db.execute(
+                "SELECT COUNT(*), AVG(price), MIN(price), MAX(price) FROM headphones"
+            ).fetchone()
+        )
+
+    def close(self):
+        self.db.close()
@@ -1,47 +1,37 @@
 from flask import Flask, jsonify, request
-import psycopg2
 import redis
 import os
-import json
-import time
 
-app = Flask(__name__)
+import psycopg2
+
+from cache_invalidation import (
+    CARS_TAG,
+    InvalidationListener,
+    car_tag,
+    car_tags,
+    class_tag,
+    install_triggers,
+    rarity_tag,
+)
+from cache_layer import CacheLayer
+from db import PoolUnavailable, connect, pool
 
-DB_HOST = os.getenv("DB_HOST", "postgres")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "forza_garage")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+app = Flask(__name__)
 
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 
-cache = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-
-
-def get_db_connection():
-    max_retries = 30
-    retry_count = 0
+# Escritas invalidam as chaves afetadas (pelas rotas e pelo NOTIFY do banco):
+# o TTL so limita a memoria usada por chaves que ninguem mais le
+CARS_TTL = int(os.getenv("CACHE_TTL", "3600"))
+STATS_TTL = int(os.getenv("STATS_CACHE_TTL", "3600"))
 
-    while retry_count < max_retries:
-        try:
-            conn = psycopg2.connect(
-                host=DB_HOST,
-                port=DB_PORT,
-                database=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-            )
-            return conn
-        except psycopg2.OperationalError:
-            retry_count += 1
-            if retry_count >= max_retries:
-                raise
-            time.sleep(1)
+cache = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+cache_layer = CacheLayer(cache)
 
 
 def init_database():
-    conn = get_db_connection()
+    conn = connect()
     cursor = conn.cursor()
 
     cursor.execute(
@@ -62,6 +52,9 @@ def init_database():
     """
     )
 
+    install_triggers(cursor)
+    conn.commit()
+
     cursor.execute("SELECT COUNT(*) FROM cars")
     count = cursor.fetchone()[0]
 
@@ -105,8 +98,8 @@ def index():
             "version": "1.0",
             "endpoints": {
                 "/": "Service info",
-                "/cars": "List all cars",
-                "/cars/<id>": "Get car by ID",
+                "/cars": "List all cars (GET) or create a car (POST)",
+                "/cars/<id>": "Get (GET), replace (PUT) or delete (DELETE) a car",
                 "/cars/class/<class>": "Get cars by class",
                 "/cars/rarity/<rarity>": "Get cars by rarity",
                 "/stats": "Garage statistics",
@@ -116,222 +109,302 @@ def index():
     )
 
 
-@app.route("/cars")
-def get_cars():
-    cache_key = "all_cars"
-    cached = cache.get(cache_key)
-
-    if cached:
-        return jsonify({"source": "cache", "cars": json.loads(cached)})
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM cars ORDER BY manufacturer, model")
+def car_from_row(column_names, row):
+    car = dict(zip(column_names, row))
+    car["created_at"] = str(car["created_at"])
+    car["acceleration"] = float(car["acceleration"])
+    car["price"] = int(car["price"])
+    return car
+
+
+def fetch_cars(sql, params=None):
+    with pool.cursor() as cursor:
+        cursor.execute(sql, params)
+        column_names = [desc[0] for desc in cursor.description]
+        return [car_from_row(column_names, row) for row in cursor.fetchall()]
+
+
+CAR_FIELDS = {
+    "manufacturer": str,
+    "model": str,
+    "year": int,
+    "class": str,
+    "horsepower": int,
+    "top_speed": int,
+    "acceleration": (int, float),
+    "price": int,
+    "rarity": str,
+}
+
+CAR_COLUMNS = ", ".join(CAR_FIELDS)
+
+
+def parse_car(data):
+    # Corpo do POST/PUT: todos os campos, com os tipos da tabela
+    if not isinstance(data, dict):
+        return None, "Request body must be a JSON object"
+    missing = [field for field in CAR_FIELDS if field not in data]
+    if missing:
+        return None, f"Missing fields: {', '.join(missing)}"
+    for field, kind in CAR_FIELDS.items():
+        value = data[field]
+        if isinstance(value, bool) or not isinstance(value, kind):
+            return None, f"Invalid value for {field}"
+        if isinstance(value, str) and not value.strip():
+            return None, f"Empty value for {field}"
+    return tuple(data[field] for field in CAR_FIELDS), None
+
+
+def invalidate(tags):
+    # O commit ja aconteceu: se o Redis falhar aqui, o listener invalida o
+    # cache inteiro quando se reconectar
+    try:
+        cache_layer.invalidate(tags)
+    except redis.RedisError:
+        app.logger.exception("Falha ao invalidar o cache")
 
-    column_names = [desc[0] for desc in cursor.description]
-    cars = []
 
-    for row in cursor.fetchall():
-        car = dict(zip(column_names, row))
-        car["created_at"] = str(car["created_at"])
-        car["acceleration"] = float(car["acceleration"])
-        car["price"] = int(car["price"])
-        cars.append(car)
+def load_all_cars():
+    return fetch_cars("SELECT * FROM cars ORDER BY manufacturer, model")
 
-    cursor.close()
-    conn.close()
 
-    cache.setex(cache_key, 60, json.dumps(cars))
+def load_car(car_id):
+    cars = fetch_cars("SELECT * FROM cars WHERE id = %s", (car_id,))
+    return cars[0] if cars else None
 
-    return jsonify({"source": "database", "total": len(cars), "cars": cars})
 
+def load_cars_by_class(car_class):
+    return (
+        fetch_cars(
+            "SELECT * FROM cars WHERE class = %s ORDER BY horsepower DESC", (car_class,)
+        )
+        or None
+    )
 
-@app.route("/cars/<int:car_id>")
-def get_car(car_id):
-    cache_key = f"car_{car_id}"
-    cached = cache.get(cache_key)
 
-    if cached:
-        return jsonify({"source": "cache", "car": json.loads(cached)})
+def load_cars_by_rarity(rarity):
+    return (
+        fetch_cars(
+            "SELECT * FROM cars WHERE rarity = %s ORDER BY price DESC", (rarity,)
+        )
+        or None
+    )
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM cars WHERE id = %s", (car_id,))
 
-    row = cursor.fetchone()
+def load_stats():
+    with pool.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM cars")
+        total_cars = cursor.fetchone()[0]
 
-    if not row:
-        cursor.close()
-        conn.close()
-        return jsonify({"error": "Car not found"}), 404
+        cursor.execute("SELECT AVG(horsepower) FROM cars")
+        avg_hp = float(cursor.fetchone()[0] or 0)
 
-    column_names = [desc[0] for desc in cursor.description]
-    car = dict(zip(column_names, row))
-    car["created_at"] = str(car["created_at"])
-    car["acceleration"] = float(car["acceleration"])
-    car["price"] = int(car["price"])
+        cursor.execute("SELECT AVG(price) FROM cars")
+        avg_price = float(cursor.fetchone()[0] or 0)
 
-    cursor.close()
-    conn.close()
+        cursor.execute("SELECT MAX(top_speed) FROM cars")
+        max_speed = cursor.fetchone()[0]
 
-    cache.setex(cache_key, 60, json.dumps(car))
+        cursor.execute("SELECT MIN(acceleration) FROM cars")
+        best_accel = float(cursor.fetchone()[0] or 0)
 
-    return jsonify({"source": "database", "car": car})
+        cursor.execute(
+            "SELECT class, COUNT(*) FROM cars GROUP BY class ORDER BY COUNT(*) DESC"
+        )
+        classes = [{"class": row[0], "count": row[1]} for row in cursor.fetchall()]
 
+        cursor.execute(
+            "SELECT rarity, COUNT(*) FROM cars GROUP BY rarity ORDER BY COUNT(*) DESC"
+        )
+        rarities = [{"rarity": row[0], "count": row[1]} for row in cursor.fetchall()]
 
-@app.route("/cars/class/<car_class>")
-def get_cars_by_class(car_class):
-    cache_key = f"class_{car_class}"
-    cached = cache.get(cache_key)
+    return {
+        "total_cars": total_cars,
+        "average_horsepower": round(avg_hp, 2),
+        "average_price": round(avg_price, 2),
+        "max_top_speed": max_speed,
+        "best_acceleration": best_accel,
+        "cars_by_class": classes,
+        "cars_by_rarity": rarities,
+    }
 
-    if cached:
-        return jsonify(
-            {"source": "cache", "class": car_class, "cars": json.loads(cached)}
-        )
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM cars WHERE class = %s ORDER BY horsepower DESC", (car_class,)
+@app.route("/cars")
+def get_cars():
+    cars, source = cache_layer.get_or_compute(
+        "all_cars", CARS_TTL, load_all_cars, tags=[CARS_TAG]
     )
 
-    column_names = [desc[0] for desc in cursor.description]
-    cars = []
+    if source == "cache":
+        return jsonify({"source": "cache", "cars": cars})
 
-    for row in cursor.fetchall():
-        car = dict(zip(column_names, row))
-        car["created_at"] = str(car["created_at"])
-        car["acceleration"] = float(car["acceleration"])
-        car["price"] = int(car["price"])
-        cars.append(car)
+    return jsonify({"source": "database", "total": len(cars), "cars": cars})
 
-    cursor.close()
-    conn.close()
 
-    if not cars:
-        return jsonify({"error": "No cars found for this class"}), 404
+@app.route("/cars/<int:car_id>")
+def get_car(car_id):
+    car, source = cache_layer.get_or_compute(
+        f"car_{car_id}", CARS_TTL, lambda: load_car(car_id), tags=[car_tag(car_id)]
+    )
 
-    cache.setex(cache_key, 60, json.dumps(cars))
+    if car is None:
+        return jsonify({"error": "Car not found"}), 404
 
-    return jsonify(
-        {"source": "database", "class": car_class, "total": len(cars), "cars": cars}
-    )
+    return jsonify({"source": source, "car": car})
 
 
-@app.route("/cars/rarity/<rarity>")
-def get_cars_by_rarity(rarity):
-    cache_key = f"rarity_{rarity}"
-    cached = cache.get(cache_key)
+@app.route("/cars", methods=["POST"])
+def create_car():
+    values, error = parse_car(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
 
-    if cached:
-        return jsonify(
-            {"source": "cache", "rarity": rarity, "cars": json.loads(cached)}
+    with pool.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO cars ({CAR_COLUMNS})
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING *
+        """,
+            values,
         )
+        column_names = [desc[0] for desc in cursor.description]
+        car = car_from_row(column_names, cursor.fetchone())
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM cars WHERE rarity = %s ORDER BY price DESC", (rarity,)
-    )
+    invalidate(car_tags(car))
+    return jsonify({"car": car}), 201
 
-    column_names = [desc[0] for desc in cursor.description]
-    cars = []
 
-    for row in cursor.fetchall():
-        car = dict(zip(column_names, row))
-        car["created_at"] = str(car["created_at"])
-        car["acceleration"] = float(car["acceleration"])
-        car["price"] = int(car["price"])
-        cars.append(car)
+@app.route("/cars/<int:car_id>", methods=["PUT"])
+def update_car(car_id):
+    values, error = parse_car(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
 
-    cursor.close()
-    conn.close()
+    with pool.cursor() as cursor:
+        # Classe e raridade antigas, com a linha travada ate o commit, para
+        # invalidar tambem as listas de onde o carro saiu
+        cursor.execute(
+            "SELECT id, class, rarity FROM cars WHERE id = %s FOR UPDATE", (car_id,)
+        )
+        old = cursor.fetchone()
+        if old is None:
+            return jsonify({"error": "Car not found"}), 404
+
+        cursor.execute(
+            f"""
+            UPDATE cars SET ({CAR_COLUMNS}) = (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            WHERE id = %s
+            RETURNING *
+        """,
+            (*values, car_id),
+        )
+        column_names = [desc[0] for desc in cursor.description]
+        car = car_from_row(column_names, cursor.fetchone())
 
-    if not cars:
-        return jsonify({"error": "No cars found for this rarity"}), 404
+    invalidate(car_tags(dict(zip(("id", "class", "rarity"), old)), car))
+    return jsonify({"car": car})
 
-    cache.setex(cache_key, 60, json.dumps(cars))
 
-    return jsonify(
-        {"source": "database", "rarity": rarity, "total": len(cars), "cars": cars}
-    )
+@app.route("/cars/<int:car_id>", methods=["DELETE"])
+def delete_car(car_id):
+    with pool.cursor() as cursor:
+        cursor.execute("DELETE FROM cars WHERE id = %s RETURNING *", (car_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return jsonify({"error": "Car not found"}), 404
+        column_names = [desc[0] for desc in cursor.description]
+        car = car_from_row(column_names, row)
 
+    invalidate(car_tags(car))
+    return jsonify({"deleted": car})
 
-@app.route("/stats")
-def get_stats():
-    cache_key = "garage_stats"
-    cached = cache.get(cache_key)
 
-    if cached:
-        return jsonify({"source": "cache", "stats": json.loads(cached)})
+@app.route("/cars/class/<car_class>")
+def get_cars_by_class(car_class):
+    cars, source = cache_layer.get_or_compute(
+        f"class_{car_class}",
+        CARS_TTL,
+        lambda: load_cars_by_class(car_class),
+        tags=[class_tag(car_class)],
+    )
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    if cars is None:
+        return jsonify({"error": "No cars found for this class"}), 404
 
-    cursor.execute("SELECT COUNT(*) FROM cars")
-    total_cars = cursor.fetchone()[0]
+    if source == "cache":
+        return jsonify({"source": "cache", "class": car_class, "cars": cars})
 
-    cursor.execute("SELECT AVG(horsepower) FROM cars")
-    avg_hp = float(cursor.fetchone()[0] or 0)
+    return jsonify(
+        {"source": "database", "class": car_class, "total": len(cars), "cars": cars}
+    )
 
-    cursor.execute("SELECT AVG(price) FROM cars")
-    avg_price = float(cursor.fetchone()[0] or 0)
 
-    cursor.execute("SELECT MAX(top_speed) FROM cars")
-    max_speed = cursor.fetchone()[0]
+@app.route("/cars/rarity/<rarity>")
+def get_cars_by_rarity(rarity):
+    cars, source = cache_layer.get_or_compute(
+        f"rarity_{rarity}",
+        CARS_TTL,
+        lambda: load_cars_by_rarity(rarity),
+        tags=[rarity_tag(rarity)],
+    )
 
-    cursor.execute("SELECT MIN(acceleration) FROM cars")
-    best_accel = float(cursor.fetchone()[0] or 0)
+    if cars is None:
+        return jsonify({"error": "No cars found for this rarity"}), 404
 
-    cursor.execute(
-        "SELECT class, COUNT(*) FROM cars GROUP BY class ORDER BY COUNT(*) DESC"
-    )
-    classes = [{"class": row[0], "count": row[1]} for row in cursor.fetchall()]
+    if source == "cache":
+        return jsonify({"source": "cache", "rarity": rarity, "cars": cars})
 
-    cursor.execute(
-        "SELECT rarity, COUNT(*) FROM cars GROUP BY rarity ORDER BY COUNT(*) DESC"
+    return jsonify(
+        {"source": "database", "rarity": rarity, "total": len(cars), "cars": cars}
     )
-    rarities = [{"rarity": row[0], "count": row[1]} for row in cursor.fetchall()]
 
-    cursor.close()
-    conn.close()
 
-    stats = {
-        "total_cars": total_cars,
-        "average_horsepower": round(avg_hp, 2),
-        "average_price": round(avg_price, 2),
-        "max_top_speed": max_speed,
-        "best_acceleration": best_accel,
-        "cars_by_class": classes,
-        "cars_by_rarity": rarities,
-    }
-
-    cache.setex(cache_key, 30, json.dumps(stats))
+@app.route("/stats")
+def get_stats():
+    stats, source = cache_layer.get_or_compute(
+        "garage_stats", STATS_TTL, load_stats, tags=[CARS_TAG]
+    )
 
-    return jsonify({"source": "database", "stats": stats})
+    return jsonify({"source": source, "stats": stats})
 
 
 @app.route("/health")
 def health():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        cursor.close()
-        conn.close()
+        with pool.cursor() as cursor:
+            cursor.execute("SELECT 1")
 
         cache.ping()
 
         return jsonify(
             {"status": "healthy", "database": "connected", "cache": "connected"}
         )
+    except PoolUnavailable as e:
+        return jsonify({"status": "unhealthy", "error": str(e)}), 503
     except Exception as e:
         return jsonify({"status": "unhealthy", "error": str(e)}), 500
 
 
+@app.errorhandler(psycopg2.DataError)
+def invalid_car_data(error):
+    # Valor fora do limite da coluna (ex.: texto longo demais)
+    return jsonify({"error": "Invalid car data", "detail": str(error).strip()}), 400
+
+
+@app.errorhandler(PoolUnavailable)
+def database_unavailable(error):
+    response = jsonify({"error": "Database unavailable", "detail": str(error)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(max(1, round(error.retry_after)))
+    return response
+
+
 if __name__ == "__main__":
     print("Inicializando Forza Garage API...")
     init_database()
+    pool.warm_up()
+    InvalidationListener(cache_layer).start()
     print("Banco de dados iniciado!")
     print("Subindo servidor Flask na porta 5000...")
     app.run(host="0.0.0.0", port=5000, debug=False)
@@ -0,0 +1,121 @@
+import argparse
+import statistics
+import threading
+import time
+
+from db import ConnectionPool, PoolUnavailable, connect, connection_params
+
+QUERY = "SELECT * FROM cars WHERE id = %s"
+
+
+def without_pool(car_id):
+    # Comportamento anterior: uma conexao (TCP + autenticacao) por cache miss
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(QUERY, (car_id,))
+            cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def make_pooled(pool):
+    def with_pool(car_id):
+        with pool.cursor() as cursor:
+            cursor.execute(QUERY, (car_id,))
+            cursor.fetchone()
+
+    return with_pool
+
+
+def latencies(query, requests):
+    timings = []
+    for index in range(requests):
+        start = time.perf_counter()
+        query(index % 12 + 1)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def percentile(timings, fraction):
+    return sorted(timings)[int(fraction * (len(timings) - 1))]
+
+
+def concurrent(pool, threads, hold):
+    # threads requisicoes ao mesmo tempo, cada uma segurando a conexao por
+    # hold segundos; o que passar do pool espera checkout_timeout e recebe 503
+    results = []
+    lock = threading.Lock()
+
+    def request():
+        start = time.perf_counter()
+        try:
+            with pool.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(%s)", (hold,))
+            status = 200
+        except PoolUnavailable:
+            status = 503
+        with lock:
+            results.append((status, time.perf_counter() - start))
+
+    workers = [threading.Thread(target=request) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def report(label, results):
+    for status in (200, 503):
+        timings = [elapsed for code, elapsed in results if code == status]
+        if timings:
+            print(
+                f"  {label}: {len(timings):3d} x {status}, ate {max(timings) * 1000:7.1f} ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cache miss com e sem pool de conexoes"
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=5)
+    args = parser.parse_args()
+
+    pool = ConnectionPool(max_size=args.pool_size, checkout_timeout=0.5)
+    try:
+        pool.warm_up()
+        timings = {
+            "Sem pool": latencies(without_pool, args.requests),
+            "Com pool": latencies(make_pooled(pool), args.requests),
+        }
+
+        print(f"Cache miss de /cars/<id>: {args.requests} requisicoes")
+        for label, values in timings.items():
+            print(
+                f"  {label}: p50 {statistics.median(values) * 1000:6.2f} ms, "
+                f"p95 {percentile(values, 0.95) * 1000:6.2f} ms"
+            )
+
+        print(
+            f"\nPool esgotado: {args.threads} requisicoes simultaneas, pool de {args.pool_size}"
+        )
+        report("pg_sleep(0.2)", concurrent(pool, args.threads, 0.2))
+    finally:
+        pool.close()
+
+    # Banco fora do ar: porta sem servidor
+    down = ConnectionPool(
+        max_size=args.pool_size,
+        checkout_timeout=0.5,
+        **{**connection_params(), "port": "1"},
+    )
+    print(f"\nBanco indisponivel: {args.threads} requisicoes simultaneas")
+    report("porta fechada", concurrent(down, args.threads, 0))
+    down.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+import app
+from db import ConnectionPool
+
+KEYS = ("all_cars", "garage_stats")
+ROUTES = ("/cars", "/stats")
+
+
+class QueryCounter:
+    # Conta as conexoes pedidas ao pool (uma por calculo) e quantas estavam
+    # em uso ao mesmo tempo; delay simula um banco mais lento
+    def __init__(self, cursor, delay):
+        self._cursor = cursor
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.total = 0
+        self.active = 0
+        self.peak = 0
+
+    @contextmanager
+    def cursor(self):
+        with self.lock:
+            self.total += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            with self._cursor() as cursor:
+                time.sleep(self.delay)
+                yield cursor
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def run(protect, threads, duration, counter):
+    layer = app.cache_layer
+    layer.protect = protect
+    layer.reset_counters()
+    app.cache.delete(*KEYS)
+    counter.total = counter.peak = 0
+
+    timings = []
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def worker(index):
+        client = app.app.test_client()
+        local = []
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            response = client.get(ROUTES[index % len(ROUTES)])
+            local.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+        with lock:
+            timings.extend(local)
+
+    workers = [
+        threading.Thread(target=worker, args=(index,)) for index in range(threads)
+    ]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    # Recalculos em segundo plano ainda em andamento
+    layer._refresher.submit(lambda: None).result()
+    time.sleep(counter.delay * 2)
+    return timings, dict(layer.counters)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Consultas ao banco na expiracao do cache"
+    )
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--ttl", type=int, default=2, help="TTL de /cars e /stats")
+    parser.add_argument(
+        "--delay", type=float, default=0.05, help="Latencia extra por consulta (s)"
+    )
+    args = parser.parse_args()
+
+    # Pool com uma conexao por thread: sem protecao, todas podem consultar
+    # o banco ao mesmo tempo sem esbarrar no limite do pool
+    app.CARS_TTL = app.STATS_TTL = args.ttl
+    pool = ConnectionPool(max_size=args.threads)
+    counter = QueryCounter(pool.cursor, args.delay)
+    pool.cursor = counter.cursor
+    app.pool = pool
+
+    # Cada chave expira duration / ttl vezes no teste
+    expirations = len(KEYS) * args.duration / args.ttl
+    print(
+        f"{args.threads} threads, {args.duration:.0f}s, TTL {args.ttl}s, "
+        f"+{args.delay * 1000:.0f} ms por consulta, {len(KEYS)} chaves"
+    )
+    print(
+        f"{'modo':<12} {'requisicoes':>11} {'consultas':>9} {'por expiracao':>13} "
+        f"{'pico simult.':>12} {'p50 ms':>8} {'p99 ms':>8}"
+    )
+    for label, protect in (("cache-aside", False), ("protegido", True)):
+        timings, counters = run(protect, args.threads, args.duration, counter)
+        print(
+            f"{label:<12} {len(timings):>11} {counter.total:>9} "
+            f"{counter.total / expirations:>13.1f} {counter.peak:>12} "
+            f"{statistics.median(timings) * 1000:>8.2f} "
+            f"{sorted(timings)[int(0.99 * (len(timings) - 1))] * 1000:>8.2f}"
+        )
+        if protect:
+            print(f"{'':<12} {counters}")
+
+    app.cache.delete(*KEYS)
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
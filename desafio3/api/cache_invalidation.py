@@ -0,0 +1,189 @@
+import json
+import logging
+import select
+import threading
+
+import psycopg2
+
+from cache_layer import ALL_TAG
+from db import connection_params
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cars_changed"
+
+# Tags das chaves do cache: all_cars e garage_stats dependem de "cars" (toda
+# alteracao), car_<id> de "car:<id>", class_<x> de "class:<x>" e
+# rarity_<x> de "rarity:<x>"
+CARS_TAG = "cars"
+
+
+def car_tag(car_id):
+    return f"car:{car_id}"
+
+
+def class_tag(car_class):
+    return f"class:{car_class}"
+
+
+def rarity_tag(rarity):
+    return f"rarity:{rarity}"
+
+
+def car_tags(*cars):
+    # Tags afetadas pela gravacao dos carros (linha antiga e nova de um
+    # UPDATE, para limpar tambem a classe e a raridade de onde o carro saiu)
+    tags = {CARS_TAG}
+    for car in cars:
+        tags.update(
+            (car_tag(car["id"]), class_tag(car["class"]), rarity_tag(car["rarity"]))
+        )
+    return tags
+
+
+def change_tags(payload):
+    # Payload do NOTIFY: {"ids", "classes", "rarities"} ou {"all": true}
+    try:
+        change = json.loads(payload)
+    except ValueError:
+        return {ALL_TAG}
+    if not isinstance(change, dict) or change.get("all"):
+        return {ALL_TAG}
+    tags = {CARS_TAG}
+    tags.update(car_tag(car_id) for car_id in change.get("ids") or ())
+    tags.update(class_tag(car_class) for car_class in change.get("classes") or ())
+    tags.update(rarity_tag(rarity) for rarity in change.get("rarities") or ())
+    return tags
+
+
+# Um NOTIFY por comando (trigger de statement com transition tables), nao um
+# por linha: um UPDATE em massa gera uma mensagem so. Acima do limite de
+# 8000 bytes do payload, a mensagem vira {"all": true}
+TRIGGER_SQL = (
+    f"""
+    CREATE OR REPLACE FUNCTION notify_cars_changed() RETURNS trigger AS $$
+    DECLARE
+        payload text;
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            payload := '{{"all": true}}';
+        ELSIF TG_OP = 'INSERT' THEN
+            SELECT json_build_object(
+                'ids', array_agg(DISTINCT id),
+                'classes', array_agg(DISTINCT class),
+                'rarities', array_agg(DISTINCT rarity))::text
+            INTO payload FROM new_rows HAVING count(*) > 0;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT json_build_object(
+                'ids', array_agg(DISTINCT id),
+                'classes', array_agg(DISTINCT class),
+                'rarities', array_agg(DISTINCT rarity))::text
+            INTO payload FROM old_rows HAVING count(*) > 0;
+        ELSE
+            SELECT json_build_object(
+                'ids', array_agg(DISTINCT id),
+                'classes', array_agg(DISTINCT class),
+                'rarities', array_agg(DISTINCT rarity))::text
+            INTO payload
+            FROM (
+                SELECT id, class, rarity FROM old_rows
+                UNION ALL
+                SELECT id, class, rarity FROM new_rows
+            ) changed
+            HAVING count(*) > 0;
+        END IF;
+
+        IF payload IS NOT NULL THEN
+            IF octet_length(payload) > 7900 THEN
+                payload := '{{"all": true}}';
+            END IF;
+            PERFORM pg_notify('{CHANNEL}', payload);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER cars_notify_insert AFTER INSERT ON cars
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cars_changed()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER cars_notify_update AFTER UPDATE ON cars
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cars_changed()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER cars_notify_delete AFTER DELETE ON cars
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cars_changed()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER cars_notify_truncate AFTER TRUNCATE ON cars
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cars_changed()
+    """,
+)
+
+
+def install_triggers(cursor):
+    # Varias instancias da API podem subir juntas: o advisory lock serializa
+    # o CREATE OR REPLACE ate o commit de quem chamou
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (CHANNEL,))
+    for sql in TRIGGER_SQL:
+        cursor.execute(sql)
+
+
+class InvalidationListener(threading.Thread):
+    # Escuta o NOTIFY do banco numa conexao propria (fora do pool) e invalida
+    # as tags no cache. Cobre escritas feitas fora da API (psql, scripts,
+    # outras instancias). Enquanto desconectado, mensagens se perdem: a cada
+    # (re)conexao o cache inteiro e invalidado
+    def __init__(self, cache_layer, channel=CHANNEL, idle_timeout=10.0, max_delay=30.0):
+        super().__init__(name="cache-invalidation", daemon=True)
+        self.cache_layer = cache_layer
+        self.channel = channel
+        self.idle_timeout = idle_timeout
+        self.max_delay = max_delay
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _listen(self):
+        conn = psycopg2.connect(**connection_params())
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def _consume(self, conn):
+        while not self._stop_event.is_set():
+            if select.select([conn], [], [], self.idle_timeout) == ([], [], []):
+                # Sem mensagens: confirma que a conexao continua viva
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                continue
+            conn.poll()
+            tags = set()
+            while conn.notifies:
+                tags |= change_tags(conn.notifies.pop(0).payload)
+            if tags:
+                self.cache_layer.invalidate(tags)
+
+    def run(self):
+        delay = 0.5
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = self._listen()
+                self.cache_layer.invalidate_all()
+                delay = 0.5
+                self._consume(conn)
+            except Exception:
+                # Banco ou Redis fora do ar: tenta de novo com backoff
+                logger.exception("Falha no listener de invalidacao do cache")
+            finally:
+                if conn is not None:
+                    conn.close()
+            self._stop_event.wait(delay)
+            delay = min(delay * 2, self.max_delay)
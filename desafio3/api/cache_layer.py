@@ -0,0 +1,277 @@
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# CACHE_PROTECTION=0 volta ao cache-aside simples (get -> banco -> setex)
+PROTECTION = os.getenv("CACHE_PROTECTION", "1") != "0"
+# Depois do TTL o valor continua no Redis por STALE_TTL segundos e e servido
+# enquanto uma unica requisicao recalcula em segundo plano
+STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "300"))
+# XFetch: quanto maior, mais cedo (e mais provavel) o recalculo antecipado
+XFETCH_BETA = float(os.getenv("CACHE_XFETCH_BETA", "1.0"))
+# Tempo maximo de um recalculo segurando o lock (e de espera dos demais)
+LOCK_TIMEOUT = float(os.getenv("CACHE_LOCK_TIMEOUT", "5"))
+REFRESH_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", "4"))
+
+# Tag implicita de todas as chaves: invalidate_all() limpa o cache inteiro
+ALL_TAG = "all"
+
+# Remove o lock so se ainda for o dono (o lock pode ter expirado e sido
+# adquirido por outro processo)
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Indice de dependencias: tag:<tag> e o conjunto de chaves que dependem da
+# tag, e tagver:<tag> conta as invalidacoes. O valor so e gravado se nenhuma
+# tag foi invalidada desde antes do calculo; assim uma leitura lenta que
+# comecou antes de uma escrita nao devolve o dado antigo ao cache.
+# KEYS: chave, tagver:<tag>..., tag:<tag>...; ARGV: valor, ttl, versoes...
+STORE_SCRIPT = """
+local n = (#KEYS - 1) / 2
+for i = 1, n do
+    if (redis.call("get", KEYS[1 + i]) or "0") ~= ARGV[2 + i] then
+        return 0
+    end
+end
+redis.call("setex", KEYS[1], ARGV[2], ARGV[1])
+for i = 1, n do
+    local tag = KEYS[1 + n + i]
+    redis.call("sadd", tag, KEYS[1])
+    if redis.call("ttl", tag) < tonumber(ARGV[2]) then
+        redis.call("expire", tag, ARGV[2])
+    end
+end
+return 1
+"""
+
+# KEYS: tagver:<tag>..., tag:<tag>...; retorna quantas chaves foram removidas
+INVALIDATE_SCRIPT = """
+local n = #KEYS / 2
+local removed = 0
+for i = 1, n do
+    redis.call("incr", KEYS[i])
+    for _, key in ipairs(redis.call("smembers", KEYS[n + i])) do
+        removed = removed + redis.call("del", key)
+    end
+    redis.call("del", KEYS[n + i])
+end
+return removed
+"""
+
+
+class CacheLayer:
+    def __init__(
+        self,
+        client,
+        protect=PROTECTION,
+        stale_ttl=STALE_TTL,
+        beta=XFETCH_BETA,
+        lock_timeout=LOCK_TIMEOUT,
+        poll_interval=0.02,
+    ):
+        self.client = client
+        self.protect = protect
+        self.stale_ttl = stale_ttl
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+        self._release = client.register_script(RELEASE_SCRIPT)
+        self._store = client.register_script(STORE_SCRIPT)
+        self._invalidate = client.register_script(INVALIDATE_SCRIPT)
+        self._refresher = ThreadPoolExecutor(
+            max_workers=REFRESH_WORKERS, thread_name_prefix="cache-refresh"
+        )
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(
+            (
+                "hits",
+                "stale",
+                "early",
+                "misses",
+                "computes",
+                "coalesced",
+                "waits",
+                "discarded",
+                "invalidations",
+            ),
+            0,
+        )
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def reset_counters(self):
+        with self._lock:
+            for name in self.counters:
+                self.counters[name] = 0
+
+    # Entrada no Redis: {"value", "delta" (segundos do ultimo calculo),
+    # "expiry" (fim do TTL logico, epoch)}. O TTL do Redis inclui STALE_TTL
+    def _read(self, key):
+        raw = self.client.get(key)
+        if raw is None:
+            return None
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict) or "expiry" not in entry:
+            # Formato anterior (valor puro): tratado como miss
+            return None
+        return entry
+
+    @staticmethod
+    def _tag_keys(tags):
+        tags = sorted(set(tags) | {ALL_TAG})
+        return [f"tagver:{tag}" for tag in tags], [f"tag:{tag}" for tag in tags]
+
+    def _compute(self, key, ttl, compute, tags):
+        self._count("computes")
+        versions, members = self._tag_keys(tags)
+        seen = [version or "0" for version in self.client.mget(versions)]
+        start = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - start
+        if value is not None:
+            entry = {"value": value, "delta": delta, "expiry": time.time() + ttl}
+            stale_ttl = self.stale_ttl if self.protect else 0
+            stored = self._store(
+                keys=[key, *versions, *members],
+                args=[json.dumps(entry), ttl + stale_ttl, *seen],
+            )
+            if not stored:
+                # Invalidado durante o calculo: o valor vale para esta
+                # resposta, mas nao entra no cache
+                self._count("discarded")
+        return value
+
+    def invalidate(self, tags):
+        # Remove todas as chaves que dependem de qualquer uma das tags
+        tags = set(tags)
+        if not tags:
+            return 0
+        self._count("invalidations")
+        versions = [f"tagver:{tag}" for tag in sorted(tags)]
+        members = [f"tag:{tag}" for tag in sorted(tags)]
+        return self._invalidate(keys=[*versions, *members])
+
+    def invalidate_all(self):
+        return self.invalidate([ALL_TAG])
+
+    def _acquire(self, key):
+        token = uuid.uuid4().hex
+        if self.client.set(
+            f"lock:{key}", token, nx=True, px=int(self.lock_timeout * 1000)
+        ):
+            return token
+        return None
+
+    def _release_lock(self, key, token):
+        self._release(keys=[f"lock:{key}"], args=[token])
+
+    def _refresh(self, key, ttl, compute, tags, token):
+        try:
+            self._compute(key, ttl, compute, tags)
+        except Exception:
+            # O valor antigo continua sendo servido ate o fim de STALE_TTL
+            logger.exception("Falha ao recalcular %s em segundo plano", key)
+        finally:
+            self._release_lock(key, token)
+
+    def _should_refresh(self, entry):
+        # XFetch (Vattani et al.): recalcula antes do fim do TTL com
+        # probabilidade que cresce perto da expiracao e com o custo do calculo
+        now = time.time()
+        if now >= entry["expiry"]:
+            self._count("stale")
+            return True
+        early = now - entry["delta"] * self.beta * math.log(1.0 - random.random())
+        if early >= entry["expiry"]:
+            self._count("early")
+            return True
+        return False
+
+    def _load(self, key, ttl, compute, tags):
+        # Miss sem valor nenhum: um unico calculo entre todos os processos,
+        # pelo lock no Redis; os demais esperam o valor aparecer
+        token = self._acquire(key)
+        if token:
+            try:
+                return self._compute(key, ttl, compute, tags), "database"
+            finally:
+                self._release_lock(key, token)
+
+        self._count("waits")
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            entry = self._read(key)
+            if entry is not None:
+                return entry["value"], "cache"
+            if not self.client.exists(f"lock:{key}"):
+                # O dono terminou sem gravar (ex.: 404 ou erro): calcula aqui
+                break
+        return self._compute(key, ttl, compute, tags), "database"
+
+    def _coalesce(self, key, ttl, compute, tags):
+        # Dentro do processo, as threads com o mesmo miss esperam um unico
+        # Future em vez de disputar o lock no Redis
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            self._count("coalesced")
+            value, _ = future.result(timeout=self.lock_timeout * 2)
+            return value, "cache"
+
+        try:
+            result = self._load(key, ttl, compute, tags)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def get_or_compute(self, key, ttl, compute, tags=()):
+        # compute() devolve um valor serializavel em JSON, ou None para nao
+        # guardar nada (ex.: 404); tags sao as dependencias usadas por
+        # invalidate(). Retorna (valor, "cache" | "database")
+        entry = self._read(key)
+
+        if not self.protect:
+            if entry is not None:
+                self._count("hits")
+                return entry["value"], "cache"
+            self._count("misses")
+            return self._compute(key, ttl, compute, tags), "database"
+
+        if entry is None:
+            self._count("misses")
+            return self._coalesce(key, ttl, compute, tags)
+
+        self._count("hits")
+        if self._should_refresh(entry):
+            token = self._acquire(key)
+            if token:
+                self._refresher.submit(self._refresh, key, ttl, compute, tags, token)
+        return entry["value"], "cache"
@@ -0,0 +1,241 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+DB_HOST = os.getenv("DB_HOST", "postgres")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_NAME = os.getenv("DB_NAME", "forza_garage")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "10"))
+# Tempo maximo esperando uma conexao livre antes de responder 503
+CHECKOUT_TIMEOUT = float(os.getenv("DB_CHECKOUT_TIMEOUT", "2"))
+# connect_timeout do libpq para cada conexao nova
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "3"))
+# Depois de uma falha de conexao, as requisicoes falham na hora por esse
+# intervalo em vez de cada uma esperar o connect_timeout
+RETRY_AFTER = float(os.getenv("DB_RETRY_AFTER", "2"))
+# Espera total pelo banco na inicializacao da API
+STARTUP_TIMEOUT = float(os.getenv("DB_STARTUP_TIMEOUT", "30"))
+
+
+class PoolUnavailable(Exception):
+    def __init__(self, message, retry_after=RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def connection_params():
+    return {
+        "host": DB_HOST,
+        "port": DB_PORT,
+        "database": DB_NAME,
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+        "connect_timeout": CONNECT_TIMEOUT,
+    }
+
+
+def connect(timeout=STARTUP_TIMEOUT, base_delay=0.1, max_delay=2.0):
+    # Conexao avulsa da inicializacao: backoff exponencial com jitter ate o
+    # banco aceitar conexoes. As requisicoes nunca esperam assim
+    deadline = time.monotonic() + timeout
+    delay = base_delay
+    while True:
+        try:
+            return psycopg2.connect(**connection_params())
+        except psycopg2.OperationalError:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise
+            time.sleep(min(random.uniform(delay / 2, delay), remaining))
+            delay = min(delay * 2, max_delay)
+
+
+class _LazyPool(pg_pool.ThreadedConnectionPool):
+    # O ThreadedConnectionPool abre minconn conexoes no construtor e fecha na
+    # devolucao as que passam de minconn. Aqui nenhuma abre antes do primeiro
+    # uso e todas as devolvidas continuam no pool
+    def __init__(self, maxconn, **params):
+        super().__init__(0, maxconn, **params)
+        self.minconn = maxconn
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        checkout_timeout=CHECKOUT_TIMEOUT,
+        retry_after=RETRY_AFTER,
+        health_check_after=30.0,
+        **params,
+    ):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.retry_after = retry_after
+        self.health_check_after = health_check_after
+        self.params = params or connection_params()
+
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}
+        self._down_until = 0.0
+        # Pools herdados de um fork: nunca fechados pelo filho, porque fechar
+        # enviaria o Terminate pelos sockets que ainda sao do processo pai
+        self._inherited = []
+
+    def _after_fork(self):
+        # Cada worker (ex.: gunicorn com --preload) abre as proprias conexoes
+        if self._pool is not None:
+            self._inherited.append(self._pool)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._last_used = {}
+        self._down_until = 0.0
+
+    def _unavailable(self, message):
+        return PoolUnavailable(
+            message, max(self._down_until - time.monotonic(), 0.0) or 1.0
+        )
+
+    def _open(self):
+        if self._pool is not None and self._pid != os.getpid():
+            # Fork sem o hook de os.register_at_fork
+            self._after_fork()
+        if self._pool is not None:
+            return self._pool
+        with self._lock:
+            if self._pool is None:
+                # Conexoes abrem sob demanda em getconn, com o connect_timeout
+                # e o fail fast do pool
+                self._pool = _LazyPool(self.max_size, **self.params)
+                self._pid = os.getpid()
+            return self._pool
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if (
+            last_used is not None
+            and time.monotonic() - last_used < self.health_check_after
+        ):
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _connect(self, pool):
+        if time.monotonic() < self._down_until:
+            raise self._unavailable("Banco de dados indisponivel")
+        try:
+            return pool.getconn()
+        except psycopg2.OperationalError as e:
+            self._down_until = time.monotonic() + self.retry_after
+            raise self._unavailable(f"Banco de dados indisponivel: {e}") from e
+
+    def getconn(self):
+        pool = self._open()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolUnavailable(
+                f"Nenhuma conexao livre no pool apos {self.checkout_timeout}s"
+            )
+        try:
+            while True:
+                conn = self._connect(pool)
+                if self._healthy(conn):
+                    return conn
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        close = close or bool(conn.closed)
+        if close:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        try:
+            if self._pool is None or self._pid != os.getpid():
+                conn.close()
+            else:
+                self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    def warm_up(self):
+        # Abre min_size conexoes depois do fork, fora do caminho das requisicoes
+        conns = []
+        try:
+            for _ in range(self.min_size):
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+
+    @staticmethod
+    def _rollback(conn):
+        if conn.closed:
+            return False
+        try:
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @contextmanager
+    def connection(self):
+        # Commit ao sair do bloco, rollback em caso de erro. Conexao perdida
+        # ou consulta cancelada no meio da requisicao viram 503; a conexao so
+        # e descartada se nao aceitar mais o rollback
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            broken = not self._rollback(conn)
+            raise self._unavailable(f"Falha na conexao com o banco: {e}") from e
+        except BaseException:
+            broken = not self._rollback(conn)
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+            self._last_used = {}
+
+
+pool = ConnectionPool()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=pool._after_fork)